@@ -0,0 +1,83 @@
+"""
+@file AssetCache.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import bpy
+import os, hashlib
+import os.path as osp
+
+class AssetCache:
+    assetExtensions = ['.obj', '.mtl', '.png', '.jpg', '.jpeg']
+
+    def __init__(self, cache_folder):
+        self.cache_folder = cache_folder
+        if not osp.exists(cache_folder):
+            os.makedirs(cache_folder)
+
+    # Hash of the obj file and the materials and textures next to it, plus the
+    # blender version that wrote the cache entry.
+    def contentHash(self, obj_filepath):
+        folder = osp.dirname(osp.abspath(obj_filepath))
+        sha = hashlib.sha1(bpy.app.version_string.encode('utf-8'))
+        for filename in sorted(os.listdir(folder)):
+            if osp.splitext(filename)[1].lower() not in self.assetExtensions:
+                continue
+            sha.update(filename.encode('utf-8'))
+            with open(osp.join(folder, filename), 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    sha.update(chunk)
+        return sha.hexdigest()
+
+    def cacheFilepath(self, obj_filepath, suffix=''):
+        name = osp.splitext(osp.basename(obj_filepath))[0]
+        return osp.join(self.cache_folder, '%s%s_%s.blend' % (name, suffix, self.contentHash(obj_filepath)))
+
+    # Drop-in replacement of bpy.ops.import_scene.obj: the imported objects are
+    # linked to the scene and selected. The first import of a model writes it
+    # to a .blend library, later imports append from there.
+    def importObj(self, obj_filepath):
+        cache_filepath = self.cacheFilepath(obj_filepath)
+        if osp.exists(cache_filepath):
+            return self.load(cache_filepath)
+
+        bpy.ops.import_scene.obj(filepath=obj_filepath)
+        imported = list(bpy.context.selected_objects)
+        self.write(cache_filepath, imported)
+        return imported
+
+    # Write datablocks and everything they use (meshes, materials, images).
+    # Workers may fill the cache at the same time, so write then rename.
+    def write(self, cache_filepath, datablocks):
+        tmp_filepath = '%s.%d.tmp.blend' % (cache_filepath[:-len('.blend')], os.getpid())
+        bpy.data.libraries.write(tmp_filepath, set(datablocks), relative_remap=False, fake_user=True)
+        os.rename(tmp_filepath, cache_filepath)
+
+    def load(self, cache_filepath):
+        with bpy.data.libraries.load(cache_filepath, link=False) as (data_from, data_to):
+            data_to.objects = list(data_from.objects)
+
+        bpy.ops.object.select_all(action='DESELECT')
+        for ob in data_to.objects:
+            ob.use_fake_user = False
+            bpy.context.scene.objects.link(ob)
+            ob.select = True
+        return list(data_to.objects)
+
+    # meshes of a cache entry, empty if there is none yet
+    def loadMeshes(self, cache_filepath):
+        if not osp.exists(cache_filepath):
+            return []
+        with bpy.data.libraries.load(cache_filepath, link=False) as (data_from, data_to):
+            data_to.meshes = list(data_from.meshes)
+        return list(data_to.meshes)
+
+# import an obj file, through the asset cache if one is given
+def import_obj(obj_filepath, assets=None):
+    if assets is None:
+        bpy.ops.import_scene.obj(filepath=obj_filepath)
+        return list(bpy.context.selected_objects)
+    return assets.importObj(obj_filepath)
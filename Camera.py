@@ -6,23 +6,29 @@ All Rights Reserved. For a full description see the file named LICENSE.
 Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
 """
 
-import bpy
+import bpy, bmesh
+import numpy
 from mathutils import Vector, Matrix, Quaternion
 
+import Projection
+
 class Camera:
 
     numViews = []
     camIntrinsic = []
     camExtrinsic = []
 
-    def __init__(self, camIntrinsic, camExtrinsic, numViews):
+    def __init__(self, camIntrinsic, camExtrinsic, numViews, useConvexHull=True):
         self.camIntrinsic = camIntrinsic
         self.camExtrinsic = camExtrinsic
         self.numViews = numViews
+        self.useConvexHull = useConvexHull
+        self.vertexCache = {}
+        # K*RT of every configured view, computed once
+        self.projections = Projection.projection_matrices(camIntrinsic, camExtrinsic[0:numViews])
         sensor_width_in_mm = self.camIntrinsic[1][1]*self.camIntrinsic[0][2] / (self.camIntrinsic[0][0]*self.camIntrinsic[1][2])
         sensor_height_in_mm = 1  # doesn't matter
-        resolution_x_in_px = self.camIntrinsic[0][2]*2  # principal point assumed at the center
-        resolution_y_in_px = self.camIntrinsic[1][2]*2  # principal point assumed at the center
+        resolution_x_in_px, resolution_y_in_px = Projection.image_size(self.camIntrinsic)  # principal point assumed at the center
 
         s_u = resolution_x_in_px / sensor_width_in_mm
         s_v = resolution_y_in_px / sensor_height_in_mm
@@ -53,11 +59,14 @@ class Camera:
         bpy.data.objects['Camera'].rotation_quaternion = (self.camExtrinsic[view][3], self.camExtrinsic[view][4],
                                                            self.camExtrinsic[view][5], self.camExtrinsic[view][6])
 
-    def write_bounds_2d(self, filepath, me_ob, index):
+    # bounds: precomputed (x, y, width, height) from bounds_2d_all_views, computed here if not given
+    def write_bounds_2d(self, filepath, me_ob, index, bounds=None):
         with open(filepath, "a+") as file:
             print("get bounding box of " + me_ob.name)
             print("3d location ", me_ob.matrix_world.translation)
-            x, y, width, height = self.camera_view_bounds_2d(me_ob)
+            if bounds is None:
+                bounds = self.camera_view_bounds_2d(me_ob)
+            x, y, width, height = bounds
             if x > bpy.context.scene.render.resolution_x or \
                y > bpy.context.scene.render.resolution_y or \
                x + width < 0 or \
@@ -135,4 +144,27 @@ class Camera:
                 max_y = coords.y
 
         print ("bbox : ", min_x, max_x, min_y, max_y)
-        return (min_x, min_y, max_x - min_x, max_y - min_y)
\ No newline at end of file
+        return (min_x, min_y, max_x - min_x, max_y - min_y)
+
+    # Object space vertices of a mesh as an (n, 3) array, cached per mesh. The
+    # convex hull has the same projected extremes as the full mesh.
+    def cacheModel(self, me_ob):
+        if me_ob.data.name in self.vertexCache:
+            return self.vertexCache[me_ob.data.name]
+        if self.useConvexHull:
+            bm = bmesh.new()
+            bm.from_mesh(me_ob.data)
+            hull = bmesh.ops.convex_hull(bm, input=bm.verts)
+            coords = [ele.co[:] for ele in hull['geom'] if isinstance(ele, bmesh.types.BMVert)]
+            bm.free()
+        if not self.useConvexHull or len(coords) == 0:
+            coords = [v.co[:] for v in me_ob.data.vertices]
+        self.vertexCache[me_ob.data.name] = numpy.array(coords, dtype=numpy.float64).reshape(-1, 3)
+        return self.vertexCache[me_ob.data.name]
+
+    # Bounds of all objects in all configured views with one projection, as a
+    # (numViews, len(objects), 4) array of (x, y, width, height).
+    def bounds_2d_all_views(self, objects):
+        vertices = [self.cacheModel(me_ob) for me_ob in objects]
+        matrices_world = [numpy.array(me_ob.matrix_world) for me_ob in objects]
+        return Projection.bounds_2d(self.projections, vertices, matrices_world)
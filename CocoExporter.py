@@ -0,0 +1,218 @@
+"""
+@file CocoExporter.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+COCO style annotation files written as images are labeled. Category ids are
+the label class ids (model index + 1), masks are optional compressed RLE.
+python CocoExporter.py rendered_images --masks --workers 8
+"""
+
+import os, sys, json, shutil, argparse, multiprocessing
+import os.path as osp
+import numpy as np
+from PIL import Image
+
+import DatasetPack
+import Progress
+
+# Run lengths of a binary mask in column major order, starting with a run of
+# zeros, as in the COCO mask api.
+def rle_counts(mask):
+    pixels = np.asarray(mask, dtype=bool).ravel(order='F')
+    changes = np.nonzero(pixels[1:] != pixels[:-1])[0] + 1
+    bounds = np.concatenate([[0], changes, [len(pixels)]])
+    counts = np.diff(bounds)
+    if len(pixels) > 0 and pixels[0]:
+        counts = np.concatenate([[0], counts])
+    return counts
+
+# Compressed RLE {'size': [h, w], 'counts': str} of a binary mask, the string
+# encoding of pycocotools: runs are stored as the difference to the run two
+# before, in 5 bit groups with a continuation bit, offset into printable ascii.
+def rle_encode(mask):
+    counts = rle_counts(mask)
+    chars = []
+    for k in range(len(counts)):
+        x = int(counts[k])
+        if k > 2:
+            x = x - int(counts[k - 2])
+        more = True
+        while more:
+            c = x & 0x1f
+            x = x >> 5
+            more = (x != -1) if (c & 0x10) else (x != 0)
+            if more:
+                c = c | 0x20
+            chars.append(chr(c + 48))
+    height, width = np.shape(mask)
+    return {'size': [int(height), int(width)], 'counts': ''.join(chars)}
+
+def rle_decode(rle):
+    counts = []
+    s = rle['counts']
+    p = 0
+    while p < len(s):
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x = x | ((c & 0x1f) << (5 * k))
+            more = bool(c & 0x20)
+            p = p + 1
+            k = k + 1
+            if not more and (c & 0x10):
+                x = x | (-1 << (5 * k))
+        if len(counts) > 2:
+            x = x + counts[-2]
+        counts.append(x)
+    height, width = rle['size']
+    values = np.zeros(len(counts), bool)
+    values[1::2] = True
+    return np.repeat(values, counts).reshape(width, height).T
+
+def mask_annotation(mask, classid, masks):
+    ys, xs = np.nonzero(mask)
+    annotation = {'category_id': int(classid), 'iscrowd': 0, 'area': int(len(xs)),
+                  'bbox': [int(xs.min()), int(ys.min()), int(xs.max() - xs.min() + 1), int(ys.max() - ys.min() + 1)]}
+    if masks:
+        annotation['segmentation'] = rle_encode(mask)
+    return annotation
+
+# COCO image entry and annotations (without ids) of a labeled image. Box labels
+# come from the bbox file (or the rows given), pixel labels from the
+# segmentation image. Masks of box labels need the object index render.
+def image_annotations(syn_images_folder, i, label_type, masks=False, boxes=None):
+    width, height = Image.open(osp.join(syn_images_folder, 'image_%05d.png' % i)).size
+    image = {'id': i, 'file_name': 'image_%05d.png' % i, 'width': width, 'height': height}
+    annotations = []
+    if label_type == 'pixel':
+        seg_img = np.array(Image.open(osp.join(syn_images_folder, 'seg_img_%05d.png' % i)))
+        for classid in np.unique(seg_img):
+            if classid != 0:
+                annotations.append(mask_annotation(seg_img == classid, classid, masks))
+        return image, annotations
+
+    if boxes is None:
+        bbox_filepath = osp.join(syn_images_folder, 'bbox_%05d.txt' % i)
+        boxes = np.zeros((0, 5), np.int64)
+        if osp.getsize(bbox_filepath) > 0:
+            box_list, class_ids = DatasetPack.read_bbox_file(bbox_filepath)
+            boxes = np.hstack([class_ids[:, np.newaxis], box_list])
+    index_map = None
+    index_img_filepath = osp.join(syn_images_folder, 'debug/index_%05d.png' % i)
+    if masks and osp.exists(index_img_filepath):
+        index_map = np.array(Image.open(index_img_filepath))
+    for classid, x1, y1, x2, y2 in boxes:
+        annotation = {'category_id': int(classid), 'iscrowd': 0, 'area': int((x2 - x1) * (y2 - y1)),
+                      'bbox': [int(x1), int(y1), int(x2 - x1), int(y2 - y1)]}
+        if index_map is not None:
+            mask = index_map == classid
+            annotation['area'] = int(np.count_nonzero(mask))
+            annotation['segmentation'] = rle_encode(mask)
+        annotations.append(annotation)
+    return image, annotations
+
+# Streams a COCO json file. Image entries and annotations go to two temporary
+# files as they come in, close() joins them behind the categories, so nothing
+# but the current image is held in memory.
+class CocoWriter:
+
+    def __init__(self, filepath, model_names):
+        self.filepath = filepath
+        self.categories = [{'id': k + 1, 'name': name, 'supercategory': 'object'} for k, name in enumerate(model_names)]
+        self.images = open(filepath + '.images.tmp', 'w')
+        self.annotations = open(filepath + '.annotations.tmp', 'w')
+        self.numImages = 0
+        self.numAnnotations = 0
+
+    def add(self, image, annotations):
+        self.images.write((',\n' if self.numImages > 0 else '') + json.dumps(image))
+        self.numImages = self.numImages + 1
+        for annotation in annotations:
+            self.numAnnotations = self.numAnnotations + 1
+            annotation = dict(annotation, id=self.numAnnotations, image_id=image['id'])
+            self.annotations.write((',\n' if self.numAnnotations > 1 else '') + json.dumps(annotation))
+
+    def close(self):
+        self.images.close()
+        self.annotations.close()
+        with open(self.filepath + '.tmp', 'w') as file:
+            file.write('{"info": {"description": "physim dataset"},\n"categories": %s,\n"images": [\n' %
+                       json.dumps(self.categories))
+            for fragment, end in [(self.images.name, '\n],\n"annotations": [\n'), (self.annotations.name, '\n]}\n')]:
+                with open(fragment, 'r') as src_file:
+                    shutil.copyfileobj(src_file, file)
+                file.write(end)
+                os.remove(fragment)
+        os.replace(self.filepath + '.tmp', self.filepath)
+
+# COCO annotations of the images labeled in a folder, one json line per image,
+# until the folder is finished. Lines of images rendered again after a crash
+# are dropped by Progress.remove_partial_outputs.
+def append_fragment(syn_images_folder, image, annotations):
+    with open(osp.join(syn_images_folder, Progress.COCO_FRAGMENT_FILENAME), 'a') as file:
+        file.write(json.dumps({'image': image['id'], 'entry': image, 'annotations': annotations}) + '\n')
+
+# Add the images of a finished folder to a writer: from its fragment, or read
+# back from the label files for images labeled by an earlier attempt. The
+# fragment is removed.
+def flush_fragment(writer, syn_images_folder, indices, label_type, masks=False):
+    written = set()
+    fragment_filepath = osp.join(syn_images_folder, Progress.COCO_FRAGMENT_FILENAME)
+    if osp.exists(fragment_filepath):
+        wanted = set(indices)
+        with open(fragment_filepath, 'r') as file:
+            for line in file:
+                try:
+                    line = json.loads(line)
+                except ValueError:
+                    continue
+                if line['image'] in wanted and line['image'] not in written:
+                    writer.add(line['entry'], line['annotations'])
+                    written.add(line['image'])
+        os.remove(fragment_filepath)
+    for i in indices:
+        if i not in written:
+            writer.add(*image_annotations(syn_images_folder, i, label_type, masks))
+
+def export_image(task):
+    syn_images_folder, i, label_type, masks = task
+    return image_annotations(syn_images_folder, i, label_type, masks)
+
+# COCO file of the images [0, num_images) of a labeled folder.
+def export_folder(syn_images_folder, filepath, model_names, label_type, num_images, masks=False, num_workers=1):
+    writer = CocoWriter(filepath, model_names)
+    pool = multiprocessing.Pool(max(1, num_workers))
+    tasks = [(syn_images_folder, i, label_type, masks) for i in range(num_images)]
+    for image, annotations in pool.imap(export_image, tasks, chunksize=64):
+        writer.add(image, annotations)
+    pool.close()
+    pool.join()
+    writer.close()
+    return writer
+
+if __name__ == "__main__":
+    from ConfigParser import ConfigParser
+    parser = argparse.ArgumentParser(description='export the labels of a generated dataset as a COCO json file')
+    parser.add_argument('folder', nargs='?', default='rendered_images', help='labeled dataset')
+    parser.add_argument('--config', default='config.yml', help='configuration file of the dataset')
+    parser.add_argument('--output', default=None, help='json file (default: <folder>/annotations.json)')
+    parser.add_argument('--masks', action='store_true', help='add RLE masks (pixel labels or an object index render)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    args = parser.parse_args()
+
+    cfg = ConfigParser(args.config)
+    num_images = 0
+    while osp.exists(osp.join(args.folder, 'image_%05d.png' % num_images)):
+        num_images = num_images + 1
+    if num_images == 0:
+        print("no images in %s" % args.folder)
+        sys.exit(1)
+    filepath = args.output if args.output is not None else osp.join(args.folder, 'annotations.json')
+    writer = export_folder(args.folder, filepath, cfg.getObjModelList(), cfg.getLabelType(), num_images,
+                           args.masks, args.workers)
+    print("%d images, %d annotations written to %s" % (writer.numImages, writer.numAnnotations, filepath))
@@ -7,66 +7,290 @@ Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
 """
 
 import yaml
-import os,sys
+import os
+import numpy as np
+import Projection
 
+LABEL_TYPES = ['box', 'pixel']
+BLEND_SNAPSHOT_MODES = ['off', 'every_n', 'failure']
+SURFACE_FILES = {'table': 'surface_models/table/table.obj', 'shelf': 'surface_models/shelf/shelf.obj'}
+# colors of Label.SEGMENTATION_PALETTE, the background included
+PALETTE_SIZE = 18
+
+class ConfigError(Exception):
+	pass
+
+# path of the mesh of a model, relative to the repository
+def model_file(name):
+	return os.path.join('obj_models', name, name + '.obj')
+
+# read-only float64 array of a config value, None in shape matches any length
+def frozen_array(value, shape, name):
+	try:
+		array = np.array(value, dtype=np.float64)
+	except (TypeError, ValueError):
+		raise ConfigError('%s must be numbers of shape %s' % (name, shape))
+	if array.ndim != len(shape) or any(n is not None and n != m for n, m in zip(shape, array.shape)):
+		raise ConfigError('%s must have shape %s, not %s' % (name, shape, array.shape))
+	array.flags.writeable = False
+	return array
+
+# a [min, max] range as a read-only array
+def frozen_range(value, name):
+	array = frozen_array(value, (2,), name)
+	if array[0] > array[1]:
+		raise ConfigError('%s: min %g is larger than max %g' % (name, array[0], array[1]))
+	return array
+
+# Parsed and checked once at load: values become typed attributes (NumPy
+# arrays that cannot be written to for poses, intrinsics and ranges), the
+# getters only return them. A broken file raises ConfigError.
 class ConfigParser:
-	data = []
 
 	def __init__(self, filepath):
 		if os.path.exists(filepath) == False:
-			print('please create config.yml file with simulation parameters !!!')
-			sys.exit()
+			raise ConfigError('please create %s with simulation parameters !!!' % filepath)
 
 		with open(filepath,"r") as file_descriptor:
-			self.data=yaml.load(file_descriptor)
+			try:
+				self.data = yaml.safe_load(file_descriptor)
+			except yaml.YAMLError as e:
+				raise ConfigError('%s is not valid yaml: %s' % (filepath, e))
+		if not isinstance(self.data, dict):
+			raise ConfigError('%s must be a mapping' % filepath)
+		for section in ['camera', 'rest_surface', 'Models', 'params']:
+			if section not in self.data:
+				raise ConfigError('%s has no %s section' % (filepath, section))
+
+		camera = self.section('camera')
+		self.camIntrinsic = frozen_array(self.required(camera, 'camera', 'camera_intrinsics'), (3, 3), 'camera.camera_intrinsics')
+		if self.camIntrinsic[0][0] == 0 or self.camIntrinsic[1][1] == 0:
+			raise ConfigError('camera.camera_intrinsics: the focal lengths f_x and f_y must not be 0')
+		if self.camIntrinsic[0][2] <= 0 or self.camIntrinsic[1][2] <= 0:
+			raise ConfigError('camera.camera_intrinsics: the principal point c_x, c_y must be positive, it sets the image size')
+		self.imageSize = Projection.image_size(self.camIntrinsic)
+		self.camExtrinsic = frozen_array(self.required(camera, 'camera', 'camera_poses'), (None, 7), 'camera.camera_poses')
+		self.numViews = self.integer(camera, 'camera', 'num_poses', minimum=1)
+		if self.numViews > len(self.camExtrinsic):
+			raise ConfigError('camera.num_poses is %d but camera.camera_poses has %d poses' %
+			                  (self.numViews, len(self.camExtrinsic)))
+
+		surface = self.section('rest_surface')
+		self.surfaceType = self.choice(surface, 'rest_surface', 'type', sorted(SURFACE_FILES))
+		self.surfacePose = frozen_array(self.required(surface, 'rest_surface', 'surface_pose'), (7,), 'rest_surface.surface_pose')
+
+		models = self.data['Models']
+		if not isinstance(models, list) or len(models) == 0 or not all(isinstance(name, str) for name in models):
+			raise ConfigError('Models must be a non-empty list of model names')
+		if len(set(models)) != len(models):
+			raise ConfigError('Models lists %s more than once' % sorted(set(name for name in models if models.count(name) > 1)))
+		self.models = tuple(models)
+
+		params = self.section('params')
+		self.numImages = self.integer(params, 'params', 'num_images', minimum=1)
+		self.labelType = self.choice(params, 'params', 'label_type', LABEL_TYPES)
+		if self.labelType == 'pixel' and len(self.models) + 1 > PALETTE_SIZE:
+			raise ConfigError('%d models, the segmentation palette has colors for %d classes' %
+			                  (len(self.models), PALETTE_SIZE - 1))
+		self.minObjects = self.integer(params, 'params', 'minimum_objects_in_scene', minimum=0)
+		self.maxObjects = self.integer(params, 'params', 'maximum_objects_in_scene', minimum=1)
+		if self.minObjects > self.maxObjects:
+			raise ConfigError('params.minimum_objects_in_scene is larger than params.maximum_objects_in_scene')
+		if self.minObjects > len(self.models):
+			raise ConfigError('params.minimum_objects_in_scene is %d but there are %d models' % (self.minObjects, len(self.models)))
+		if self.maxObjects > len(self.models):
+			raise ConfigError('params.maximum_objects_in_scene is %d but there are %d models' % (self.maxObjects, len(self.models)))
+		self.rangeX = frozen_range(self.required(params, 'params', 'range_x'), 'params.range_x')
+		self.rangeY = frozen_range(self.required(params, 'params', 'range_y'), 'params.range_y')
+		self.rangeZ = frozen_range(self.required(params, 'params', 'range_z'), 'params.range_z')
+		self.lightRangeX = frozen_range(self.required(params, 'params', 'light_position_range_x'), 'params.light_position_range_x')
+		self.lightRangeY = frozen_range(self.required(params, 'params', 'light_position_range_y'), 'params.light_position_range_y')
+		self.lightRangeZ = frozen_range(self.required(params, 'params', 'light_position_range_z'), 'params.light_position_range_z')
+		self.numSimulationSteps = self.integer(params, 'params', 'num_simulation_steps', minimum=1)
+
+		self.objectIndexPass = self.boolean(params, 'params', 'object_index_pass', False)
+		self.bboxConvexHull = self.boolean(params, 'params', 'bbox_convex_hull', True)
+		self.assetCacheFolder = self.folder(params, 'params', 'asset_cache')
+		self.adaptiveSimulation = self.boolean(params, 'params', 'adaptive_simulation', False)
+		self.restLinearThreshold = self.number(params, 'params', 'rest_linear_threshold', 0.0005)
+		self.restAngularThreshold = self.number(params, 'params', 'rest_angular_threshold', 0.005)
+		self.restFrames = self.integer(params, 'params', 'rest_frames', 5, minimum=1)
+		self.collisionProxy = self.boolean(params, 'params', 'collision_proxy', False)
+		self.collisionProxyMaxVertices = self.integer(params, 'params', 'collision_proxy_max_vertices', 64, minimum=4)
+		self.blendSnapshots = self.choice(params, 'params', 'blend_snapshots', BLEND_SNAPSHOT_MODES, 'off')
+		self.blendSnapshotInterval = self.integer(params, 'params', 'blend_snapshot_interval', 1, minimum=1)
+		self.minVisibleArea = self.number(params, 'params', 'min_visible_area', 50)
+		self.minVisibilityRatio = self.number(params, 'params', 'min_visibility_ratio', 0.0)
+		self.rendersPerSimulation = self.integer(params, 'params', 'renders_per_simulation', 1, minimum=1)
+		self.debugImageInterval = self.integer(params, 'params', 'debug_image_interval', 1, minimum=0)
+		self.asyncImageWriting = self.boolean(params, 'params', 'async_image_writing', False)
+		self.pngCompression = self.integer(params, 'params', 'png_compression', 1, minimum=0)
+		if self.pngCompression > 9:
+			raise ConfigError('params.png_compression must be between 0 and 9, not %d' % self.pngCompression)
+		self.imageWriterThreads = self.integer(params, 'params', 'image_writer_threads', 2, minimum=1)
+		self.poseLibraryFolder = self.folder(params, 'params', 'pose_library')
+
+	def section(self, name):
+		if not isinstance(self.data[name], dict):
+			raise ConfigError('%s must be a mapping' % name)
+		return self.data[name]
+
+	def required(self, values, section, key):
+		if values.get(key) is None:
+			raise ConfigError('%s.%s is missing' % (section, key))
+		return values[key]
+
+	def integer(self, values, section, key, default=None, minimum=None):
+		value = self.required(values, section, key) if default is None else values.get(key, default)
+		if isinstance(value, bool) or not isinstance(value, int):
+			raise ConfigError('%s.%s must be an integer, not %r' % (section, key, value))
+		if minimum is not None and value < minimum:
+			raise ConfigError('%s.%s must be at least %d' % (section, key, minimum))
+		return value
+
+	def number(self, values, section, key, default):
+		value = values.get(key, default)
+		if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+			raise ConfigError('%s.%s must be a non-negative number, not %r' % (section, key, value))
+		return float(value)
+
+	def boolean(self, values, section, key, default):
+		value = values.get(key, default)
+		if not isinstance(value, bool):
+			raise ConfigError('%s.%s must be true or false, not %r' % (section, key, value))
+		return value
+
+	def choice(self, values, section, key, choices, default=None):
+		value = self.required(values, section, key) if default is None else values.get(key, default)
+		if value not in choices:
+			raise ConfigError('%s.%s must be one of %s, not %r' % (section, key, ', '.join(choices), value))
+		return value
+
+	def folder(self, values, section, key):
+		value = values.get(key, None)
+		if value is not None and not isinstance(value, str):
+			raise ConfigError('%s.%s must be a folder name, not %r' % (section, key, value))
+		return value
+
+	# Every file a worker imports, checked before Blender is started. Raises
+	# ConfigError listing the missing ones.
+	def checkAssets(self, root='.'):
+		missing = [filepath for filepath in [SURFACE_FILES[self.surfaceType]] + [model_file(name) for name in self.models]
+		           if not os.path.isfile(os.path.join(root, filepath))]
+		if missing:
+			raise ConfigError('missing model files: %s' % ', '.join(missing))
 
 	def getSurfaceType(self):
-		return self.data['rest_surface']['type']
+		return self.surfaceType
+
+	def getSurfaceFile(self):
+		return SURFACE_FILES[self.surfaceType]
 
 	def getSurfacePose(self):
-		return self.data['rest_surface']['surface_pose']
+		return self.surfacePose
 
 	def getCamIntrinsic(self):
-		return self.data['camera']['camera_intrinsics']
+		return self.camIntrinsic
+
+	# (width, height) in pixels, ints
+	def getImageSize(self):
+		return self.imageSize
 
 	def getCamExtrinsic(self):
-		return self.data['camera']['camera_poses']
+		return self.camExtrinsic
 
 	def getObjModelList(self):
-		return self.data['Models']
+		return self.models
 
 	def getNumTrainingImages(self):
-		return self.data['params']['num_images']
+		return self.numImages
 
 	def getLabelType(self):
-		return self.data['params']['label_type']
+		return self.labelType
 
 	def getMinObjectsScene(self):
-		return self.data['params']['minimum_objects_in_scene']
+		return self.minObjects
 
 	def getMaxObjectsScene(self):
-		return self.data['params']['maximum_objects_in_scene']
+		return self.maxObjects
 
 	def getRangeX(self):
-		return self.data['params']['range_x']
+		return self.rangeX
 
 	def getRangeY(self):
-		return self.data['params']['range_y']
+		return self.rangeY
 
 	def getRangeZ(self):
-		return self.data['params']['range_z']
+		return self.rangeZ
 
 	def getNumSimulationSteps(self):
-		return self.data['params']['num_simulation_steps']
+		return self.numSimulationSteps
 
 	def getNumViews(self):
-		return self.data['camera']['num_poses']
+		return self.numViews
 
 	def getLightRangeX(self):
-		return self.data['params']['light_position_range_x']
+		return self.lightRangeX
 
 	def getLightRangeY(self):
-		return self.data['params']['light_position_range_y']
+		return self.lightRangeY
 
 	def getLightRangeZ(self):
-		return self.data['params']['light_position_range_z']
\ No newline at end of file
+		return self.lightRangeZ
+
+	def getObjectIndexPass(self):
+		return self.objectIndexPass
+
+	def getBBoxConvexHull(self):
+		return self.bboxConvexHull
+
+	def getAssetCacheFolder(self):
+		return self.assetCacheFolder
+
+	def getAdaptiveSimulation(self):
+		return self.adaptiveSimulation
+
+	def getRestLinearThreshold(self):
+		return self.restLinearThreshold
+
+	def getRestAngularThreshold(self):
+		return self.restAngularThreshold
+
+	def getRestFrames(self):
+		return self.restFrames
+
+	def getCollisionProxy(self):
+		return self.collisionProxy
+
+	def getCollisionProxyMaxVertices(self):
+		return self.collisionProxyMaxVertices
+
+	def getBlendSnapshots(self):
+		return self.blendSnapshots
+
+	def getBlendSnapshotInterval(self):
+		return self.blendSnapshotInterval
+
+	def getMinVisibleArea(self):
+		return self.minVisibleArea
+
+	def getMinVisibilityRatio(self):
+		return self.minVisibilityRatio
+
+	def getRendersPerSimulation(self):
+		return self.rendersPerSimulation
+
+	def getDebugImageInterval(self):
+		return self.debugImageInterval
+
+	def getAsyncImageWriting(self):
+		return self.asyncImageWriting
+
+	def getPngCompression(self):
+		return self.pngCompression
+
+	def getImageWriterThreads(self):
+		return self.imageWriterThreads
+
+	def getPoseLibraryFolder(self):
+		return self.poseLibraryFolder
@@ -0,0 +1,173 @@
+"""
+@file DatasetPack.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import os, io, tarfile
+import os.path as osp
+import numpy as np
+import cv2
+from PIL import Image
+
+# One row per sample, the image and mask bytes are located inside the pack
+# files by offset so a reader never has to list or scan a tar.
+INDEX_DTYPE = np.dtype([('sample_id', np.int64), ('pack', np.int32),
+                        ('image_offset', np.int64), ('image_size', np.int64),
+                        ('mask_offset', np.int64), ('mask_size', np.int64),
+                        ('box_start', np.int64), ('box_count', np.int32)])
+
+def pack_filename(pack):
+    return 'pack_%05d.tar' % pack
+
+# Writes samples into tar files of about pack_bytes each, plus index.npy,
+# boxes.npy (tl_x, tl_y, br_x, br_y) and class_ids.npy next to them.
+class PackWriter:
+    def __init__(self, pack_folder, pack_bytes=256 << 20):
+        self.pack_folder = pack_folder
+        self.pack_bytes = pack_bytes
+        if not osp.exists(pack_folder):
+            os.makedirs(pack_folder)
+        self.pack = -1
+        self.tar = None
+        self.index = []
+        self.boxes = []
+        self.class_ids = []
+        self.num_boxes = 0
+
+    # add one member and return the offset of its data inside the tar file
+    def addMember(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self.tar.addfile(info, io.BytesIO(data))
+        return self.tar.offset - (-(-len(data) // tarfile.BLOCKSIZE)) * tarfile.BLOCKSIZE
+
+    # image_bytes / mask_bytes: encoded png files, mask_bytes may be None
+    # boxes: (n, 4) array of tl_x, tl_y, br_x, br_y, class_ids: (n,) array
+    def add(self, sample_id, image_bytes, mask_bytes, boxes, class_ids):
+        if self.tar is None or self.tar.offset >= self.pack_bytes:
+            self.nextPack()
+
+        image_offset = self.addMember('%05d/image.png' % sample_id, image_bytes)
+        mask_offset, mask_size = -1, 0
+        if mask_bytes is not None:
+            mask_offset = self.addMember('%05d/seg.png' % sample_id, mask_bytes)
+            mask_size = len(mask_bytes)
+
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.index.append((sample_id, self.pack, image_offset, len(image_bytes),
+                           mask_offset, mask_size, self.num_boxes, len(boxes)))
+        self.boxes.append(boxes)
+        self.class_ids.append(np.asarray(class_ids, dtype=np.int32).reshape(-1))
+        self.num_boxes = self.num_boxes + len(boxes)
+
+    def nextPack(self):
+        if self.tar is not None:
+            self.tar.close()
+        self.pack = self.pack + 1
+        self.tar = tarfile.open(osp.join(self.pack_folder, pack_filename(self.pack)), 'w', format=tarfile.USTAR_FORMAT)
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+        np.save(osp.join(self.pack_folder, 'index.npy'), np.array(self.index, dtype=INDEX_DTYPE))
+        np.save(osp.join(self.pack_folder, 'boxes.npy'),
+                np.concatenate(self.boxes) if self.boxes else np.zeros((0, 4), np.int32))
+        np.save(osp.join(self.pack_folder, 'class_ids.npy'),
+                np.concatenate(self.class_ids) if self.class_ids else np.zeros((0,), np.int32))
+
+# Random access to a packed dataset. The index arrays are memory mapped, a
+# sample costs one seek and read per image.
+class PackReader:
+    def __init__(self, pack_folder):
+        self.pack_folder = pack_folder
+        self.index = np.load(osp.join(pack_folder, 'index.npy'), mmap_mode='r')
+        self.boxes = np.load(osp.join(pack_folder, 'boxes.npy'), mmap_mode='r')
+        self.class_ids = np.load(osp.join(pack_folder, 'class_ids.npy'), mmap_mode='r')
+        self.files = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def read(self, pack, offset, size):
+        if pack not in self.files:
+            self.files[pack] = open(osp.join(self.pack_folder, pack_filename(pack)), 'rb')
+        self.files[pack].seek(offset)
+        return self.files[pack].read(size)
+
+    # position of a sample id in the index
+    def find(self, sample_id):
+        position = int(np.searchsorted(self.index['sample_id'], sample_id))
+        if position >= len(self.index) or self.index['sample_id'][position] != sample_id:
+            raise KeyError(sample_id)
+        return position
+
+    def imageBytes(self, position):
+        row = self.index[position]
+        return self.read(int(row['pack']), int(row['image_offset']), int(row['image_size']))
+
+    def maskBytes(self, position):
+        row = self.index[position]
+        if row['mask_size'] == 0:
+            return None
+        return self.read(int(row['pack']), int(row['mask_offset']), int(row['mask_size']))
+
+    def labels(self, position):
+        row = self.index[position]
+        start, count = int(row['box_start']), int(row['box_count'])
+        return np.array(self.boxes[start:start + count]), np.array(self.class_ids[start:start + count])
+
+    # decoded sample at a position of the index: image (BGR like cv2.imread),
+    # mask (class ids, None in box mode), boxes and their class ids
+    def __getitem__(self, position):
+        image = cv2.imdecode(np.frombuffer(self.imageBytes(position), np.uint8), cv2.IMREAD_COLOR)
+        mask = None
+        mask_bytes = self.maskBytes(position)
+        if mask_bytes is not None:
+            mask = np.array(Image.open(io.BytesIO(mask_bytes)))
+        boxes, class_ids = self.labels(position)
+        return {'sample_id': int(self.index[position]['sample_id']), 'image': image, 'mask': mask,
+                'boxes': boxes, 'class_ids': class_ids}
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+# labels of a bbox_%05d.txt file as (boxes, class ids)
+def read_bbox_file(bbox_filepath):
+    labels = np.loadtxt(bbox_filepath, delimiter=',', dtype=np.int32, ndmin=2).reshape(-1, 5)
+    return labels[:, 1:5], labels[:, 0]
+
+# Pack the loose outputs of a finished run. Packed files are removed unless
+# keep_files is set, the debug folder is left untouched.
+def pack_folder(syn_images_folder, num_of_images, pack_bytes=256 << 20, keep_files=False):
+    writer = PackWriter(osp.join(syn_images_folder, 'packs'), pack_bytes)
+    for i in range(0, num_of_images):
+        filepaths = [osp.join(syn_images_folder, 'image_%05d.png' % i)]
+        with open(filepaths[0], 'rb') as file:
+            image_bytes = file.read()
+
+        mask_bytes = None
+        seg_filepath = osp.join(syn_images_folder, 'seg_img_%05d.png' % i)
+        if osp.exists(seg_filepath):
+            filepaths.append(seg_filepath)
+            with open(seg_filepath, 'rb') as file:
+                mask_bytes = file.read()
+
+        boxes, class_ids = np.zeros((0, 4), np.int32), np.zeros((0,), np.int32)
+        bbox_filepath = osp.join(syn_images_folder, 'bbox_%05d.txt' % i)
+        if osp.exists(bbox_filepath):
+            filepaths.append(bbox_filepath)
+            if osp.getsize(bbox_filepath) > 0:
+                boxes, class_ids = read_bbox_file(bbox_filepath)
+
+        writer.add(i, image_bytes, mask_bytes, boxes, class_ids)
+        if not keep_files:
+            for filepath in filepaths:
+                os.remove(filepath)
+    writer.close()
+    return writer.pack + 1
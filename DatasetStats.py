@@ -0,0 +1,232 @@
+"""
+@file DatasetStats.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Label statistics of a generated dataset: objects per class, labels per
+image, empty images and scenes, box sizes, degenerate boxes, boxes cut by the
+image border, objects out of frame and the visible part of each projected box.
+python DatasetStats.py rendered_images --workers 8
+"""
+
+import sys, json, glob, argparse, multiprocessing
+import os.path as osp
+import numpy as np
+from PIL import Image
+
+import Label
+import Progress
+from Timing import percentiles
+
+STATS_FILENAME = 'dataset_stats.json'
+# images per task of the pool
+CHUNK_SIZE = 1024
+
+# Labels and projected boxes of the images [start, end), as arrays:
+# labels (image, classid, x1, y1, x2, y2, area) with br exclusive and the
+# area in pixels for pixel labels, projected (image, classid, x, y, width,
+# height) from the raw boxes, and the images without a label file. Box labels
+# are not read when they come from the annotation files.
+def load_chunk(task):
+    syn_images_folder, label_type, start, end, with_labels = task
+    pLabel = Label.Label()
+    labels, projected, missing = [], [], []
+    for i in range(start, end):
+        raw_filepath = osp.join(syn_images_folder, 'debug/raw_bbox_%05d.txt' % i)
+        if osp.exists(raw_filepath):
+            raw = Label.read_raw_bboxes(raw_filepath)
+            projected.append(np.hstack([np.full((len(raw), 1), i), raw[:, 0:1] + 1, raw[:, 1:5]]))
+        if not with_labels:
+            continue
+        if label_type == 'pixel':
+            seg_filepath = osp.join(syn_images_folder, 'seg_img_%05d.png' % i)
+            if not osp.exists(seg_filepath):
+                missing.append(i)
+                continue
+            counts, boxes = pLabel.visible_boxes(np.array(Image.open(seg_filepath)))
+            classids = np.nonzero(counts[1:])[0] + 1
+            labels.append(np.hstack([np.full((len(classids), 1), i), classids[:, np.newaxis],
+                                     boxes[classids], counts[classids, np.newaxis]]))
+        else:
+            bbox_filepath = osp.join(syn_images_folder, 'bbox_%05d.txt' % i)
+            if not osp.exists(bbox_filepath):
+                missing.append(i)
+                continue
+            rows = np.zeros((0, 5), np.int64)
+            if osp.getsize(bbox_filepath) > 0:
+                rows = np.loadtxt(bbox_filepath, delimiter=',', dtype=np.int64, ndmin=2).reshape(-1, 5)
+            labels.append(np.hstack([np.full((len(rows), 1), i), rows, box_areas(rows[:, 1:5])[:, np.newaxis]]))
+    return (np.vstack(labels + [np.zeros((0, 7))]).astype(np.int64),
+            np.vstack(projected + [np.zeros((0, 6))]).astype(np.float64), missing)
+
+def box_areas(boxes):
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+# box labels of the annotation files of the shards, None when there are none
+def load_annotation_files(syn_images_folder):
+    filepaths = sorted(glob.glob(osp.join(syn_images_folder, 'annotations_*.txt')))
+    if osp.exists(osp.join(syn_images_folder, Label.ANNOTATIONS_FILENAME)):
+        filepaths.append(osp.join(syn_images_folder, Label.ANNOTATIONS_FILENAME))
+    if not filepaths:
+        return None
+    rows = np.vstack([Label.read_annotations(filepath) for filepath in filepaths])
+    return np.hstack([rows, box_areas(rows[:, 2:6])[:, np.newaxis]])
+
+# (image, classid) of every object placed in a scene, and the images of every
+# scene, from one scene record file
+def load_records(filepath):
+    objects, scenes = [], []
+    with open(filepath, 'r') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            images = [view['image'] for view in record['images']]
+            scenes.append(images)
+            objects.extend((i, obj['class_id'] + 1) for i in images for obj in record['objects'])
+    return np.array(objects, np.int64).reshape(-1, 2), scenes
+
+# (image, classid) pairs as single keys for matching
+def pair_keys(images, classids):
+    return images.astype(np.int64) * 65536 + classids.astype(np.int64)
+
+def distribution(values):
+    if len(values) == 0:
+        return None
+    return percentiles(values)
+
+# The statistics of a folder, reading the label files with a pool of
+# num_workers processes. Box labels are taken from the annotation files when
+# the run wrote them. Boxes narrower or lower than min_size pixels count as
+# degenerate, a projected box touching the image border as truncated.
+def dataset_stats(syn_images_folder, model_names, label_type, num_images, width, height, min_size=2, num_workers=1):
+    labels = load_annotation_files(syn_images_folder) if label_type != 'pixel' else None
+    tasks = [(syn_images_folder, label_type, start, min(start + CHUNK_SIZE, num_images), labels is None)
+             for start in range(0, num_images, CHUNK_SIZE)]
+    record_files = sorted(glob.glob(osp.join(syn_images_folder, 'debug', 'scenes_*.jsonl')))
+    pool = multiprocessing.Pool(max(1, num_workers))
+    chunks = pool.map(load_chunk, tasks)
+    records = pool.map(load_records, record_files)
+    pool.close()
+    pool.join()
+
+    if labels is None:
+        labels = np.vstack([chunk[0] for chunk in chunks] + [np.zeros((0, 7), np.int64)])
+    labels = labels[labels[:, 0] < num_images]
+    projected = np.vstack([chunk[1] for chunk in chunks] + [np.zeros((0, 6))])
+    missing = sorted(i for chunk in chunks for i in chunk[2])
+    objects = np.vstack([objs for objs, scenes in records] + [np.zeros((0, 2), np.int64)])
+    objects = objects[objects[:, 0] < num_images]
+    scenes = [images for objs, scenes in records for images in scenes]
+
+    num_classes = len(model_names) + 1
+    labels_per_image = np.bincount(labels[:, 0], minlength=num_images)
+    labeled = np.ones(num_images, bool)
+    labeled[missing] = False
+    empty = (labels_per_image == 0) & labeled
+
+    widths = labels[:, 4] - labels[:, 2]
+    heights = labels[:, 5] - labels[:, 3]
+    degenerate = (widths < min_size) | (heights < min_size)
+    truncated = (projected[:, 2] <= 0) | (projected[:, 3] <= 0) | \
+                (projected[:, 2] + projected[:, 4] >= width) | (projected[:, 3] + projected[:, 5] >= height)
+
+    # projected boxes with a label, and the visible part of each labeled box
+    label_keys = pair_keys(labels[:, 0], labels[:, 1])
+    projected_keys = pair_keys(projected[:, 0], projected[:, 1])
+    order = np.argsort(label_keys, kind='stable')
+    position = np.zeros(len(projected), np.int64)
+    has_label = np.zeros(len(projected), bool)
+    if len(order) > 0:
+        position = np.minimum(np.searchsorted(label_keys[order], projected_keys), len(order) - 1)
+        has_label = label_keys[order][position] == projected_keys
+    # projected boxes of labeled images the labels dropped as not visible enough
+    hidden = ~has_label & labeled[projected[:, 0].astype(np.int64)]
+    visible_ratio = labels[order][position[has_label], 6] / np.maximum(projected[has_label, 4] * projected[has_label, 5], 1.0)
+
+    # placed objects without a projected box left the camera view
+    in_frame = np.isin(pair_keys(objects[:, 0], objects[:, 1]), projected_keys)
+
+    classes = []
+    for classid in range(1, num_classes):
+        placed = objects[:, 1] == classid
+        boxes = projected[:, 1] == classid
+        classes.append({'id': classid, 'name': model_names[classid - 1],
+                        'labels': int(np.count_nonzero(labels[:, 1] == classid)),
+                        'projected': int(np.count_nonzero(boxes)),
+                        'placed': int(np.count_nonzero(placed)),
+                        'out_of_frame': int(np.count_nonzero(placed & ~in_frame)),
+                        'truncated': int(np.count_nonzero(boxes & truncated)),
+                        'hidden': int(np.count_nonzero(boxes & hidden))})
+
+    empty_scenes = [images[0] for images in scenes if all(i >= num_images or empty[i] for i in images)]
+    return {'images': num_images, 'label_type': label_type, 'width': width, 'height': height,
+            'labels': int(len(labels)), 'unlabeled_images': missing[:100], 'num_unlabeled_images': len(missing),
+            'labels_per_image': distribution(labels_per_image[labeled]),
+            'empty_images': int(np.count_nonzero(empty)),
+            'scenes': len(scenes), 'empty_scenes': len(empty_scenes), 'first_empty_scenes': empty_scenes[:100],
+            'box_width': distribution(widths), 'box_height': distribution(heights), 'box_area': distribution(labels[:, 6]),
+            'min_size': min_size, 'degenerate_boxes': int(np.count_nonzero(degenerate)),
+            'projected': int(len(projected)), 'truncated': int(np.count_nonzero(truncated)),
+            'hidden': int(np.count_nonzero(hidden)), 'visible_ratio': distribution(visible_ratio),
+            'placed': int(len(objects)), 'out_of_frame': int(np.count_nonzero(~in_frame)),
+            'classes': classes}
+
+def rate(count, total):
+    return 100.0 * count / total if total > 0 else 0.0
+
+def format_stats(stats):
+    lines = ["%d images, %d %s labels, %d images unlabeled" %
+             (stats['images'], stats['labels'], stats['label_type'], stats['num_unlabeled_images'])]
+    if stats['labels_per_image'] is not None:
+        lines.append("labels per image: %.2f mean, %d p50, %d max" %
+                     (stats['labels_per_image']['mean'], stats['labels_per_image']['p50'], stats['labels_per_image']['max']))
+    lines.append("empty images: %d (%.1f%%), empty scenes: %d of %d" %
+                 (stats['empty_images'], rate(stats['empty_images'], stats['images']), stats['empty_scenes'], stats['scenes']))
+    for name in ['box_width', 'box_height', 'box_area']:
+        if stats[name] is not None:
+            lines.append("%-11s p50 %8.0f  p90 %8.0f  max %8.0f" % (name, stats[name]['p50'], stats[name]['p90'], stats[name]['max']))
+    lines.append("degenerate boxes (< %d px): %d (%.2f%%)" %
+                 (stats['min_size'], stats['degenerate_boxes'], rate(stats['degenerate_boxes'], stats['labels'])))
+    lines.append("projected boxes: %d, truncated by the border %.1f%%, hidden %.1f%%" %
+                 (stats['projected'], rate(stats['truncated'], stats['projected']), rate(stats['hidden'], stats['projected'])))
+    if stats['visible_ratio'] is not None:
+        lines.append("visible part of a labeled box: p50 %.2f, p90 %.2f" % (stats['visible_ratio']['p50'], stats['visible_ratio']['p90']))
+    lines.append("placed objects: %d, out of frame %.1f%%" % (stats['placed'], rate(stats['out_of_frame'], stats['placed'])))
+    lines.append("%-36s %8s %8s %8s %8s %8s" % ('class', 'labels', 'images%', 'out%', 'trunc%', 'hidden%'))
+    for entry in stats['classes']:
+        lines.append("%-36s %8d %8.1f %8.1f %8.1f %8.1f" %
+                     (entry['name'][:36], entry['labels'], rate(entry['labels'], stats['images']),
+                      rate(entry['out_of_frame'], entry['placed']), rate(entry['truncated'], entry['projected']),
+                      rate(entry['hidden'], entry['projected'])))
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    from ConfigParser import ConfigParser
+    parser = argparse.ArgumentParser(description='label statistics of a generated dataset')
+    parser.add_argument('folder', nargs='?', default='rendered_images', help='labeled dataset')
+    parser.add_argument('--config', default='config.yml', help='configuration file of the dataset')
+    parser.add_argument('--min-size', type=int, default=2, help='boxes narrower or lower than this many pixels are degenerate')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    args = parser.parse_args()
+
+    cfg = ConfigParser(args.config)
+    run = Progress.read_run(args.folder)
+    if run is not None:
+        num_images = run['num_images']
+    else:
+        num_images = 0
+        while osp.exists(osp.join(args.folder, 'image_%05d.png' % num_images)):
+            num_images = num_images + 1
+    if num_images == 0:
+        print("no images in %s" % args.folder)
+        sys.exit(1)
+    width, height = cfg.getImageSize()
+    stats = dataset_stats(args.folder, cfg.getObjModelList(), cfg.getLabelType(), num_images,
+                          width, height, args.min_size, args.workers)
+    with open(osp.join(args.folder, 'debug', STATS_FILENAME), 'w') as file:
+        json.dump(stats, file, indent=2)
+    print(format_stats(stats))
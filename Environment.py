@@ -7,13 +7,16 @@ Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
 """
 
 import bpy
-import random
+
+from AssetCache import import_obj
 
 class Shelf:
-    def __init__(self, shape_file):
-        bpy.ops.import_scene.obj(filepath=shape_file)
+    def __init__(self, shape_file, assets=None):
+        import_obj(shape_file, assets)
+        self.objectNames = []
         for planes in bpy.data.objects:
             if 'Plane' in planes.name:
+                self.objectNames.append(planes.name)
                 bpy.context.scene.objects.active = planes
                 bpy.ops.rigidbody.object_add(type='ACTIVE')
                 bpy.ops.object.modifier_add(type = 'COLLISION')
@@ -30,8 +33,9 @@ class Shelf:
         return
 
 class Table:
-    def __init__(self, shape_file):
-        bpy.ops.import_scene.obj(filepath=shape_file)
+    def __init__(self, shape_file, assets=None):
+        import_obj(shape_file, assets)
+        self.objectNames = ["Table"]
         object_instance = bpy.data.objects["Table"]
         object_instance.location = [0, 0, 0]
         object_instance.rotation_mode = 'QUATERNION'
@@ -54,14 +58,11 @@ class Table:
 class Light:
     lightColors = [[255,197,142], [255,214,170], [255,241,224],
                    [255,250,244], [255,255,251], [255,255,255]]
-    GlobalEnergyLowbound = 0.5
-    GlobalEnergyHighbound = 1
 
     def __init__(self):
         bpy.ops.object.select_by_type(type='LAMP')
         bpy.ops.object.delete(use_global=False)
         bpy.context.scene.world.light_settings.use_environment_light = True
-        bpy.context.scene.world.light_settings.environment_energy = random.uniform(self.GlobalEnergyLowbound, self.GlobalEnergyHighbound)
         bpy.context.scene.world.light_settings.environment_color = 'PLAIN'
 
         #add a point light source
@@ -71,13 +72,13 @@ class Light:
         bpy.data.objects['Point'].data.shadow_ray_samples = 2
         bpy.data.objects['Point'].data.shadow_soft_size = 0.5
 
-    def placePointLight(self, light_range_x, light_range_y, light_range_z):
-        lx = random.uniform(light_range_x[0], light_range_x[1])
-        ly = random.uniform(light_range_y[0], light_range_y[1])
-        lz = random.uniform(light_range_z[0], light_range_z[1])
-        bpy.data.objects['Point'].location = [lx, ly, lz]
-        bpy.data.objects['Point'].data.energy = random.randint(0, 4)
-        color_idx = random.randint(0, len(self.lightColors) - 1)
+    # the lighting values are drawn by the scene plan
+    def setEnvironmentEnergy(self, energy):
+        bpy.context.scene.world.light_settings.environment_energy = float(energy)
+
+    def placePointLight(self, location, energy, color_idx):
+        bpy.data.objects['Point'].location = [float(value) for value in location]
+        bpy.data.objects['Point'].data.energy = int(energy)
         bpy.data.objects['Point'].data.color = (self.lightColors[color_idx][0]/255,
                                                 self.lightColors[color_idx][1]/255,
-                                                self.lightColors[color_idx][2]/255)
\ No newline at end of file
+                                                self.lightColors[color_idx][2]/255)
@@ -0,0 +1,100 @@
+"""
+@file ImageIO.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+PNG encoding and writing off the render loop, with nothing but NumPy and zlib
+so it runs inside Blender's python.
+"""
+
+import os, zlib, struct, collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# color type of a png by number of channels: gray, RGB, RGBA
+PNG_COLOR_TYPES = {1: 0, 3: 2, 4: 6}
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+# PNG bytes of a uint8 (h, w), (h, w, 3) or (h, w, 4) array, rows top to
+# bottom. Rows are stored unfiltered, compression 0 stores them as they are
+# and 1 is the fastest zlib level.
+def encode_png(array, compression=1):
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    height, width = array.shape[0:2]
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    rows = np.zeros((height, 1 + width * channels), np.uint8)
+    rows[:, 1:] = array.reshape(height, width * channels)
+    header = struct.pack('>IIBBBBB', width, height, 8, PNG_COLOR_TYPES[channels], 0, 0, 0)
+    return PNG_SIGNATURE + png_chunk(b'IHDR', header) + \
+           png_chunk(b'IDAT', zlib.compress(rows.tobytes(), compression)) + png_chunk(b'IEND', b'')
+
+# the png under a temporary name first, a crash never leaves half a file
+def write_png(filepath, array, compression=1):
+    data = encode_png(array, compression)
+    with open(filepath + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(filepath + '.tmp', filepath)
+
+# linear float color in [0, 1] to 8 bit sRGB, the view transform of a saved render
+def linear_to_srgb(color):
+    color = np.clip(color, 0.0, 1.0)
+    srgb = np.where(color <= 0.0031308, color * 12.92, 1.055 * np.power(color, 1.0 / 2.4) - 0.055)
+    return np.rint(srgb * 255.0).astype(np.uint8)
+
+# Encodes and writes images on a pool of threads (zlib lets go of the GIL) while
+# the caller goes on rendering. then() queues a callback that runs, in order,
+# once every write submitted before it is on disk; callbacks only run inside
+# poll() and flush(), on the calling thread. A failed write raises there.
+class AsyncWriter:
+    # writes in flight before write() waits for the oldest
+    maxPending = 16
+
+    def __init__(self, threads=2, compression=1):
+        self.compression = compression
+        self.executor = ThreadPoolExecutor(max(1, threads))
+        self.queue = collections.deque()
+        self.numPending = 0
+
+    def write(self, filepath, array):
+        while self.numPending >= self.maxPending:
+            self.next(True)
+        self.queue.append(self.executor.submit(write_png, filepath, np.array(array, dtype=np.uint8), self.compression))
+        self.numPending = self.numPending + 1
+
+    def then(self, callback):
+        self.queue.append(callback)
+        self.poll()
+
+    # Take the head of the queue if it is done or when blocking. Returns
+    # False when there is nothing to take.
+    def next(self, block):
+        if not self.queue:
+            return False
+        head = self.queue[0]
+        if callable(head):
+            self.queue.popleft()
+            head()
+            return True
+        if not block and not head.done():
+            return False
+        self.queue.popleft()
+        self.numPending = self.numPending - 1
+        head.result()
+        return True
+
+    def poll(self):
+        while self.next(False):
+            pass
+
+    def flush(self):
+        while self.next(True):
+            pass
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown(wait=True)
@@ -2,44 +2,83 @@ import cv2
 from PIL import Image, ImageDraw
 import os.path as osp
 import os
+import multiprocessing
+import time
+import Progress
+import DatasetPack
+import CocoExporter
 import numpy as np
 import matplotlib.pyplot as plt
 
+SEGMENTATION_PALETTE = [
+    0, 0, 0,
+    128, 0, 0,
+    0, 128, 0,
+    128, 128, 0,
+    0, 128, 128,
+    128, 128, 128,
+    64, 0, 0,
+    192, 0, 0,
+    64, 128, 0,
+    192, 128, 0,
+    64, 0, 128,
+    192, 0, 128,
+    64, 128, 128,
+    192, 128, 128,
+    0, 64, 0,
+    128, 64, 0,
+    0, 192, 0,
+    128, 192, 0, # defined for 18 classes currently
+]
+
 class Label:
+    # An object is kept when more than min_visible_area pixels of it are
+    # visible and they cover at least min_visibility_ratio of its projected box.
+    def __init__(self, min_visible_area=50, min_visibility_ratio=0.0):
+        self.min_visible_area = min_visible_area
+        self.min_visibility_ratio = min_visibility_ratio
+
+    def is_visible(self, visible_area, bbox):
+        projected_area = max(bbox[3] * bbox[4], 1.0)
+        return visible_area > self.min_visible_area and visible_area / projected_area >= self.min_visibility_ratio
+
     def draw_bboxes(self, syn_images_folder, num_of_images):
         for i in range(0, num_of_images):
-            img_filepath = osp.join(syn_images_folder, 'image_%05d.png' % i)
-            im = Image.open(img_filepath)
-            draw = ImageDraw.Draw(im)
+            self.draw_image_bboxes(syn_images_folder, i)
 
-            # Open a bounding box file, read all entry and sort in x-direction distance
-            bbox_filepath = osp.join(syn_images_folder, 'debug/raw_bbox_%05d.txt' % i)
-            bbox_list = []
-            with open(bbox_filepath, "r") as file:
-                lines = file.readlines()
-                for line in lines:
-                    classid, x, y, width, height, postr = line.split(',')
-                    bbox_list.append([int(classid), float(x), float(y), float(width), float(height), float(postr[:-1])])
-                    x = float(x)
-                    y = float(y)
-                    width = float(width)
-                    height = float(height)
-                    draw.rectangle([(x, y), (x + width, y + height)])
-            file.close()
-            bbox_list.sort(key=lambda obj: obj[5])
+    # Visible boxes of an image as rows (classid, tl_x, tl_y, br_x, br_y), also
+    # written to bbox_%05d.txt. The debug image with the projected (white) and
+    # visible (red) boxes is only drawn when debug is set. The object index map
+    # is read from debug/index_%05d.png unless one is given; only
+    # rasterize_labels.py, which renders the maps itself, passes it.
+    def draw_image_bboxes(self, syn_images_folder, i, debug=True, index_map=None):
+        img_filepath = osp.join(syn_images_folder, 'image_%05d.png' % i)
+        bbox_list = read_raw_bboxes(osp.join(syn_images_folder, 'debug/raw_bbox_%05d.txt' % i))
+        bbox_list = bbox_list[np.argsort(bbox_list[:, 5], kind='stable')]
+        rows = []
 
+        # visible pixels and tight boxes from the object index render when there is one
+        index_img_filepath = osp.join(syn_images_folder, 'debug/index_%05d.png' % i)
+        if index_map is None and osp.exists(index_img_filepath):
+            index_map = cv2.imread(index_img_filepath, cv2.IMREAD_GRAYSCALE)
+        if index_map is not None:
+            counts, boxes = self.visible_boxes(index_map)
+            for k in range(len(bbox_list)-1,-1,-1):
+                classid = int(bbox_list[k][0]) + 1
+                if classid < len(counts) and self.is_visible(counts[classid], bbox_list[k]):
+                    rows.append([classid] + list(boxes[classid]))
+        else:
             #Find occlusions and fix bounding boxes
-            covered_area = np.zeros((im.size[1],im.size[0],1), np.uint8)
-            after_occlusion_boxes = osp.join(syn_images_folder, 'bbox_%05d.txt' % i)
-            after_occlusion_file = open(after_occlusion_boxes,'a')
+            width, height = Image.open(img_filepath).size
+            covered_area = np.zeros((height,width,1), np.uint8)
 
             for k in range(len(bbox_list)-1,-1,-1):
-                mask_image = np.zeros((im.size[1],im.size[0],1), np.uint8)
+                mask_image = np.zeros((height,width,1), np.uint8)
                 mask_image[int(bbox_list[k][2]):int(bbox_list[k][2]+bbox_list[k][4]), int(bbox_list[k][1]):int(bbox_list[k][1]+bbox_list[k][3])] = 1
-                
+
                 visible_area = cv2.bitwise_and(mask_image, cv2.bitwise_not(covered_area))
                 covered_area = cv2.bitwise_or(covered_area, mask_image)
-                
+
                 contours, hierarchy = cv2.findContours(visible_area, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
                 maxcontourarea = 0
                 for c in range(0,len(contours)):
@@ -47,71 +86,291 @@ class Label:
                         maxcontourarea = cv2.contourArea(contours[c])
                         x1,y1,w1,h1 = cv2.boundingRect(contours[c])
 
-                if maxcontourarea > 50:
-                    after_occlusion_file.write("%i, %i, %i, %i, %i\n" % (int(bbox_list[k][0] + 1), int(x1), int(y1), int(x1)+int(w1), int(y1)+int(h1)))
-                    draw.rectangle([(x1, y1), (x1 + w1, y1 + h1)], outline=(255,0,0,255))
-            after_occlusion_file.close()
+                if self.is_visible(maxcontourarea, bbox_list[k]):
+                    rows.append([int(bbox_list[k][0]) + 1, x1, y1, x1 + w1, y1 + h1])
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 5)
 
-            # save debug image showing bounding box correction
+        # the box file marks the image as labeled, so it appears in one piece
+        after_occlusion_boxes = osp.join(syn_images_folder, 'bbox_%05d.txt' % i)
+        np.savetxt(after_occlusion_boxes + '.tmp', rows, fmt='%i', delimiter=', ')
+        os.replace(after_occlusion_boxes + '.tmp', after_occlusion_boxes)
+
+        # save debug image showing bounding box correction
+        if debug:
+            im = Image.open(img_filepath)
+            draw = ImageDraw.Draw(im)
+            for classid, x, y, width, height, depth in bbox_list:
+                draw.rectangle([(x, y), (x + width, y + height)])
+            for classid, x1, y1, x2, y2 in rows:
+                draw.rectangle([(x1, y1), (x2, y2)], outline=(255,0,0,255))
             del draw
             new_img_filepath = osp.join(syn_images_folder, 'debug/dbg_img_%05d.png' % i)
             im.save(new_img_filepath)
+        return rows
 
     def get_segmentation_labels(self, syn_images_folder, num_of_images):
         for i in range(0, num_of_images):
-            img_filepath = osp.join(syn_images_folder, 'image_%05d.png' % i)
-            im = cv2.imread(img_filepath)
-
-            # Open a bounding box file, read all entry and sort in x-direction distance
-            bbox_filepath = osp.join(syn_images_folder, 'debug/raw_bbox_%05d.txt' % i)
-            bbox_list = []
-            with open(bbox_filepath, "r") as file:
-                lines = file.readlines()
-                for line in lines:
-                    classid, x, y, width, height, postr = line.split(',')
-                    bbox_list.append([int(classid), float(x), float(y), float(width), float(height), float(postr[:-1])])
-            file.close()
-            height, width, channels = im.shape
-            seg_img = np.zeros((height,width,1), np.uint8)
-
-            for k in range(0,len(bbox_list)):
-                mask_img_filepath = osp.join(syn_images_folder, 'debug/image_%05d_%02d.png' % (i,k))
-                mask_image = cv2.imread(mask_img_filepath)
-                
-                for u in range(0, height):
-                    for v in range(0,width):
-                        if any(val != 64 for val in mask_image[u][v][:]):
-                            seg_img[u][v] = np.uint8(bbox_list[k][0]+1)
+            self.get_image_segmentation_labels(syn_images_folder, i)
+
+    # Segmentation image of an image, from the object index map (given, as
+    # rasterize_labels.py does, or read from debug/index_%05d.png) or else
+    # from the per-object mask renders.
+    def get_image_segmentation_labels(self, syn_images_folder, i, index_map=None):
+        img_filepath = osp.join(syn_images_folder, 'image_%05d.png' % i)
+        width, height = Image.open(img_filepath).size
+
+        bbox_list = read_raw_bboxes(osp.join(syn_images_folder, 'debug/raw_bbox_%05d.txt' % i))
+        class_ids = [int(classid) for classid in bbox_list[:, 0]]
+
+        # a single object index render replaces the per-object mask renders
+        index_img_filepath = osp.join(syn_images_folder, 'debug/index_%05d.png' % i)
+        if index_map is None and osp.exists(index_img_filepath):
+            index_map = cv2.imread(index_img_filepath, cv2.IMREAD_GRAYSCALE)
+        if index_map is not None:
+            seg_img = self.label_index_map(index_map, class_ids)
+        else:
+            mask_filepaths = [osp.join(syn_images_folder, 'debug/image_%05d_%02d.png' % (i,k)) for k in range(0,len(bbox_list))]
+            mask_images = [cv2.imread(mask_img_filepath) for mask_img_filepath in mask_filepaths]
+            seg_img = self.label_masks(mask_images, class_ids, height, width)
+
+        # save segmentation image
+        new_img_filepath = osp.join(syn_images_folder, 'seg_img_%05d.png' % i)
+        self.save_indexed_image(new_img_filepath, seg_img)
+
+        # the masks are only needed until the segmentation image is written
+        if index_map is None:
+            for mask_img_filepath in mask_filepaths:
                 os.remove(mask_img_filepath)
 
-            # save segmentation image
-            new_img_filepath = osp.join(syn_images_folder, 'seg_img_%05d.png' % i)
-            cv2.imwrite(new_img_filepath, seg_img)
-
-            # openCV does not have the functionality of saving indexed images
-            # lut = np.random.rand(256,1)
-            # dst_img = cv2.LUT(seg_img, lut)
-            # seg_img = cv2.applyColorMap(seg_img, cv2.COLORMAP_JET)
-
-            seg_img_plt = Image.open(new_img_filepath)
-            seg_img_plt.putpalette([
-                0, 0, 0,
-                128, 0, 0, 
-                0, 128, 0,
-                128, 128, 0,
-                0, 128, 128,
-                128, 128, 128,
-                64, 0, 0,
-                192, 0, 0,
-                64, 128, 0,
-                192, 128, 0,
-                64, 0, 128,
-                192, 0, 128,
-                64, 128, 128,
-                192, 128, 128,
-                0, 64, 0,
-                128, 64, 0,
-                0, 192, 0,
-                128, 192, 0, # defined for 18 classes currently
-            ])
-            seg_img_plt.save(new_img_filepath)
+    # Visible pixel count and tight visible box (tl_x, tl_y, br_x, br_y, with
+    # br exclusive like the contour boxes) of every index in an 8 bit object
+    # index render. Boxes are only computed for the indices present, the
+    # others stay zero.
+    def visible_boxes(self, index_map):
+        histogram = cv2.calcHist([index_map], [0], None, [256], [0, 256]).ravel()
+        counts = histogram[:int(index_map.max()) + 1].astype(np.int64)
+        boxes = np.zeros((len(counts), 4), np.int64)
+        for k in np.flatnonzero(counts[1:]) + 1:
+            x, y, w, h = cv2.boundingRect(cv2.compare(index_map, int(k), cv2.CMP_EQ))
+            boxes[k] = x, y, x + w, y + h
+        return counts, boxes
+
+    # Merge the per-object mask renders into a single class-id image. Every pixel
+    # of a mask that differs from the background gray (64) in any channel belongs
+    # to the object, later masks overwrite earlier ones.
+    def label_masks(self, mask_images, class_ids, height, width):
+        seg_img = np.zeros((height, width), np.uint8)
+        for mask_image, classid in zip(mask_images, class_ids):
+            seg_img[np.any(mask_image != 64, axis=2)] = np.uint8(classid + 1)
+        return seg_img
+
+    # Split an object index render (pixel value = class id + 1) into one boolean
+    # mask per class id, without touching the disk.
+    def split_index_map(self, index_map, class_ids):
+        return [index_map == np.uint8(classid + 1) for classid in class_ids]
+
+    # Class-id image from an object index render, restricted to the objects
+    # that have a bounding box in the scene.
+    def label_index_map(self, index_map, class_ids):
+        seg_img = np.zeros(index_map.shape, np.uint8)
+        for classid, mask in zip(class_ids, self.split_index_map(index_map, class_ids)):
+            seg_img[mask] = np.uint8(classid + 1)
+        return seg_img
+
+    # openCV does not have the functionality of saving indexed images, so the
+    # palette is attached with PIL before the single write to disk.
+    def save_indexed_image(self, filepath, seg_img):
+        seg_img_plt = Image.fromarray(seg_img)
+        seg_img_plt.putpalette(SEGMENTATION_PALETTE)
+        seg_img_plt.save(filepath)
+
+# Lines (classid, x, y, width, height, depth) of a raw_bbox file as written by
+# Camera.write_bounds_2d, in file order, as an (n, 6) array.
+def read_raw_bboxes(bbox_filepath):
+    if osp.getsize(bbox_filepath) == 0:
+        return np.zeros((0, 6))
+    return np.loadtxt(bbox_filepath, delimiter=',', ndmin=2).reshape(-1, 6)
+
+# Whether the labels of an image are written: the box file appears in one
+# piece once the boxes are final, the segmentation image is the only file of a
+# pixel label.
+def is_labeled(syn_images_folder, label_type, i):
+    if label_type == 'pixel':
+        return Progress.is_complete_file(osp.join(syn_images_folder, 'seg_img_%05d.png' % i))
+    return osp.exists(osp.join(syn_images_folder, 'bbox_%05d.txt' % i))
+
+# Whether image i gets a debug image, every debug_interval-th image does and
+# 0 turns them off.
+def has_debug_image(i, debug_interval):
+    return debug_interval > 0 and i % debug_interval == 0
+
+# Label a batch of images in a pool worker. Returns (i, seconds, boxes, coco,
+# error) per image, boxes as rows (classid, tl_x, tl_y, br_x, br_y) for box
+# labels and coco the COCO image entry and annotations when coco_masks is not
+# None; a failed image does not stop the rest of its batch.
+def label_images(task):
+    pLabel, label_type, syn_images_folder, indices, debug_interval, coco_masks = task
+    results = []
+    for i in indices:
+        start = time.time()
+        try:
+            if label_type == 'pixel':
+                pLabel.get_image_segmentation_labels(syn_images_folder, i)
+                boxes = None
+            else:
+                boxes = pLabel.draw_image_bboxes(syn_images_folder, i, has_debug_image(i, debug_interval))
+            coco = None
+            if coco_masks is not None:
+                coco = CocoExporter.image_annotations(syn_images_folder, i, label_type, coco_masks, boxes)
+            results.append((i, time.time() - start, boxes, coco, None))
+        except Exception as e:
+            results.append((i, time.time() - start, None, None, '%s: %s' % (type(e).__name__, e)))
+    return results
+
+# label a single image in a pool worker
+def label_image(task):
+    pLabel, label_type, syn_images_folder, i = task
+    i, seconds, boxes, coco, error = label_images((pLabel, label_type, syn_images_folder, [i], 1, None))[0]
+    if error is not None:
+        raise RuntimeError(error)
+    return i, seconds
+
+ANNOTATIONS_FILENAME = 'annotations.txt'
+
+# All boxes of a folder in one file, one line "image, classid, tl_x, tl_y,
+# br_x, br_y" per box, images in ascending order. Boxes that are not given
+# are read back from the bbox file of the image.
+def write_annotations(filepath, syn_images_folder, boxes_of_images):
+    rows = []
+    for i in sorted(boxes_of_images):
+        boxes = boxes_of_images[i]
+        if boxes is None:
+            bbox_filepath = osp.join(syn_images_folder, 'bbox_%05d.txt' % i)
+            if osp.getsize(bbox_filepath) == 0:
+                continue
+            boxes, class_ids = DatasetPack.read_bbox_file(bbox_filepath)
+            boxes = np.hstack([class_ids[:, np.newaxis], boxes])
+        rows.append(np.hstack([np.full((len(boxes), 1), i), boxes]))
+    rows = np.vstack(rows).astype(np.int64) if rows else np.zeros((0, 6), np.int64)
+    np.savetxt(filepath + '.tmp', rows, fmt='%i', delimiter=', ')
+    os.replace(filepath + '.tmp', filepath)
+
+# annotations.txt of a folder as an (n, 6) array
+def read_annotations(filepath):
+    if osp.getsize(filepath) == 0:
+        return np.zeros((0, 6), np.int64)
+    return np.loadtxt(filepath, delimiter=',', dtype=np.int64, ndmin=2).reshape(-1, 6)
+
+# Labels images while the renderers are still running. Every render worker
+# appends the index of each finished image to manifest.txt in its output
+# folder, poll() picks up the new entries and hands them in batches of up to
+# batchSize images to a pool of labeling processes. Once a folder is done, its
+# boxes are written to a single annotations.txt. Given a CocoWriter, the COCO
+# annotations of every labeled image are streamed to it, with RLE masks if
+# coco_masks is set.
+class LabelStream:
+    batchSize = 16
+
+    def __init__(self, pLabel, label_type, num_workers, debug_interval=1, coco=None, coco_masks=False):
+        self.pLabel = pLabel
+        self.label_type = label_type
+        self.debug_interval = debug_interval
+        self.coco = coco
+        self.coco_masks = coco_masks if coco is not None else None
+        self.pool = multiprocessing.Pool(max(1, num_workers))
+        self.offsets = {}
+        self.pending = {}
+        self.boxes = {}
+        self.failed = []
+        self.seconds = []
+
+    def poll(self, syn_images_folder):
+        manifest_filepath = osp.join(syn_images_folder, 'manifest.txt')
+        if not osp.exists(manifest_filepath):
+            return
+        with open(manifest_filepath, "r") as file:
+            file.seek(self.offsets.get(syn_images_folder, 0))
+            data = file.read()
+        # only complete lines, the renderer may be half way through a write
+        data = data[:data.rfind('\n') + 1]
+        self.offsets[syn_images_folder] = self.offsets.get(syn_images_folder, 0) + len(data)
+        indices = [int(line) for line in data.splitlines()]
+        # images labeled before a worker was resumed are skipped, their boxes
+        # are read back for the annotation file
+        boxes = self.boxes.setdefault(syn_images_folder, {})
+        unlabeled = []
+        for i in indices:
+            if is_labeled(syn_images_folder, self.label_type, i):
+                boxes[i] = None
+            else:
+                unlabeled.append(i)
+        self.add(syn_images_folder, unlabeled)
+        self.collect(syn_images_folder, False)
+
+    # label images of a folder that are not announced in its manifest
+    def add(self, syn_images_folder, indices):
+        for first in range(0, len(indices), self.batchSize):
+            batch = indices[first:first + self.batchSize]
+            task = (self.pLabel, self.label_type, syn_images_folder, batch, self.debug_interval, self.coco_masks)
+            self.pending.setdefault(syn_images_folder, []).append((batch, self.pool.apply_async(label_images, (task,))))
+
+    # Take the results of the finished batches of a folder, or of all its
+    # batches when blocking. COCO annotations go to the fragment of the folder
+    # right away, so they are not held in memory.
+    def collect(self, syn_images_folder, block):
+        boxes = self.boxes.setdefault(syn_images_folder, {})
+        pending = []
+        for batch, result in self.pending.pop(syn_images_folder, []):
+            if not block and not result.ready():
+                pending.append((batch, result))
+                continue
+            try:
+                results = result.get()
+            except Exception as e:
+                results = [(i, 0.0, None, None, str(e)) for i in batch]
+            for i, seconds, image_boxes, coco, error in results:
+                if error is not None:
+                    print("labeling image %d failed: %s" % (i, error))
+                    self.failed.append(i)
+                    continue
+                self.seconds.append(seconds)
+                boxes[i] = image_boxes
+                if coco is not None:
+                    CocoExporter.append_fragment(syn_images_folder, *coco)
+        if pending:
+            self.pending[syn_images_folder] = pending
+
+    # Block until all announced images of a folder are labeled.
+    def wait(self, syn_images_folder):
+        self.poll(syn_images_folder)
+        self.collect(syn_images_folder, True)
+
+    # Write the boxes of a folder whose images are all labeled to its
+    # annotation file (pixel labels have none) and hand its COCO annotations
+    # to the writer.
+    def writeAnnotations(self, syn_images_folder):
+        boxes = self.boxes.pop(syn_images_folder, {})
+        if self.label_type != 'pixel':
+            write_annotations(osp.join(syn_images_folder, ANNOTATIONS_FILENAME), syn_images_folder, boxes)
+        if self.coco is not None:
+            CocoExporter.flush_fragment(self.coco, syn_images_folder, sorted(boxes), self.label_type, self.coco_masks)
+
+    # Drop everything known about a folder before it is rendered again.
+    def forget(self, syn_images_folder):
+        for batch, result in self.pending.pop(syn_images_folder, []):
+            result.wait()
+        self.offsets.pop(syn_images_folder, None)
+        self.boxes.pop(syn_images_folder, None)
+
+    def close(self):
+        for syn_images_folder in list(self.pending.keys()):
+            self.wait(syn_images_folder)
+        self.pool.close()
+        self.pool.join()
+        return self.failed
+
+    # Stop the labeling workers without waiting for their batches, for a run
+    # that is interrupted; the unlabeled images are labeled on --resume.
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,111 @@
+"""
+@file PoseLibrary.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import os, json
+import os.path as osp
+import numpy as np
+
+# Settled object poses of many simulated drops on one resting surface. Scene s
+# holds the objects offsets[s]:offsets[s+1] of object_ids (index into
+# model_names), positions (x, y, z) and quaternions (w, x, y, z). The arrays
+# are stored as .npy files in a folder and memory mapped when loaded.
+class PoseLibrary:
+
+    def __init__(self, surface_type, surface_pose, model_names):
+        self.surface_type = surface_type
+        self.surface_pose = [float(value) for value in surface_pose]
+        self.model_names = list(model_names)
+        self.offsets = np.zeros((1,), np.int64)
+        self.object_ids = np.zeros((0,), np.int32)
+        self.positions = np.zeros((0, 3), np.float64)
+        self.quaternions = np.zeros((0, 4), np.float64)
+        self.new_scenes = []
+
+    def addScene(self, object_ids, positions, quaternions):
+        self.new_scenes.append((np.asarray(object_ids, np.int32).reshape(-1),
+                                np.asarray(positions, np.float64).reshape(-1, 3),
+                                np.asarray(quaternions, np.float64).reshape(-1, 4)))
+
+    # fold the scenes added since the last call into the arrays
+    def collect(self):
+        if not self.new_scenes:
+            return
+        counts = [len(scene[0]) for scene in self.new_scenes]
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(counts)])
+        self.object_ids = np.concatenate([self.object_ids] + [scene[0] for scene in self.new_scenes])
+        self.positions = np.concatenate([self.positions] + [scene[1] for scene in self.new_scenes])
+        self.quaternions = np.concatenate([self.quaternions] + [scene[2] for scene in self.new_scenes])
+        self.new_scenes = []
+
+    def numScenes(self):
+        return len(self.offsets) - 1 + len(self.new_scenes)
+
+    def scene(self, s):
+        self.collect()
+        start, end = self.offsets[s], self.offsets[s + 1]
+        return np.array(self.object_ids[start:end]), np.array(self.positions[start:end]), np.array(self.quaternions[start:end])
+
+    # The scene picked by a uniform draw in [0, 1) of the scene plan, with its
+    # objects as indices into model_names, which may list the models in
+    # another order than the library.
+    def sampleScene(self, draw, model_names):
+        if self.numScenes() == 0:
+            raise ValueError('the pose library has no scenes to sample')
+        object_ids, positions, quaternions = self.scene(min(int(draw * self.numScenes()), self.numScenes() - 1))
+        indices = [list(model_names).index(self.model_names[object_id]) for object_id in object_ids]
+        return indices, positions, quaternions
+
+    def save(self, folder):
+        self.collect()
+        if not osp.exists(folder):
+            os.makedirs(folder)
+        with open(osp.join(folder, 'library.json'), 'w') as file:
+            json.dump({'surface_type': self.surface_type, 'surface_pose': self.surface_pose,
+                       'model_names': self.model_names}, file)
+        np.save(osp.join(folder, 'object_ids.npy'), self.object_ids)
+        np.save(osp.join(folder, 'positions.npy'), self.positions)
+        np.save(osp.join(folder, 'quaternions.npy'), self.quaternions)
+        # written last, a library folder without offsets is incomplete
+        np.save(osp.join(folder, 'offsets.npy'), self.offsets)
+
+    @staticmethod
+    def exists(folder):
+        return osp.exists(osp.join(folder, 'offsets.npy'))
+
+    # A library without scenes cannot be sampled and raises ValueError.
+    @staticmethod
+    def load(folder):
+        with open(osp.join(folder, 'library.json'), 'r') as file:
+            meta = json.load(file)
+        library = PoseLibrary(meta['surface_type'], meta['surface_pose'], meta['model_names'])
+        library.offsets = np.load(osp.join(folder, 'offsets.npy'), mmap_mode='r')
+        library.object_ids = np.load(osp.join(folder, 'object_ids.npy'), mmap_mode='r')
+        library.positions = np.load(osp.join(folder, 'positions.npy'), mmap_mode='r')
+        library.quaternions = np.load(osp.join(folder, 'quaternions.npy'), mmap_mode='r')
+        if library.numScenes() == 0:
+            raise ValueError('pose library %s has no scenes' % folder)
+        return library
+
+    # The library is only valid for the surface it was simulated on, and all
+    # of its models have to be loaded to render its scenes.
+    def matches(self, surface_type, surface_pose, model_names):
+        return self.surface_type == surface_type and \
+               np.allclose(self.surface_pose, surface_pose) and \
+               all(name in model_names for name in self.model_names)
+
+    # Concatenate libraries of the same surface, e.g. the shards of a bulk job.
+    @staticmethod
+    def merge(libraries):
+        merged = PoseLibrary(libraries[0].surface_type, libraries[0].surface_pose, libraries[0].model_names)
+        for library in libraries:
+            for s in range(0, library.numScenes()):
+                object_ids, positions, quaternions = library.scene(s)
+                names = [library.model_names[object_id] for object_id in object_ids]
+                merged.addScene([merged.model_names.index(name) for name in names], positions, quaternions)
+        merged.collect()
+        return merged
@@ -0,0 +1,171 @@
+"""
+@file Progress.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import os, re, json, glob, time, hashlib
+import os.path as osp
+
+PROGRESS_FILENAME = 'progress.jsonl'
+RUN_FILENAME = 'run.json'
+COCO_FRAGMENT_FILENAME = 'coco.jsonl'
+HEARTBEAT_FILENAME = 'heartbeat.json'
+QUARANTINE_FILENAME = 'quarantine.jsonl'
+
+# exit code of a worker that stops after --max-scenes scenes to be restarted
+RECYCLE_EXIT_CODE = 75
+
+# outputs of an image index (or of a scene, for blend snapshots)
+OUTPUT_PATTERN = re.compile(r'^(image|raw_bbox|index|bbox|seg_img|dbg_img|blend)_(\d{5})[._]')
+
+# A file counts as written when it is not empty and, for png files, ends
+# with the IEND chunk; a worker killed half way through a write fails this.
+def is_complete_file(filepath):
+    if not osp.isfile(filepath) or osp.getsize(filepath) == 0:
+        return False
+    if filepath.endswith('.png'):
+        if osp.getsize(filepath) < 12:
+            return False
+        with open(filepath, 'rb') as file:
+            file.seek(-12, os.SEEK_END)
+            return file.read()[4:8] == b'IEND'
+    return True
+
+# Progress manifest of an output folder, one json line per finished scene:
+# {"scene": 12, "images": [12, 13, 14], "seed": 42, "outputs": ["image_00012.png", ...]}
+# The line is appended after all outputs of the scene are written.
+def append_progress(folder, entry):
+    with open(osp.join(folder, PROGRESS_FILENAME), 'a') as file:
+        file.write(json.dumps(entry) + '\n')
+
+# entries of the manifest whose outputs are all complete, a truncated last
+# line is ignored
+def load_progress(folder):
+    filepath = osp.join(folder, PROGRESS_FILENAME)
+    if not osp.exists(filepath):
+        return []
+    entries = []
+    with open(filepath, 'r') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if all(is_complete_file(osp.join(folder, output)) for output in entry['outputs']):
+                entries.append(entry)
+    return entries
+
+def completed_images(entries):
+    return set(i for entry in entries for i in entry['images'])
+
+# Remove everything a crashed worker may have left of the images from
+# first_image on: their files, scene records, stage timings, progress, COCO
+# fragment and manifest lines.
+def remove_partial_outputs(folder, first_image):
+    for subfolder in ['', 'debug']:
+        if not osp.exists(osp.join(folder, subfolder)):
+            continue
+        for filename in os.listdir(osp.join(folder, subfolder)):
+            match = OUTPUT_PATTERN.match(filename)
+            if match is not None and int(match.group(2)) >= first_image:
+                os.remove(osp.join(folder, subfolder, filename))
+
+    def keep(line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return False
+        # lines of no scene, like the setup timing of a worker, stay
+        index = entry.get('scene', entry.get('image'))
+        return index is None or index < first_image
+    for filepath in [osp.join(folder, PROGRESS_FILENAME), osp.join(folder, COCO_FRAGMENT_FILENAME)] + \
+            glob.glob(osp.join(folder, 'debug', 'scenes_*.jsonl')) + glob.glob(osp.join(folder, 'debug', 'timings_*.jsonl')):
+        if not osp.exists(filepath):
+            continue
+        with open(filepath, 'r') as file:
+            lines = [line for line in file if keep(line)]
+        with open(filepath, 'w') as file:
+            file.writelines(lines)
+
+    # the labeling stream must not pick up the removed images again
+    manifest_filepath = osp.join(folder, 'manifest.txt')
+    if osp.exists(manifest_filepath):
+        with open(manifest_filepath, 'r') as file:
+            lines = [line for line in file if line.endswith('\n') and int(line) < first_image]
+        with open(manifest_filepath, 'w') as file:
+            file.writelines(lines)
+
+# first image of [start, end) without a complete scene in the manifest
+def first_missing_image(folder, start, end):
+    done = completed_images(load_progress(folder))
+    first = start
+    while first < end and first in done:
+        first = first + 1
+    return first
+
+def file_hash(filepath):
+    with open(filepath, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+# Everything needed to continue a run: the config it was started with, the
+# run seed of the scene plan and the image range of every shard.
+def write_run(folder, config_filepath, num_images, shards, seed):
+    with open(osp.join(folder, RUN_FILENAME), 'w') as file:
+        json.dump({'config': config_filepath, 'config_sha1': file_hash(config_filepath), 'num_images': num_images,
+                   'seed': seed, 'shards': [[shard.id, shard.start, shard.count] for shard in shards]},
+                  file, indent=2)
+
+def read_run(folder):
+    filepath = osp.join(folder, RUN_FILENAME)
+    if not osp.exists(filepath):
+        return None
+    with open(filepath, 'r') as file:
+        return json.load(file)
+
+# The scene a worker is on, rewritten when it starts a scene (scene None
+# while it sets up). The modification time is the heartbeat.
+def write_heartbeat(folder, entry):
+    filepath = osp.join(folder, HEARTBEAT_FILENAME)
+    with open(filepath + '.tmp', 'w') as file:
+        json.dump(entry, file)
+    os.replace(filepath + '.tmp', filepath)
+
+# (seconds since the last heartbeat, entry), None before the first one
+def read_heartbeat(folder):
+    filepath = osp.join(folder, HEARTBEAT_FILENAME)
+    try:
+        with open(filepath, 'r') as file:
+            entry = json.load(file)
+        return time.time() - osp.getmtime(filepath), entry
+    except (OSError, ValueError):
+        return None
+
+# Scenes that hung or crashed a worker, one json line each with the heartbeat
+# of the worker (scene, seed and planned parameters) and the reason. A worker
+# draws a quarantined scene again with another seed.
+def quarantine(folder, entry, reason):
+    with open(osp.join(folder, QUARANTINE_FILENAME), 'a') as file:
+        file.write(json.dumps(dict(entry, reason=reason, time=time.time())) + '\n')
+
+def load_quarantine(folder):
+    filepath = osp.join(folder, QUARANTINE_FILENAME)
+    if not osp.exists(filepath):
+        return []
+    entries = []
+    with open(filepath, 'r') as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+# times each scene (first image index) was quarantined
+def redraw_counts(folder):
+    counts = {}
+    for entry in load_quarantine(folder):
+        counts[entry['scene']] = counts.get(entry['scene'], 0) + 1
+    return counts
@@ -0,0 +1,79 @@
+"""
+@file Projection.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Projection math of Camera in plain NumPy, usable with or without Blender.
+"""
+
+import numpy as np
+
+# blender camera frame to computer vision camera frame
+R_bcam2cv = np.array([[1, 0, 0],
+                      [0, -1, 0],
+                      [0, 0, -1]], dtype=np.float64)
+
+def quaternion_to_matrix(quat):
+    w, x, y, z = np.asarray(quat, dtype=np.float64) / np.linalg.norm(quat)
+    return np.array([[1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)],
+                     [2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)],
+                     [2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)]])
+
+# 4x4 world matrix from a pose [pos_x, pos_y, pos_z, quat_w, quat_x, quat_y, quat_z]
+def pose_to_matrix(pose):
+    matrix = np.eye(4)
+    matrix[0:3, 0:3] = quaternion_to_matrix(pose[3:7])
+    matrix[0:3, 3] = pose[0:3]
+    return matrix
+
+# Same as Camera.get_3x4_RT_matrix_from_blender for a camera placed at a pose
+# of the config file.
+def extrinsic_to_RT(camera_pose):
+    R_world2bcam = quaternion_to_matrix(camera_pose[3:7]).T
+    T_world2bcam = -1 * R_world2bcam.dot(np.asarray(camera_pose[0:3], dtype=np.float64))
+    RT = np.zeros((3, 4))
+    RT[:, 0:3] = R_bcam2cv.dot(R_world2bcam)
+    RT[:, 3] = R_bcam2cv.dot(T_world2bcam)
+    return RT
+
+# (width, height) in pixels of the image of a camera, the principal point is
+# at the image center
+def image_size(camera_intrinsic):
+    return int(round(2 * camera_intrinsic[0][2])), int(round(2 * camera_intrinsic[1][2]))
+
+# 3x4 projection matrix K*RT of every camera pose, stacked to (num_views, 3, 4)
+def projection_matrices(camera_intrinsic, camera_poses):
+    K = np.asarray(camera_intrinsic, dtype=np.float64)
+    return np.array([K.dot(extrinsic_to_RT(pose)) for pose in camera_poses]).reshape(-1, 3, 4)
+
+# Project the vertices of several objects into several views at once.
+#   P: (num_views, 3, 4) projection matrices
+#   vertices: list of (n_i, 3) arrays in object coordinates
+#   matrices_world: list of 4x4 object to world matrices
+# Returns (num_views, num_objects, 4) boxes as (x, y, width, height), the
+# same extremes camera_view_bounds_2d finds one vertex at a time.
+def bounds_2d(P, vertices, matrices_world):
+    num_views = P.shape[0]
+    if len(vertices) == 0:
+        return np.zeros((num_views, 0, 4))
+
+    counts = [len(v) for v in vertices]
+    world = np.concatenate([np.dot(v, np.asarray(m)[0:3, 0:3].T) + np.asarray(m)[0:3, 3]
+                            for v, m in zip(vertices, matrices_world)])
+    homogeneous = np.hstack([world, np.ones((world.shape[0], 1))])
+
+    coords = np.einsum('vij,nj->vin', P, homogeneous)
+    coords = coords[:, 0:2, :] / coords[:, 2:3, :]
+
+    # the vertex loop starts from min = 10000 and max = 0, keep its results
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    mins = np.minimum(np.minimum.reduceat(coords, starts, axis=2), 10000)
+    maxs = np.maximum(np.maximum.reduceat(coords, starts, axis=2), 0.0)
+    boxes = np.empty((num_views, len(vertices), 4))
+    boxes[:, :, 0] = mins[:, 0, :]
+    boxes[:, :, 1] = mins[:, 1, :]
+    boxes[:, :, 2] = maxs[:, 0, :] - mins[:, 0, :]
+    boxes[:, :, 3] = maxs[:, 1, :] - mins[:, 1, :]
+    return boxes
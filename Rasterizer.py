@@ -0,0 +1,184 @@
+"""
+@file Rasterizer.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Z-buffered rasterization of the obj meshes in plain NumPy, without Blender:
+object index maps, depth maps and visible boxes of recorded scenes.
+"""
+
+import numpy as np
+import Projection
+
+# Meshes of an obj file by object name, as (vertices (n, 3), triangles (m, 3)).
+# The vertices stay in obj axes like the mesh data of the blender importer,
+# the recorded matrix_world holds the whole transform of an object. Polygons
+# are split into fans. Lines before the first "o" belong to an object named
+# after the file.
+def load_obj(filepath, default_name=None):
+    vertices = []
+    objects = {}
+    name = default_name
+    with open(filepath, 'r') as file:
+        for line in file:
+            if line.startswith('v '):
+                vertices.append([float(value) for value in line.split()[1:4]])
+            elif line.startswith('o '):
+                name = line[2:].strip()
+            elif line.startswith('f '):
+                polygon = []
+                for corner in line.split()[1:]:
+                    index = int(corner.split('/')[0])
+                    polygon.append(index - 1 if index > 0 else len(vertices) + index)
+                faces = objects.setdefault(name, [])
+                for k in range(1, len(polygon) - 1):
+                    faces.append([polygon[0], polygon[k], polygon[k + 1]])
+
+    vertices = np.array(vertices, dtype=np.float64).reshape(-1, 3)
+    meshes = {}
+    for name, faces in objects.items():
+        faces = np.array(faces, dtype=np.int64).reshape(-1, 3)
+        # keep only the vertices of the object, like the importer does
+        used, faces = np.unique(faces, return_inverse=True)
+        meshes[name] = (vertices[used], faces.reshape(-1, 3))
+    return meshes
+
+# all objects of an obj file as one mesh
+def load_model(filepath):
+    meshes = list(load_obj(filepath).values())
+    offsets = np.cumsum([0] + [len(vertices) for vertices, faces in meshes])
+    return (np.concatenate([vertices for vertices, faces in meshes]),
+            np.concatenate([faces + offset for (vertices, faces), offset in zip(meshes, offsets)]))
+
+class Rasterizer:
+    # triangles closer to the camera than this (meters) are dropped
+    near = 0.01
+    # pixels (triangles x bbox pixels) processed in one vectorized batch
+    batchPixels = 1 << 22
+    # bounding box area (pixels) above which triangles are not batched
+    largeTriangle = 1 << 12
+
+    def __init__(self, camIntrinsic, width=None, height=None):
+        self.K = np.asarray(camIntrinsic, dtype=np.float64)
+        # the principal point is at the image center, as in Camera
+        image_width, image_height = Projection.image_size(self.K)
+        self.width = width if width is not None else image_width
+        self.height = height if height is not None else image_height
+
+    # Pixel coordinates (T, 3, 2) and inverse depths (T, 3) of the triangles of
+    # a mesh posed by matrix_world, seen from a camera pose of the config.
+    def project(self, mesh, matrix_world, camera_pose):
+        vertices, faces = mesh
+        M = np.asarray(matrix_world, dtype=np.float64)
+        RT = Projection.extrinsic_to_RT(camera_pose)
+        camera = np.dot(np.dot(vertices, M[0:3, 0:3].T) + M[0:3, 3], RT[:, 0:3].T) + RT[:, 3]
+        z = camera[:, 2]
+        pixels = np.dot(camera, self.K.T)
+        pixels = pixels[:, 0:2] / np.where(z > self.near, z, 1.0)[:, np.newaxis]
+        keep = np.all(z[faces] > self.near, axis=1)
+        return pixels[faces[keep]], 1.0 / z[faces[keep]]
+
+    # Fragments (pixel index, depth, triangle) of triangles whose bounding
+    # boxes fit in box_w x box_h pixels, pixel centers at (x + 0.5, y + 0.5).
+    # Edge functions are affine in x and y, so they are evaluated as a column
+    # term plus a row term broadcast over the box.
+    def fragments(self, points, inv_z, x0, y0, x1, y1, box_w, box_h):
+        px = x0[:, np.newaxis, np.newaxis] + np.arange(box_w)[np.newaxis, np.newaxis, :]
+        py = y0[:, np.newaxis, np.newaxis] + np.arange(box_h)[np.newaxis, :, np.newaxis]
+
+        def edge(a, b):
+            ax, ay = points[:, a, 0, np.newaxis, np.newaxis], points[:, a, 1, np.newaxis, np.newaxis]
+            bx, by = points[:, b, 0, np.newaxis, np.newaxis], points[:, b, 1, np.newaxis, np.newaxis]
+            A, B = ay - by, bx - ax
+            return A * (px + 0.5 - ax) + B * (py + 0.5 - ay)
+        w0, w1, w2 = edge(1, 2), edge(2, 0), edge(0, 1)
+        area = (points[:, 1, 0] - points[:, 0, 0]) * (points[:, 2, 1] - points[:, 0, 1]) - \
+               (points[:, 1, 1] - points[:, 0, 1]) * (points[:, 2, 0] - points[:, 0, 0])
+        sign = np.sign(area)[:, np.newaxis, np.newaxis]
+        inside = (w0 * sign >= 0) & (w1 * sign >= 0) & (w2 * sign >= 0) & (sign != 0)
+        inside &= (px <= x1[:, np.newaxis, np.newaxis]) & (py <= y1[:, np.newaxis, np.newaxis])
+
+        tri, row, col = np.nonzero(inside)
+        # perspective correct: 1/z is linear in screen space
+        inv = (w0[tri, row, col] * inv_z[tri, 0] + w1[tri, row, col] * inv_z[tri, 1] +
+               w2[tri, row, col] * inv_z[tri, 2]) / area[tri]
+        return (y0[tri] + row) * self.width + x0[tri] + col, 1.0 / inv, tri
+
+    # Render objects given as (mesh, matrix_world, index) from a camera pose
+    # [x, y, z, qw, qx, qy, qz]. Returns the index map (int32, 0 where no
+    # object with a non-zero index is visible) and the depth map (float32,
+    # meters along the optical axis, 0 for background). Index 0 objects only
+    # occlude, like the resting surface in the object index render.
+    def render(self, objects, camera_pose):
+        all_points, all_inv_z, all_index = [], [], []
+        for mesh, matrix_world, index in objects:
+            points, inv_z = self.project(mesh, matrix_world, camera_pose)
+            all_points.append(points)
+            all_inv_z.append(inv_z)
+            all_index.append(np.full(len(points), index, np.int32))
+        points = np.concatenate(all_points) if all_points else np.zeros((0, 3, 2))
+        inv_z = np.concatenate(all_inv_z) if all_inv_z else np.zeros((0, 3))
+        indices = np.concatenate(all_index) if all_index else np.zeros((0,), np.int32)
+
+        # pixel range covered by each triangle, clipped to the image
+        x0 = np.maximum(np.ceil(points[:, :, 0].min(axis=1) - 0.5), 0).astype(np.int64)
+        y0 = np.maximum(np.ceil(points[:, :, 1].min(axis=1) - 0.5), 0).astype(np.int64)
+        x1 = np.minimum(np.floor(points[:, :, 0].max(axis=1) - 0.5), self.width - 1).astype(np.int64)
+        y1 = np.minimum(np.floor(points[:, :, 1].max(axis=1) - 0.5), self.height - 1).astype(np.int64)
+        visible = (x1 >= x0) & (y1 >= y0)
+        points, inv_z, indices = points[visible], inv_z[visible], indices[visible]
+        x0, y0, x1, y1 = x0[visible], y0[visible], x1[visible], y1[visible]
+
+        # batch triangles of similar size, small bounding boxes rounded up to
+        # powers of two, large ones rasterized one by one at their exact size
+        box_w = 1 << np.ceil(np.log2(x1 - x0 + 1)).astype(np.int64)
+        box_h = 1 << np.ceil(np.log2(y1 - y0 + 1)).astype(np.int64)
+        large = box_w * box_h > self.largeTriangle
+        box_w[large] = (x1 - x0 + 1)[large]
+        box_h[large] = (y1 - y0 + 1)[large]
+        pixel_ids, depths, fragment_index = [], [], []
+        for size in np.unique(np.stack([box_w, box_h], axis=1), axis=0):
+            members = np.nonzero((box_w == size[0]) & (box_h == size[1]))[0]
+            step = max(1, self.batchPixels // int(size[0] * size[1]))
+            for start in range(0, len(members), step):
+                batch = members[start:start + step]
+                pixel_id, depth, tri = self.fragments(points[batch], inv_z[batch], x0[batch], y0[batch],
+                                                      x1[batch], y1[batch], int(size[0]), int(size[1]))
+                pixel_ids.append(pixel_id)
+                depths.append(depth)
+                fragment_index.append(indices[batch][tri])
+
+        index_map = np.zeros(self.height * self.width, np.int32)
+        depth_map = np.zeros(self.height * self.width, np.float32)
+        if pixel_ids:
+            pixel_ids = np.concatenate(pixel_ids)
+            depths = np.concatenate(depths)
+            fragment_index = np.concatenate(fragment_index)
+            # z-buffer: the closest fragment of every pixel
+            order = np.lexsort((depths, pixel_ids))
+            first = np.ones(len(order), bool)
+            first[1:] = pixel_ids[order][1:] != pixel_ids[order][:-1]
+            closest = order[first]
+            index_map[pixel_ids[closest]] = fragment_index[closest]
+            depth_map[pixel_ids[closest]] = depths[closest]
+        return index_map.reshape(self.height, self.width), depth_map.reshape(self.height, self.width)
+
+# Rasterizes the scenes of SceneRecord lines: models by class id, the resting
+# surface by object name. Meshes are loaded once.
+class SceneRasterizer:
+
+    def __init__(self, model_names, model_folder, surface_file, camIntrinsic, width=None, height=None):
+        self.models = [load_model('%s/%s/%s.obj' % (model_folder, name, name)) for name in model_names]
+        self.surface = load_obj(surface_file)
+        self.rasterizer = Rasterizer(camIntrinsic, width, height)
+
+    # Object index map with class id + 1 per pixel (the values of
+    # ObjectIndexPass) and depth map of an image of a scene record.
+    def renderRecord(self, record, view):
+        objects = [(self.models[ob['class_id']], ob['matrix_world'], ob['class_id'] + 1) for ob in record['objects']]
+        for ob in record['surface']:
+            if not ob['hide_render'] and ob['name'] in self.surface:
+                objects.append((self.surface[ob['name']], ob['matrix_world'], 0))
+        return self.rasterizer.render(objects, view['camera_pose'])
@@ -0,0 +1,103 @@
+"""
+@file RenderPasses.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import bpy
+import numpy
+
+import ImageIO
+
+# Route render layer outputs to a viewer node, so that every render also
+# leaves them in memory as the 'Viewer Node' image, next to the composite
+# output. The alpha input of the viewer is optional.
+def route_to_viewer(image_output, alpha_output=None):
+    scene = bpy.context.scene
+    scene.render.use_compositing = True
+    scene.use_nodes = True
+
+    tree = scene.node_tree
+    for node in tree.nodes:
+        tree.nodes.remove(node)
+    render_layers = tree.nodes.new('CompositorNodeRLayers')
+    composite = tree.nodes.new('CompositorNodeComposite')
+    viewer = tree.nodes.new('CompositorNodeViewer')
+    viewer.use_alpha = alpha_output is not None
+    tree.links.new(render_layers.outputs['Image'], composite.inputs['Image'])
+    tree.links.new(render_layers.outputs['Alpha'], composite.inputs['Alpha'])
+    tree.links.new(render_layers.outputs[image_output], viewer.inputs['Image'])
+    if alpha_output is not None:
+        tree.links.new(render_layers.outputs[alpha_output], viewer.inputs['Alpha'])
+
+# float pixels (h, w, 4) of the viewer node, rows top to bottom like the saved images
+def read_viewer():
+    viewer = bpy.data.images['Viewer Node']
+    width, height = viewer.size
+    pixels = numpy.array(viewer.pixels[:], dtype=numpy.float32).reshape(height, width, 4)
+    return numpy.flipud(pixels)
+
+# 8 bit RGB of the rendered image in the viewer, with the sRGB view transform
+# of a saved render when the scene uses it (exposure and gamma are ignored).
+def read_viewer_color(pixels):
+    scene = bpy.context.scene
+    if scene.display_settings.display_device == 'sRGB' and scene.view_settings.view_transform in ['Default', 'Standard']:
+        return ImageIO.linear_to_srgb(pixels[:, :, 0:3])
+    return numpy.rint(numpy.clip(pixels[:, :, 0:3], 0.0, 1.0) * 255.0).astype(numpy.uint8)
+
+class ObjectIndexPass:
+    imageName = 'ObjectIndex'
+
+    # Route the object index pass of the render layer to a viewer node. With
+    # withColor the rendered image goes to the viewer too, with the index in
+    # its alpha channel, so both are read back without writing the render.
+    def __init__(self, withColor=False):
+        bpy.context.scene.render.layers[0].use_pass_object_index = True
+        if withColor:
+            route_to_viewer('Image', 'IndexOB')
+        else:
+            route_to_viewer('IndexOB')
+        self.channel = 3 if withColor else 0
+
+    # pass index 0 is left to the background and the resting surface
+    def setIndex(self, object_name, index):
+        bpy.data.objects[object_name].pass_index = index
+
+    # Read the id image of the last render, rows top to bottom like the saved images.
+    def read(self):
+        return numpy.rint(read_viewer()[:, :, self.channel]).astype(numpy.uint8)
+
+    # the rendered image and the id image of the last render, see withColor
+    def readColor(self):
+        pixels = read_viewer()
+        return read_viewer_color(pixels), numpy.rint(pixels[:, :, self.channel]).astype(numpy.uint8)
+
+    # Save the id image as a gray png, the pixel value is the pass index.
+    def write(self, filepath):
+        index_map = self.read()
+        height, width = index_map.shape
+        image = bpy.data.images.get(self.imageName)
+        if image is None or tuple(image.size) != (width, height):
+            if image is not None:
+                bpy.data.images.remove(image)
+            image = bpy.data.images.new(self.imageName, width=width, height=height, alpha=False)
+
+        rgba = numpy.ones((height, width, 4), dtype=numpy.float32)
+        rgba[:, :, 0:3] = numpy.flipud(index_map)[:, :, numpy.newaxis] / 255.0
+        image.pixels[:] = rgba.ravel().tolist()
+        image.filepath_raw = filepath
+        image.file_format = 'PNG'
+        image.save()
+        return index_map
+
+# The rendered image read back from a viewer node instead of being written by
+# the render operator, for renders without an object index pass.
+class ColorPass:
+
+    def __init__(self):
+        route_to_viewer('Image')
+
+    def readColor(self):
+        return read_viewer_color(read_viewer()), None
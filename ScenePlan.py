@@ -0,0 +1,133 @@
+"""
+@file ScenePlan.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import numpy as np
+
+# point light colors, as Environment.Light.lightColors
+NUM_LIGHT_COLORS = 6
+# the point light energy is an integer in [0, MAX_LIGHT_ENERGY]
+MAX_LIGHT_ENERGY = 4
+ENVIRONMENT_ENERGY_RANGE = (0.5, 1.0)
+
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+# splitmix64 finalizer, element wise on uint64 arrays
+def mix64(x):
+    x = np.asarray(x, dtype=np.uint64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+# Seed of every scene: element k of the splitmix64 sequence of the run seed.
+# A scene depends on nothing but its index and the run seed; a scene drawn
+# again after it was quarantined continues the sequence of its own seed.
+def scene_seeds(seed, scenes, redraw=0):
+    with np.errstate(over='ignore'):
+        seeds = mix64(np.uint64(seed) + (np.asarray(scenes, dtype=np.uint64) + np.uint64(1)) * GOLDEN_GAMMA)
+        if redraw > 0:
+            seeds = mix64(seeds + np.uint64(redraw) * GOLDEN_GAMMA)
+        return seeds
+
+# Uniform numbers in [0, 1), (len(seeds), num_slots): slot j of a scene is the
+# j-th splitmix64 output of its seed, so draws of different scenes and slots
+# never overlap.
+def uniforms(seeds, num_slots):
+    with np.errstate(over='ignore'):
+        counters = (np.arange(num_slots, dtype=np.uint64) + np.uint64(1)) * GOLDEN_GAMMA
+        bits = mix64(np.asarray(seeds, dtype=np.uint64)[:, np.newaxis] + counters[np.newaxis, :])
+    return (bits >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+# images rendered from one settled scene, scene s covers the images
+# [s * images_per_scene, (s + 1) * images_per_scene)
+def images_per_scene(cfg):
+    return cfg.getNumViews() * cfg.getRendersPerSimulation()
+
+# Everything random about a range of scenes, drawn up front: the object
+# subsets (indices into the model list, in drop order, -1 padded), their
+# initial locations and euler rotations, the pose library draw of the render
+# phase, the environment light and one point light per rendered variation.
+class ScenePlan:
+
+    def __init__(self, seed, first_scene, arrays):
+        self.seed = int(seed)
+        self.first_scene = int(first_scene)
+        self.arrays = arrays
+
+    def numScenes(self):
+        return len(self.arrays['seeds'])
+
+    @staticmethod
+    def build(cfg, seed, first_scene, num_scenes, redraw=0):
+        num_models = len(cfg.getObjModelList())
+        min_objects, max_objects = cfg.getMinObjectsScene(), cfg.getMaxObjectsScene()
+        variations = cfg.getRendersPerSimulation()
+        seeds = scene_seeds(seed, np.arange(first_scene, first_scene + num_scenes), redraw)
+        # fixed slot layout, a scene draws the same numbers wherever it is planned
+        u = uniforms(seeds, 3 + num_models + 6 * max_objects + 5 * variations)
+        slot = 3 + num_models
+
+        num_objects = min_objects + np.minimum((u[:, 0] * (max_objects - min_objects + 1)).astype(np.int64),
+                                               max_objects - min_objects)
+        # a random permutation of the models per scene, the first num_objects are dropped
+        order = np.argsort(u[:, 3:slot], axis=1, kind='stable')[:, 0:max_objects]
+        object_ids = np.where(np.arange(max_objects)[np.newaxis, :] < num_objects[:, np.newaxis], order, -1)
+
+        lows = np.array([cfg.getRangeX()[0], cfg.getRangeY()[0], cfg.getRangeZ()[0]], np.float64)
+        highs = np.array([cfg.getRangeX()[1], cfg.getRangeY()[1], cfg.getRangeZ()[1]], np.float64)
+        objects = u[:, slot:slot + 6 * max_objects].reshape(-1, max_objects, 6)
+        slot = slot + 6 * max_objects
+        locations = lows + objects[:, :, 0:3] * (highs - lows)
+        # whole degrees in [0, 360], as the samples have always been drawn
+        rotations = np.floor(objects[:, :, 3:6] * 361) * 3.14 / 180.0
+
+        lights = u[:, slot:slot + 5 * variations].reshape(-1, variations, 5)
+        light_lows = np.array([cfg.getLightRangeX()[0], cfg.getLightRangeY()[0], cfg.getLightRangeZ()[0]], np.float64)
+        light_highs = np.array([cfg.getLightRangeX()[1], cfg.getLightRangeY()[1], cfg.getLightRangeZ()[1]], np.float64)
+        energy_low, energy_high = ENVIRONMENT_ENERGY_RANGE
+
+        return ScenePlan(seed, first_scene, {
+            'seeds': seeds.astype(np.int64) & np.int64(0x7FFFFFFFFFFFFFFF),
+            'num_objects': num_objects,
+            'object_ids': object_ids,
+            'locations': locations,
+            'rotations': rotations,
+            'library_draws': u[:, 1],
+            'environment_energy': energy_low + u[:, 2] * (energy_high - energy_low),
+            'light_locations': light_lows + lights[:, :, 0:3] * (light_highs - light_lows),
+            'light_energy': np.floor(lights[:, :, 3] * (MAX_LIGHT_ENERGY + 1)).astype(np.int64),
+            'light_colors': np.floor(lights[:, :, 4] * NUM_LIGHT_COLORS).astype(np.int64)})
+
+    # The plan row of a scene: the 'seed' of the scene and its arrays, objects
+    # cut to the scene's subset.
+    def scene(self, scene):
+        row = dict((name, values[scene - self.first_scene]) for name, values in self.arrays.items())
+        count = int(row['num_objects'])
+        row['object_ids'] = [int(index) for index in row['object_ids'][0:count]]
+        row['locations'] = row['locations'][0:count]
+        row['rotations'] = row['rotations'][0:count]
+        row['seed'] = int(row.pop('seeds'))
+        return row
+
+    # the row of a scene drawn for the redraw-th time
+    def redrawn(self, cfg, scene, redraw):
+        return ScenePlan.build(cfg, self.seed, scene, 1, redraw).scene(scene)
+
+    # the row as plain json values
+    @staticmethod
+    def to_json(row):
+        return dict((name, np.asarray(value).tolist()) for name, value in row.items())
+
+    def save(self, filepath):
+        with open(filepath, 'wb') as file:
+            np.savez(file, seed=self.seed, first_scene=self.first_scene, **self.arrays)
+
+    @staticmethod
+    def load(filepath):
+        with np.load(filepath) as data:
+            arrays = dict((name, data[name]) for name in data.files if name not in ['seed', 'first_scene'])
+            return ScenePlan(data['seed'], data['first_scene'], arrays)
@@ -0,0 +1,87 @@
+"""
+@file SceneRecord.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import bpy
+import json
+from mathutils import Matrix
+
+def matrix_to_list(matrix):
+    return [list(row) for row in matrix]
+
+# Compact description of every rendered scene, one json line per scene: the
+# settled object matrices, the resting surface, the lighting and the camera
+# pose of every image. rebuild_blend.py turns a line back into a .blend file.
+class SceneRecorder:
+
+    def __init__(self, filepath, camIntrinsic):
+        self.filepath = filepath
+        self.camIntrinsic = [list(row) for row in camIntrinsic]
+
+    def capture(self, first_image, object_names, class_ids, surface_names, seed=None):
+        world = bpy.context.scene.world.light_settings
+        return {'scene': first_image,
+                'seed': seed,
+                'objects': [{'name': name, 'class_id': int(class_id),
+                             'matrix_world': matrix_to_list(bpy.data.objects[name].matrix_world)}
+                            for name, class_id in zip(object_names, class_ids)],
+                'surface': [{'name': name, 'hide_render': bpy.data.objects[name].hide_render,
+                             'matrix_world': matrix_to_list(bpy.data.objects[name].matrix_world)}
+                            for name in surface_names],
+                'environment_energy': world.environment_energy,
+                'camera_intrinsics': self.camIntrinsic,
+                'images': []}
+
+    def addImage(self, record, num, camera_pose):
+        lamp = bpy.data.objects['Point']
+        record['images'].append({'image': num,
+                                 'camera_pose': [float(value) for value in camera_pose],
+                                 'light_location': list(lamp.location),
+                                 'light_energy': lamp.data.energy,
+                                 'light_color': list(lamp.data.color)})
+
+    def write(self, record):
+        with open(self.filepath, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+
+# the record line holding an image index
+def find_record(filepaths, image):
+    for filepath in filepaths:
+        with open(filepath, 'r') as file:
+            for line in file:
+                record = json.loads(line)
+                for view in record['images']:
+                    if view['image'] == image:
+                        return record, view
+    return None, None
+
+# Put the scene of a record back: poses of the objects and surface, the
+# lighting and the camera of one of its images. Models not in the record are
+# hidden, surface parts keep the hide_render they were rendered with.
+def apply_record(record, view, model_names):
+    for name in model_names:
+        bpy.data.objects[name].hide = True
+        bpy.data.objects[name].hide_render = True
+    for ob in record['objects'] + record['surface']:
+        me_ob = bpy.data.objects[ob['name']]
+        me_ob.matrix_world = Matrix(ob['matrix_world'])
+        if ob in record['objects']:
+            me_ob.hide = False
+            me_ob.hide_render = False
+        else:
+            me_ob.hide_render = ob['hide_render']
+
+    bpy.context.scene.world.light_settings.environment_energy = record['environment_energy']
+    lamp = bpy.data.objects['Point']
+    lamp.location = view['light_location']
+    lamp.data.energy = view['light_energy']
+    lamp.data.color = view['light_color']
+
+    pose = view['camera_pose']
+    bpy.data.objects['Camera'].location = pose[0:3]
+    bpy.data.objects['Camera'].rotation_mode = 'QUATERNION'
+    bpy.data.objects['Camera'].rotation_quaternion = pose[3:7]
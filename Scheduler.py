@@ -0,0 +1,299 @@
+"""
+@file Scheduler.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import os, shutil, subprocess, time
+import os.path as osp
+
+from PoseLibrary import PoseLibrary
+import Progress
+import Label
+
+# append the lines of src_filepath, if it exists, to dst_filepath
+def append_file(src_filepath, dst_filepath):
+    if osp.exists(src_filepath):
+        with open(src_filepath, 'r') as src_file:
+            with open(dst_filepath, 'a') as dst_file:
+                dst_file.write(src_file.read())
+
+class Shard:
+    def __init__(self, shard_id, start, count, folder):
+        self.id = shard_id
+        self.start = start
+        self.count = count
+        self.folder = folder
+        self.resumeAt = start
+        self.attempts = 0
+        self.restarts = 0
+        self.process = None
+        self.launchedAt = None
+        self.timedOut = False
+        self.log = None
+        self.expected = self.expectedImages()
+
+    def expectedImages(self):
+        return [osp.join(self.folder, 'image_%05d.png' % num) for num in range(self.start, self.start + self.count)]
+
+    def isComplete(self):
+        return all(osp.exists(filepath) for filepath in self.expected)
+
+class ShardScheduler:
+    pollInterval = 1.0
+    # relaunched workers continue after the last finished scene of their shard
+    resumable = True
+    # quarantines of one scene that do not use up a retry
+    maxRedraws = 3
+
+    # Workers draw their scenes from the scene plan at plan_filepath, built
+    # with the run seed; the seed is only printed with every launch.
+    def __init__(self, blender_path, blank_file, render_code, syn_images_folder, num_workers, plan_filepath, seed,
+                 max_retries=2, extra_args=(), scene_timeout=0):
+        self.blender_path = blender_path
+        self.plan_filepath = plan_filepath
+        self.seed = seed
+        self.extra_args = list(extra_args)
+        self.blank_file = blank_file
+        self.render_code = render_code
+        self.syn_images_folder = syn_images_folder
+        self.num_workers = max(1, num_workers)
+        self.max_retries = max_retries
+        # seconds a worker may spend on one scene (or its setup), 0 for no limit
+        self.scene_timeout = scene_timeout
+        self.shards_folder = osp.join(syn_images_folder, 'shards')
+        self.logs_folder = osp.join(syn_images_folder, 'logs')
+
+    # Split the image index range [0, num_images) into contiguous shards, each
+    # with its own output folder. Shards start at scene boundaries, so the size
+    # is rounded up to whole scenes of images_per_scene images.
+    def split(self, num_images, shard_size, images_per_scene=1):
+        if shard_size <= 0:
+            shard_size = -(-num_images // self.num_workers)
+        shard_size = -(-shard_size // images_per_scene) * images_per_scene
+        shards = []
+        for start in range(0, num_images, shard_size):
+            shard_id = len(shards)
+            folder = osp.join(self.shards_folder, 'shard_%03d' % shard_id)
+            shards.append(Shard(shard_id, start, min(shard_size, num_images - start), folder))
+        return shards
+
+    # the shards of a run.json written by Progress.write_run; older files have
+    # a shard seed as fourth entry, unused since workers read the scene plan
+    def shardsFromRun(self, run):
+        return [Shard(shard_id, start, count, osp.join(self.shards_folder, 'shard_%03d' % shard_id))
+                for shard_id, start, count in (entry[0:3] for entry in run['shards'])]
+
+    def renderCommand(self, shard):
+        end = shard.start + shard.count
+        return [self.blender_path, self.blank_file, '-b', '--python', self.render_code, '--',
+                '--start', str(shard.resumeAt), '--count', str(end - shard.resumeAt),
+                '--plan', self.plan_filepath, '--output', shard.folder] + self.extra_args
+
+    def launch(self, shard, restart=False):
+        # keep the finished scenes of an earlier attempt, drop the rest
+        shard.resumeAt = shard.start
+        quarantined = None
+        if self.resumable and osp.exists(shard.folder):
+            shard.resumeAt = Progress.first_missing_image(shard.folder, shard.start, shard.start + shard.count)
+            Progress.remove_partial_outputs(shard.folder, shard.resumeAt)
+        elif osp.exists(shard.folder):
+            # the quarantine outlives the outputs of an attempt
+            quarantine_filepath = osp.join(shard.folder, Progress.QUARANTINE_FILENAME)
+            if osp.exists(quarantine_filepath):
+                with open(quarantine_filepath, 'r') as file:
+                    quarantined = file.read()
+            shutil.rmtree(shard.folder)
+        if not osp.exists(osp.join(shard.folder, 'debug')):
+            os.makedirs(osp.join(shard.folder, 'debug'))
+        if quarantined is not None:
+            with open(osp.join(shard.folder, Progress.QUARANTINE_FILENAME), 'w') as file:
+                file.write(quarantined)
+        if osp.exists(osp.join(shard.folder, Progress.HEARTBEAT_FILENAME)):
+            os.remove(osp.join(shard.folder, Progress.HEARTBEAT_FILENAME))
+        if not osp.exists(self.logs_folder):
+            os.makedirs(self.logs_folder)
+
+        if restart:
+            shard.restarts = shard.restarts + 1
+        else:
+            shard.attempts = shard.attempts + 1
+        shard.log = open(osp.join(self.logs_folder, 'shard_%03d.log' % shard.id), 'a')
+        if shard.resumeAt >= shard.start + shard.count:
+            shard.log.write("### attempt %d: all images already rendered\n" % shard.attempts)
+            shard.process = None
+            return
+        render_cmd = self.renderCommand(shard)
+        shard.log.write("### attempt %d, restart %d: %s\n" % (shard.attempts, shard.restarts, ' '.join(render_cmd)))
+        shard.log.flush()
+        print("shard %d: images %d to %d of plan %s (run seed %d), attempt %d, restart %d" %
+              (shard.id, shard.resumeAt, shard.start + shard.count - 1, self.plan_filepath, self.seed,
+               shard.attempts, shard.restarts))
+        shard.launchedAt = time.time()
+        shard.timedOut = False
+        try:
+            shard.process = subprocess.Popen(render_cmd, stdout=shard.log, stderr=subprocess.STDOUT)
+        except OSError:
+            print('render failed. render_cmd: %s' % (' '.join(render_cmd)))
+            shard.process = None
+
+    # Called when a worker exited. Returns True once the shard is finished for
+    # good, relaunching it if it crashed and has retries left.
+    def finish(self, shard, stream):
+        if shard.process is not None:
+            returncode = shard.process.returncode
+        else:
+            returncode = 0 if shard.isComplete() else -1
+        shard.process = None
+        shard.log.close()
+        if returncode == 0 and shard.isComplete():
+            if stream is not None:
+                stream.wait(shard.folder)
+                stream.writeAnnotations(shard.folder)
+            return True
+        if returncode == Progress.RECYCLE_EXIT_CODE:
+            # planned restart to bound the memory of the worker, not a retry
+            self.launch(shard, restart=True)
+            return False
+        reason = 'timeout' if shard.timedOut else 'exit code %d' % returncode
+        print("shard %d failed (%s, see %s)" %
+              (shard.id, reason, osp.join(self.logs_folder, 'shard_%03d.log' % shard.id)))
+        if self.isolate(shard, reason):
+            if stream is not None:
+                stream.forget(shard.folder)
+            self.launch(shard, restart=True)
+            return False
+        if shard.attempts > self.max_retries:
+            print("shard %d: giving up after %d attempts" % (shard.id, shard.attempts))
+            if stream is not None:
+                stream.wait(shard.folder)
+            return True
+        if stream is not None:
+            stream.forget(shard.folder)
+        self.launch(shard)
+        return False
+
+    # Quarantine the scene a failed worker was on, the relaunched worker draws
+    # it again with another seed. Returns True when the shard goes on without
+    # using up a retry: the worker had finished scenes since it was launched
+    # (it resumes at the quarantined scene, so a worker failing on its first
+    # scene again and again runs out of retries) and the scene was not drawn
+    # maxRedraws times already. Workers that start over from the first scene
+    # of their shard always use up a retry.
+    def isolate(self, shard, reason):
+        heartbeat = Progress.read_heartbeat(shard.folder)
+        if heartbeat is None or heartbeat[1]['scene'] is None:
+            return False
+        entry = dict(heartbeat[1], shard=shard.id)
+        Progress.quarantine(shard.folder, entry, reason)
+        print("shard %d: scene %d (seed %d) quarantined, drawing it again" % (shard.id, entry['scene'], entry['seed']))
+        redraws = Progress.redraw_counts(shard.folder).get(entry['scene'], 0)
+        return self.resumable and entry['scene'] > shard.resumeAt and redraws < self.maxRedraws
+
+    # no heartbeat for scene_timeout seconds: the worker hangs in a scene or
+    # in its setup
+    def hung(self, shard):
+        if self.scene_timeout <= 0:
+            return False
+        heartbeat = Progress.read_heartbeat(shard.folder)
+        silent = heartbeat[0] if heartbeat is not None else time.time() - shard.launchedAt
+        return silent > self.scene_timeout
+
+    def kill(self, shard):
+        shard.log.write("### no heartbeat for %d seconds, worker killed\n" % self.scene_timeout)
+        shard.log.flush()
+        shard.process.kill()
+        shard.process.wait()
+        shard.timedOut = True
+
+    # Run all shards with at most num_workers blender processes at a time. If a
+    # label stream is given, finished images are labeled while rendering goes on.
+    # Workers that stop sending heartbeats are killed and handled as crashed.
+    def run(self, shards, stream=None):
+        pending = list(shards)
+        running = []
+        while pending or running:
+            while pending and len(running) < self.num_workers:
+                shard = pending.pop(0)
+                self.launch(shard)
+                running.append(shard)
+
+            time.sleep(self.pollInterval)
+            for shard in list(running):
+                if stream is not None:
+                    stream.poll(shard.folder)
+                if shard.process is not None and shard.process.poll() is None:
+                    if not self.hung(shard):
+                        continue
+                    self.kill(shard)
+                if self.finish(shard, stream):
+                    running.remove(shard)
+        return [shard for shard in shards if not shard.isComplete()]
+
+    # Move the shard outputs into the main output folder. Shards already write
+    # global image indices, so the merged numbering is contiguous. The
+    # annotation file of a shard becomes annotations_<shard id>.txt.
+    def merge(self, shards):
+        for shard in shards:
+            for subfolder in ['', 'debug']:
+                src_folder = osp.join(shard.folder, subfolder)
+                dst_folder = osp.join(self.syn_images_folder, subfolder)
+                if not osp.exists(src_folder):
+                    continue
+                for filename in sorted(os.listdir(src_folder)):
+                    src = osp.join(src_folder, filename)
+                    if not osp.isfile(src) or filename in ['manifest.txt', Progress.PROGRESS_FILENAME,
+                                                           Progress.QUARANTINE_FILENAME, Progress.HEARTBEAT_FILENAME]:
+                        continue
+                    if subfolder == '' and filename == Label.ANNOTATIONS_FILENAME:
+                        filename = 'annotations_%03d.txt' % shard.id
+                    shutil.move(src, osp.join(dst_folder, filename))
+            # progress lines are appended once their outputs are all in place
+            for filename in [Progress.PROGRESS_FILENAME, Progress.QUARANTINE_FILENAME]:
+                append_file(osp.join(shard.folder, filename), osp.join(self.syn_images_folder, filename))
+            shutil.rmtree(shard.folder)
+        if osp.exists(self.shards_folder) and not os.listdir(self.shards_folder):
+            os.rmdir(self.shards_folder)
+
+# Bulk physics job of the pose library: shards count scenes instead of images
+# and each worker leaves a pose library in its folder, merged at the end.
+class PoseLibraryScheduler(ShardScheduler):
+    resumable = False
+
+    def __init__(self, blender_path, blank_file, render_code, syn_images_folder, num_workers, plan_filepath, seed,
+                 max_retries=2, extra_args=(), scene_timeout=0):
+        ShardScheduler.__init__(self, blender_path, blank_file, render_code, syn_images_folder, num_workers, plan_filepath,
+                                seed, max_retries, ['--phase', 'simulate'] + list(extra_args), scene_timeout)
+
+    def split(self, num_scenes, shard_size, images_per_scene=1):
+        shards = ShardScheduler.split(self, num_scenes, shard_size)
+        for shard in shards:
+            shard.expected = [osp.join(shard.folder, 'pose_library', 'offsets.npy')]
+        return shards
+
+    # Merge the libraries of the shards into library_folder once all shards
+    # finished, None (and the shards left in place) otherwise. The library is
+    # written next to library_folder and renamed into place, an existing
+    # library is only replaced by a complete one.
+    def merge(self, shards, library_folder):
+        if not shards or not all(shard.isComplete() for shard in shards):
+            return None
+        merged = PoseLibrary.merge([PoseLibrary.load(osp.join(shard.folder, 'pose_library')) for shard in shards])
+        library_folder = library_folder.rstrip('/')
+        tmp_folder, old_folder = library_folder + '.tmp', library_folder + '.old'
+        for folder in [tmp_folder, old_folder]:
+            if osp.exists(folder):
+                shutil.rmtree(folder)
+        merged.save(tmp_folder)
+        for shard in shards:
+            append_file(osp.join(shard.folder, Progress.QUARANTINE_FILENAME), osp.join(tmp_folder, Progress.QUARANTINE_FILENAME))
+        if osp.exists(library_folder):
+            os.rename(library_folder, old_folder)
+        os.rename(tmp_folder, library_folder)
+        if osp.exists(old_folder):
+            shutil.rmtree(old_folder)
+        for shard in shards:
+            shutil.rmtree(shard.folder)
+        return merged
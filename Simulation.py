@@ -0,0 +1,187 @@
+"""
+@file Simulation.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+"""
+
+import bpy, bmesh
+import numpy
+
+class Simulator:
+
+    def __init__(self, maxSteps, adaptive=False, linearThreshold=0.0005, angularThreshold=0.005, restFrames=5):
+        self.maxSteps = maxSteps
+        self.adaptive = adaptive
+        self.linearThreshold = linearThreshold
+        self.angularThreshold = angularThreshold
+        self.restFrames = restFrames
+        self.bodies = []
+
+    # Rigid body and collision modifier of a model, added once per object.
+    # Scenes only switch them on and off, see enable().
+    def addRigidBody(self, name):
+        ob = bpy.data.objects[name]
+        bpy.context.scene.objects.active = ob
+        bpy.ops.rigidbody.object_add(type='ACTIVE')
+        bpy.ops.object.modifier_add(type = 'COLLISION')
+        ob.rigid_body.mass = 10.0
+        ob.rigid_body.use_margin = True
+        ob.rigid_body.collision_margin = 0
+        ob.rigid_body.linear_damping = 0.9
+        ob.rigid_body.angular_damping = 0.9
+        self.bodies.append(name)
+
+    # Simulate the objects of a scene, the other bodies stay static where they
+    # were parked.
+    def enable(self, object_names):
+        for name in self.bodies:
+            ob = bpy.data.objects[name]
+            enabled = name in object_names
+            ob.rigid_body.enabled = enabled
+            for modifier in ob.modifiers:
+                if modifier.type == 'COLLISION':
+                    modifier.show_viewport = enabled
+                    modifier.show_render = enabled
+
+    # Drop the frames cached by the previous scene and go back to the start
+    # frame. Setting a cache property, even to its own value, marks the rigid
+    # body cache outdated and frees its frames.
+    def freeCache(self):
+        scene = bpy.context.scene
+        bpy.ops.ptcache.free_bake_all()
+        if scene.rigidbody_world is not None:
+            cache = scene.rigidbody_world.point_cache
+            cache.frame_end = cache.frame_end
+        scene.frame_set(scene.frame_start)
+
+    # world positions (n, 3) and rotations as unit quaternions (n, 4)
+    def getPoses(self, object_names):
+        locations = []
+        rotations = []
+        for name in object_names:
+            location, rotation = bpy.data.objects[name].matrix_world.decompose()[0:2]
+            locations.append(location[:])
+            rotations.append(rotation[:])
+        return numpy.array(locations).reshape(-1, 3), numpy.array(rotations).reshape(-1, 4)
+
+    # Step the rigid body simulation and return the last simulated frame. In
+    # adaptive mode the simulation stops once every object moved less than the
+    # thresholds (meters and radians per frame) for restFrames frames in a row,
+    # maxSteps stays the hard cap.
+    def run(self, object_names):
+        previous = None
+        still_frames = 0
+        frame = 0
+        for frame in range(1, self.maxSteps):
+            bpy.context.scene.frame_set(frame)
+            if not self.adaptive:
+                continue
+
+            locations, rotations = self.getPoses(object_names)
+            if previous is not None:
+                linear = numpy.linalg.norm(locations - previous[0], axis=1)
+                dot = numpy.clip(numpy.abs(numpy.sum(rotations * previous[1], axis=1)), 0.0, 1.0)
+                angular = 2.0 * numpy.arccos(dot)
+                if numpy.all(linear < self.linearThreshold) and numpy.all(angular < self.angularThreshold):
+                    still_frames = still_frames + 1
+                else:
+                    still_frames = 0
+                if still_frames >= self.restFrames:
+                    break
+            previous = (locations, rotations)
+        return frame
+
+# Low-poly collision shapes for the rigid body simulation. Bullet builds the
+# convex hull of the full mesh for every simulated object, a proxy mesh that
+# holds only the (decimated) hull vertices gives it the same shape with far
+# fewer points. The full mesh is swapped back in before rendering.
+class CollisionProxies:
+
+    def __init__(self, maxVertices=64, assets=None):
+        self.maxVertices = maxVertices
+        self.assets = assets
+        self.proxies = {}
+        self.meshes = {}
+
+    # convex hull of a set of points as (vertices, faces)
+    def convexHull(self, coords):
+        bm = bmesh.new()
+        for co in coords:
+            bm.verts.new(co)
+        hull = bmesh.ops.convex_hull(bm, input=bm.verts[:])
+        faces = [face for face in hull['geom'] if isinstance(face, bmesh.types.BMFace)]
+        verts = list(set(vert for face in faces for vert in face.verts))
+        order = dict((vert, i) for i, vert in enumerate(verts))
+        hull_verts = [vert.co[:] for vert in verts]
+        hull_faces = [[order[vert] for vert in face.verts] for face in faces]
+        bm.free()
+        return hull_verts, hull_faces
+
+    def hullMesh(self, name, coords):
+        hull_verts, hull_faces = self.convexHull(coords)
+        mesh = bpy.data.meshes.new(name)
+        mesh.from_pydata(hull_verts, [], hull_faces)
+        mesh.update()
+        return mesh
+
+    # largest distance of a point outside the convex mesh
+    def deviation(self, coords, mesh):
+        points = numpy.array(coords).reshape(-1, 3)
+        normals = numpy.array([face.normal[:] for face in mesh.polygons])
+        centers = numpy.array([face.center[:] for face in mesh.polygons])
+        if len(normals) == 0:
+            return 0.0
+        offsets = numpy.sum(normals * centers, axis=1)
+        return max(0.0, float(numpy.max(numpy.min(points.dot(normals.T) - offsets, axis=1))))
+
+    def buildProxy(self, me_ob):
+        name = me_ob.data.name + '_proxy'
+        coords = [v.co[:] for v in me_ob.data.vertices]
+        proxy = self.hullMesh(name, coords)
+        if len(proxy.vertices) > self.maxVertices:
+            # collapse the hull and take the hull of what is left
+            tmp_ob = bpy.data.objects.new(name, proxy)
+            bpy.context.scene.objects.link(tmp_ob)
+            decimate = tmp_ob.modifiers.new('Decimate', 'DECIMATE')
+            decimate.ratio = float(self.maxVertices) / len(proxy.vertices)
+            decimated = tmp_ob.to_mesh(bpy.context.scene, True, 'PREVIEW')
+            bpy.context.scene.objects.unlink(tmp_ob)
+            bpy.data.objects.remove(tmp_ob)
+            bpy.data.meshes.remove(proxy)
+            proxy = self.hullMesh(name, [v.co[:] for v in decimated.vertices])
+            bpy.data.meshes.remove(decimated)
+            proxy.name = name
+        print ("collision proxy of %s: %d -> %d vertices, max deviation %f m" %
+               (me_ob.name, len(coords), len(proxy.vertices), self.deviation(coords, proxy)))
+        return proxy
+
+    # Build (or load from the asset cache) the proxy of an imported model.
+    def add(self, me_ob, obj_filepath=None):
+        proxy = None
+        cache_filepath = None
+        if self.assets is not None and obj_filepath is not None:
+            cache_filepath = self.assets.cacheFilepath(obj_filepath, '_proxy%d' % self.maxVertices)
+            meshes = self.assets.loadMeshes(cache_filepath)
+            if meshes:
+                proxy = meshes[0]
+        if proxy is None:
+            proxy = self.buildProxy(me_ob)
+            if cache_filepath is not None:
+                self.assets.write(cache_filepath, [proxy])
+        proxy.use_fake_user = True
+        self.proxies[me_ob.name] = proxy
+        self.meshes[me_ob.name] = me_ob.data
+
+    # Swap the proxies in before simulating, setting the collision shape makes
+    # blender rebuild the bullet shape from the current mesh.
+    def useProxies(self, object_names):
+        for name in object_names:
+            ob = bpy.data.objects[name]
+            ob.data = self.proxies[name]
+            ob.rigid_body.collision_shape = 'CONVEX_HULL'
+
+    def useRenderMeshes(self, object_names):
+        for name in object_names:
+            bpy.data.objects[name].data = self.meshes[name]
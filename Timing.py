@@ -0,0 +1,131 @@
+"""
+@file Timing.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Summary of the stage timings of a finished run:
+python Timing.py rendered_images
+"""
+
+import sys, glob, json, time, resource
+import os.path as osp
+from contextlib import contextmanager
+import numpy as np
+
+# Wall time of the stages of every scene, one json line per scene:
+# {"kind": "scene", "scene": 42, "objects": 7, "images": 1, "total": 3.1,
+#  "stages": {"simulation": 1.2, "render": 1.7, ...}}
+# The worker setup (model import, caches) is written as a line of kind "setup".
+class StageTimer:
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.current = None
+
+    def begin(self, kind='scene', **fields):
+        self.current = {'kind': kind, 'stages': {}}
+        self.current.update(fields)
+        self.started = time.time()
+
+    # time spent in the block is added to the stage of the current scene
+    @contextmanager
+    def stage(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            stages = self.current['stages']
+            stages[name] = stages.get(name, 0.0) + time.time() - start
+
+    def set(self, **fields):
+        self.current.update(fields)
+
+    def end(self):
+        record = self.current
+        record['total'] = time.time() - self.started
+        record['rss_mb'] = rss_mb()
+        with open(self.filepath, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+        self.current = None
+        return record
+
+# resident memory of this process, the peak where /proc is not available
+def rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * resource.getpagesize() / float(1 << 20)
+    except IOError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024.0 if sys.platform != 'darwin' else peak / float(1 << 20)
+
+def load_timings(filepaths):
+    records = []
+    for filepath in filepaths:
+        with open(filepath, 'r') as file:
+            records.extend(json.loads(line) for line in file if line.strip())
+    return records
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'count': int(len(values)), 'total': float(values.sum()), 'mean': float(values.mean()),
+            'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(values.max())}
+
+# Run report: percentiles of every stage over the scenes, of labeling over the
+# images, throughput and the slowest scenes. wall_seconds is the time of the
+# whole run, label_seconds the labeling time per image.
+def summarize(records, label_seconds, num_images, wall_seconds, num_slowest=5):
+    scenes = [record for record in records if record['kind'] == 'scene']
+    setups = [record for record in records if record['kind'] == 'setup']
+    stage_names = sorted(set(name for record in scenes for name in record['stages']))
+
+    report = {'images': num_images, 'scenes': len(scenes), 'wall_seconds': wall_seconds,
+              'images_per_second': num_images / wall_seconds if wall_seconds > 0 else 0.0,
+              'stages': {}, 'slowest_scenes': []}
+    if setups:
+        report['setup'] = percentiles([record['total'] for record in setups])
+    if scenes:
+        report['scene'] = percentiles([record['total'] for record in scenes])
+        report['objects'] = percentiles([record.get('objects', 0) for record in scenes])
+        report['rss_mb'] = percentiles([record.get('rss_mb', 0.0) for record in scenes])
+        for name in stage_names:
+            report['stages'][name] = percentiles([record['stages'].get(name, 0.0) for record in scenes])
+        slowest = sorted(scenes, key=lambda record: record['total'], reverse=True)[:num_slowest]
+        report['slowest_scenes'] = [{'scene': record['scene'], 'objects': record.get('objects', 0),
+                                     'total': record['total'], 'stages': record['stages']} for record in slowest]
+    if len(label_seconds) > 0:
+        report['stages']['labeling'] = percentiles(label_seconds)
+    return report
+
+def format_report(report):
+    lines = ["%d images of %d scenes in %.1f seconds, %.2f images/s" %
+             (report['images'], report['scenes'], report['wall_seconds'], report['images_per_second'])]
+    if 'setup' in report:
+        lines.append("worker setup: %.2f s mean over %d workers" % (report['setup']['mean'], report['setup']['count']))
+    if 'rss_mb' in report:
+        lines.append("worker memory: %.0f MB p50, %.0f MB max" % (report['rss_mb']['p50'], report['rss_mb']['max']))
+    lines.append("%-20s %10s %8s %8s %8s %8s" % ('stage (s)', 'total', 'p50', 'p90', 'p99', 'max'))
+    rows = sorted(report['stages'].items(), key=lambda item: item[1]['total'], reverse=True)
+    if 'scene' in report:
+        rows.append(('scene', report['scene']))
+    for name, stats in rows:
+        lines.append("%-20s %10.1f %8.3f %8.3f %8.3f %8.3f" %
+                     (name, stats['total'], stats['p50'], stats['p90'], stats['p99'], stats['max']))
+    if report['slowest_scenes']:
+        lines.append("slowest scenes:")
+        for record in report['slowest_scenes']:
+            stage, seconds = max(record['stages'].items(), key=lambda item: item[1]) if record['stages'] else ('-', 0.0)
+            lines.append("  scene %05d: %.2f s, %d objects, mostly %s (%.2f s)" %
+                         (record['scene'], record['total'], record['objects'], stage, seconds))
+    return '\n'.join(lines)
+
+# timing files of the render workers of a run
+def timing_files(syn_images_folder):
+    return sorted(glob.glob(osp.join(syn_images_folder, 'debug', 'timings_*.jsonl')))
+
+if __name__ == "__main__":
+    syn_images_folder = sys.argv[1] if len(sys.argv) > 1 else 'rendered_images'
+    with open(osp.join(syn_images_folder, 'debug', 'run_report.json'), 'r') as file:
+        print(format_report(json.load(file)))
@@ -0,0 +1,92 @@
+"""
+@file label_segmentation.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Compares the vectorized pixel-label engine in Label against the original
+per-pixel loop on synthetic mask renders and checks that both produce the
+same seg_img_%05d.png bytes.
+"""
+
+import os, sys, tempfile, time, argparse
+import os.path as osp
+import numpy as np
+import cv2
+from PIL import Image
+
+sys.path.append(osp.dirname(osp.dirname(osp.abspath(__file__))))
+import Label
+
+# synthetic mask render: background gray (64) with a textured blob
+def make_mask(rng, height, width):
+    mask = np.full((height, width, 3), 64, np.uint8)
+    cx, cy = rng.randint(0, width), rng.randint(0, height)
+    rx, ry = rng.randint(20, width // 3), rng.randint(20, height // 3)
+    v, u = np.ogrid[0:height, 0:width]
+    blob = ((u - cx) / float(rx)) ** 2 + ((v - cy) / float(ry)) ** 2 <= 1.0
+    mask[blob] = rng.randint(0, 256, size=(np.count_nonzero(blob), 3))
+    return mask
+
+# the labeling loop as it was written before vectorization
+def loop_engine(mask_images, class_ids, height, width, filepath):
+    seg_img = np.zeros((height,width,1), np.uint8)
+    for k in range(0, len(mask_images)):
+        mask_image = mask_images[k]
+        for u in range(0, height):
+            for v in range(0,width):
+                if any(val != 64 for val in mask_image[u][v][:]):
+                    seg_img[u][v] = np.uint8(class_ids[k]+1)
+    cv2.imwrite(filepath, seg_img)
+    seg_img_plt = Image.open(filepath)
+    seg_img_plt.putpalette(Label.SEGMENTATION_PALETTE)
+    seg_img_plt.save(filepath)
+
+def vectorized_engine(mask_images, class_ids, height, width, filepath):
+    pLabel = Label.Label()
+    seg_img = pLabel.label_masks(mask_images, class_ids, height, width)
+    pLabel.save_indexed_image(filepath, seg_img)
+
+def timed(engine, args, repeat):
+    best = float('inf')
+    for r in range(0, repeat):
+        start = time.time()
+        engine(*args)
+        best = min(best, time.time() - start)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark pixel label generation')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--objects', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    mask_images = [make_mask(rng, args.height, args.width) for k in range(0, args.objects)]
+    class_ids = list(rng.randint(0, len(Label.SEGMENTATION_PALETTE) // 3 - 1, size=args.objects))
+
+    tmp_dir = tempfile.mkdtemp()
+    loop_file = osp.join(tmp_dir, 'seg_loop.png')
+    vec_file = osp.join(tmp_dir, 'seg_vec.png')
+
+    loop_time = timed(loop_engine, (mask_images, class_ids, args.height, args.width, loop_file), args.repeat)
+    vec_time = timed(vectorized_engine, (mask_images, class_ids, args.height, args.width, vec_file), args.repeat)
+
+    with open(loop_file, 'rb') as f:
+        loop_bytes = f.read()
+    with open(vec_file, 'rb') as f:
+        vec_bytes = f.read()
+    os.remove(loop_file)
+    os.remove(vec_file)
+    os.rmdir(tmp_dir)
+
+    print("%dx%d, %d objects" % (args.width, args.height, args.objects))
+    print("loop       : %f seconds" % loop_time)
+    print("vectorized : %f seconds (%.1fx)" % (vec_time, loop_time / vec_time))
+    print("output identical: %s" % (loop_bytes == vec_bytes))
+    if loop_bytes != vec_bytes:
+        sys.exit(1)
@@ -0,0 +1,275 @@
+"""
+@file run_benchmarks.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Throughput of the generation stages over the standard scenarios: table and
+shelf, box and pixel labels, 2 and 10 objects, 1 and 3 views. The stages that
+run without Blender (bbox projection and Label post-processing) are timed on
+fixture scenes built from the obj models with a fixed seed. With --blender
+every scenario is also generated end to end and the stages of its run report
+are added. Results are compared against benchmarks/baseline.json, which is
+not part of the repository: throughput is only comparable on one machine, so
+the first local run records it with --update-baseline.
+
+python benchmarks/run_benchmarks.py --update-baseline
+python benchmarks/run_benchmarks.py
+python benchmarks/run_benchmarks.py --blender --update-baseline
+"""
+
+import os, sys, json, shutil, tempfile, time, argparse, subprocess, itertools
+import os.path as osp
+import numpy as np
+import cv2
+import yaml
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.append(g_repo_path)
+import Label
+import Projection
+
+g_baseline_path = osp.join(g_repo_path, 'benchmarks', 'baseline.json')
+
+SURFACES = ['table', 'shelf']
+LABEL_TYPES = ['box', 'pixel']
+NUM_OBJECTS = [2, 10]
+NUM_VIEWS = [1, 3]
+# allowed slowdown of the stages that vary more between runs than --threshold,
+# bbox projection takes microseconds per scene
+STAGE_THRESHOLDS = {'bbox_projection': 0.5}
+
+class Scenario:
+    def __init__(self, surface, label_type, num_objects, num_views):
+        self.surface = surface
+        self.label_type = label_type
+        self.num_objects = num_objects
+        self.num_views = num_views
+        self.name = '%s-%s-%dobj-%dview' % (surface, label_type, num_objects, num_views)
+
+    # the example config of the surface, narrowed down to the scenario
+    def config(self, num_images):
+        with open(osp.join(g_repo_path, 'config.yml.' + self.surface), 'r') as file:
+            data = yaml.safe_load(file)
+        data['camera']['num_poses'] = self.num_views
+        data['camera']['camera_poses'] = data['camera']['camera_poses'][0:self.num_views]
+        data['params']['num_images'] = num_images
+        data['params']['label_type'] = self.label_type
+        data['params']['minimum_objects_in_scene'] = self.num_objects
+        data['params']['maximum_objects_in_scene'] = self.num_objects
+        return data
+
+def all_scenarios():
+    return [Scenario(*combination) for combination in itertools.product(SURFACES, LABEL_TYPES, NUM_OBJECTS, NUM_VIEWS)]
+
+def load_obj_vertices(filepath):
+    vertices = []
+    with open(filepath, 'r') as file:
+        for line in file:
+            if line.startswith('v '):
+                vertices.append([float(value) for value in line.split()[1:4]])
+    return np.array(vertices)
+
+def random_matrix(rng, range_x, range_y, range_z):
+    quat = rng.normal(size=4)
+    return Projection.pose_to_matrix([rng.uniform(*range_x), rng.uniform(*range_y), rng.uniform(*range_z)] + list(quat))
+
+# Scenes of a scenario: the objects are placed uniformly in the drop ranges of
+# the config with a random orientation, there is no physics outside Blender.
+def build_scenes(cfg, num_objects, num_scenes, rng):
+    models = cfg['Models']
+    vertices = {}
+    scenes = []
+    for s in range(0, num_scenes):
+        class_ids = list(rng.choice(len(models), num_objects, replace=False))
+        for classid in class_ids:
+            if classid not in vertices:
+                vertices[classid] = load_obj_vertices(osp.join(g_repo_path, 'obj_models', models[classid], models[classid] + '.obj'))
+        matrices = [random_matrix(rng, cfg['params']['range_x'], cfg['params']['range_y'], cfg['params']['range_z'])
+                    for classid in class_ids]
+        scenes.append((class_ids, [vertices[classid] for classid in class_ids], matrices))
+    return scenes
+
+# raw_bbox lines as Camera.write_bounds_2d writes them, None when out of view
+def raw_bbox_line(classid, box, depth, width, height):
+    x, y, w, h = box
+    if x > width or y > height or x + w < 0 or y + h < 0 or w < 0 or h < 0:
+        return None
+    if x < 0:
+        w, x = w + x, 0
+    if y < 0:
+        h, y = h + y, 0
+    w = min(w, width - x)
+    h = min(h, height - y)
+    return "%i,%i,%i,%i,%i,%f\n" % (classid, x, y, w, h, depth)
+
+# Render the fixture files Label reads: image, raw boxes and either the
+# object index render or the per-object mask renders, one image per scene and
+# view. Objects are painted back to front (by x, like Label sorts them) as the
+# filled convex hull of their projected vertices.
+def write_fixtures(folder, scenes, P, width, height, index_pass, masks, rng):
+    if osp.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(osp.join(folder, 'debug'))
+    background = np.full((height, width, 3), 64, np.uint8)
+    num = 0
+    for class_ids, vertices, matrices in scenes:
+        world = [np.dot(v, m[0:3, 0:3].T) + m[0:3, 3] for v, m in zip(vertices, matrices)]
+        boxes = Projection.bounds_2d(P, vertices, matrices)
+        order = np.argsort([m[0, 3] for m in matrices])
+        for i in range(0, P.shape[0]):
+            cv2.imwrite(osp.join(folder, 'image_%05d.png' % num), background)
+            index_map = np.zeros((height, width), np.uint8)
+            written = 0
+            with open(osp.join(folder, 'debug', 'raw_bbox_%05d.txt' % num), 'w') as file:
+                for k in order:
+                    line = raw_bbox_line(class_ids[k], boxes[i][k], matrices[k][0, 3], width, height)
+                    if line is None:
+                        continue
+                    file.write(line)
+                    coords = np.dot(P[i], np.hstack([world[k], np.ones((len(world[k]), 1))]).T)
+                    points = np.clip(coords[0:2] / coords[2], -1e5, 1e5).T.astype(np.int32)
+                    hull = cv2.convexHull(points)
+                    cv2.fillConvexPoly(index_map, hull, int(class_ids[k]) + 1)
+                    if masks:
+                        mask = background.copy()
+                        cv2.fillConvexPoly(mask, hull, tuple(int(c) for c in rng.randint(0, 256, 3)))
+                        cv2.imwrite(osp.join(folder, 'debug', 'image_%05d_%02d.png' % (num, written)), mask)
+                    written = written + 1
+            if index_pass:
+                cv2.imwrite(osp.join(folder, 'debug', 'index_%05d.png' % num), index_map)
+            num = num + 1
+    return num
+
+def median_seconds(function, repeat, setup=None):
+    times = []
+    for r in range(0, repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return float(np.median(times))
+
+# images/s of the stages that run without Blender
+def run_cpu_stages(scenario, num_images, repeat, seed, work_folder):
+    cfg = scenario.config(num_images)
+    rng = np.random.RandomState(seed)
+    num_scenes = -(-num_images // scenario.num_views)
+    scenes = build_scenes(cfg, scenario.num_objects, num_scenes, rng)
+    P = Projection.projection_matrices(cfg['camera']['camera_intrinsics'], cfg['camera']['camera_poses'])
+    width, height = Projection.image_size(cfg['camera']['camera_intrinsics'])
+    num = num_scenes * scenario.num_views
+
+    results = {}
+    # projection takes microseconds per scene, time enough rounds to be stable
+    rounds = 50
+    seconds = median_seconds(lambda: [Projection.bounds_2d(P, vertices, matrices)
+                                      for r in range(0, rounds) for class_ids, vertices, matrices in scenes], repeat)
+    results['bbox_projection'] = rounds * num / seconds
+
+    pLabel = Label.Label()
+    if scenario.label_type == 'box':
+        variants = [('label_box_contours', False, False), ('label_box_index', True, False)]
+        label = pLabel.draw_bboxes
+    else:
+        variants = [('label_pixel_masks', False, True), ('label_pixel_index', True, False)]
+        label = pLabel.get_segmentation_labels
+    for stage, index_pass, masks in variants:
+        folder = osp.join(work_folder, stage)
+        # the fixtures are rewritten before every run, labeling appends and deletes files
+        setup = lambda: write_fixtures(folder, scenes, P, width, height, index_pass, masks, np.random.RandomState(seed))
+        seconds = median_seconds(lambda: label(folder, num), repeat, setup)
+        results[stage] = num / seconds
+    return results
+
+# images/s of the stages in the run report of a full generate_pictures.py run
+def run_blender_stages(scenario, num_images, seed, work_folder):
+    config_filepath = osp.join(work_folder, scenario.name + '.yml')
+    with open(config_filepath, 'w') as file:
+        yaml.safe_dump(scenario.config(num_images), file)
+    output_folder = osp.join(work_folder, scenario.name)
+    command = [sys.executable, 'generate_pictures.py', '--config', config_filepath,
+               '--output', output_folder, '--seed', str(seed)]
+    if subprocess.call(command, cwd=g_repo_path) != 0:
+        raise RuntimeError('generate_pictures.py failed for scenario %s' % scenario.name)
+    with open(osp.join(output_folder, 'debug', 'run_report.json'), 'r') as file:
+        report = json.load(file)
+    results = {'end_to_end': report['images_per_second']}
+    for stage, stats in report['stages'].items():
+        if stats['total'] > 0:
+            results['blender_' + stage] = report['images'] / stats['total']
+    return results
+
+# (scenario, stage, images/s, baseline images/s) of every stage that is more
+# than threshold (or its own STAGE_THRESHOLDS entry when larger) slower than
+# its baseline
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, stages in sorted(results.items()):
+        for stage, throughput in sorted(stages.items()):
+            base = baseline.get(name, {}).get(stage)
+            allowed = max(threshold, STAGE_THRESHOLDS.get(stage, 0.0))
+            if base is not None and throughput < base * (1.0 - allowed):
+                regressions.append((name, stage, throughput, base))
+    return regressions
+
+def print_results(results, baseline):
+    print("%-28s %-20s %12s %12s %8s" % ('scenario', 'stage', 'images/s', 'baseline', 'change'))
+    for name, stages in sorted(results.items()):
+        for stage, throughput in sorted(stages.items()):
+            base = baseline.get(name, {}).get(stage)
+            if base is None:
+                print("%-28s %-20s %12.2f %12s %8s" % (name, stage, throughput, '-', '-'))
+            else:
+                print("%-28s %-20s %12.2f %12.2f %+7.1f%%" % (name, stage, throughput, base, 100.0 * (throughput / base - 1.0)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark the generation pipeline against a stored baseline')
+    parser.add_argument('--images', type=int, default=24, help='images per scenario')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage, the median is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', default=None, help='only run scenarios with this name, repeatable')
+    parser.add_argument('--blender', action='store_true', help='also generate every scenario with blender ($BLENDER_PATH)')
+    parser.add_argument('--baseline', default=g_baseline_path)
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline, as a fraction')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args()
+
+    # the seed of a scenario follows its place among all scenarios, so it gets
+    # the same scenes when it is run alone with --scenario
+    scenarios = [(s, scenario) for s, scenario in enumerate(all_scenarios()) if args.scenario is None or scenario.name in args.scenario]
+    work_folder = tempfile.mkdtemp(prefix='physim_benchmark_')
+    results = {}
+    try:
+        for s, scenario in scenarios:
+            results[scenario.name] = run_cpu_stages(scenario, args.images, args.repeat, args.seed + s, work_folder)
+            if args.blender:
+                results[scenario.name].update(run_blender_stages(scenario, args.images, args.seed + s, work_folder))
+    finally:
+        shutil.rmtree(work_folder)
+
+    baseline = {}
+    if osp.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['scenarios']
+    print_results(results, baseline)
+
+    if args.update_baseline:
+        for name, stages in results.items():
+            baseline.setdefault(name, {}).update(stages)
+        with open(args.baseline, 'w') as file:
+            json.dump({'images': args.images, 'repeat': args.repeat, 'seed': args.seed, 'scenarios': baseline},
+                      file, indent=2, sort_keys=True)
+        print("baseline written to %s" % args.baseline)
+        sys.exit(0)
+
+    if not baseline:
+        print("no baseline at %s, run with --update-baseline to record one on this machine" % args.baseline)
+        sys.exit(0)
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, stage, throughput, base in regressions:
+        print("regression: %s %s %.2f images/s, baseline %.2f" % (name, stage, throughput, base))
+    if regressions:
+        sys.exit(1)
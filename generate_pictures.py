@@ -6,15 +6,20 @@ All Rights Reserved. For a full description see the file named LICENSE.
 Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
 """
 
-import os, sys, shutil
+import os, sys, shutil, json
 import os.path as osp
-import time, random
-from datetime import datetime
+import time, random, argparse
 
-from ConfigParser import ConfigParser
+from ConfigParser import ConfigParser, ConfigError
+from Scheduler import ShardScheduler, PoseLibraryScheduler
+from PoseLibrary import PoseLibrary
 import Label
-
-random.seed(datetime.now())
+import DatasetPack
+import CocoExporter
+import DatasetStats
+import Timing
+import Progress
+from ScenePlan import ScenePlan, images_per_scene
 
 if os.environ.get('BLENDER_PATH') == None:
     print("Please set BLENDER_PATH in bashrc!")
@@ -24,34 +29,180 @@ g_blender_executable_path = os.environ['BLENDER_PATH']
 
 g_blank_blend_file_path = 'blank.blend'
 
-# call blender to render images
-blank_file = osp.join(g_blank_blend_file_path)
-render_code = osp.join('simulate_and_render.py')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='simulate, render and label a synthetic dataset')
+    parser.add_argument('--workers', type=int, default=1, help='number of blender processes running at once')
+    parser.add_argument('--shard-images', type=int, default=0, help='images per shard (default: split evenly across workers)')
+    parser.add_argument('--retries', type=int, default=2, help='times a crashed shard is restarted')
+    parser.add_argument('--scene-timeout', type=float, default=0, metavar='SECONDS',
+                        help='kill a blender process that spends longer on one scene, the scene is quarantined (0: no limit)')
+    parser.add_argument('--label-workers', type=int, default=1, help='number of labeling processes running next to the renderers')
+    parser.add_argument('--output-format', choices=['files', 'packed'], default='files',
+                        help='loose files per image, or tar packs with a memory-mappable index in rendered_images/packs')
+    parser.add_argument('--pack-size', type=int, default=256, help='size of a pack file in MB')
+    parser.add_argument('--keep-files', action='store_true', help='keep the loose files after packing')
+    parser.add_argument('--build-pose-library', type=int, default=0, metavar='SCENES',
+                        help='only simulate SCENES scenes into the pose library of the config, no rendering')
+    parser.add_argument('--config', default='config.yml', help='configuration file')
+    parser.add_argument('--output', default='rendered_images', help='output folder')
+    parser.add_argument('--seed', type=int, default=None, help='run seed of the scene plan (default: random, stored in run.json)')
+    parser.add_argument('--max-scenes-per-worker', type=int, default=0,
+                        help='restart every blender process after this many scenes to bound its memory (0: never)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run in the output folder instead of starting over')
+    parser.add_argument('--coco', action='store_true', help='also write the labels to annotations.json in COCO format')
+    parser.add_argument('--coco-masks', action='store_true', help='add RLE instance masks to the COCO annotations')
+    parser.add_argument('--stats', action='store_true', help='write label statistics to debug/dataset_stats.json')
+    args = parser.parse_args()
+    seed = args.seed if args.seed is not None else random.SystemRandom().randint(0, 2**31 - 1)
+
+    # a broken config or a missing model stops the run before any blender process starts
+    try:
+        cfg = ConfigParser(args.config)
+        cfg.checkAssets()
+    except ConfigError as e:
+        print("%s: %s" % (args.config, e))
+        sys.exit(1)
+    num_of_images = cfg.getNumTrainingImages()
+
+    # call blender to render images
+    blank_file = osp.join(g_blank_blend_file_path)
+    render_code = osp.join('simulate_and_render.py')
+
+    # bulk physics job: settled poses for the render-only phase
+    library_folder = cfg.getPoseLibraryFolder()
+    if args.build_pose_library > 0:
+        if library_folder is None:
+            print("Please set params.pose_library in config.yml!")
+            sys.exit(1)
+        start = time.time()
+        build_folder = library_folder.rstrip('/') + '_build'
+        if os.path.exists(build_folder):
+            shutil.rmtree(build_folder)
+        os.makedirs(build_folder)
+        plan_filepath = osp.join(build_folder, 'plan.npz')
+        ScenePlan.build(cfg, seed, 0, args.build_pose_library).save(plan_filepath)
+        scheduler = PoseLibraryScheduler(g_blender_executable_path, blank_file, render_code, build_folder, args.workers,
+                                         plan_filepath, seed, args.retries, ['--config', args.config], args.scene_timeout)
+        shards = scheduler.split(args.build_pose_library, args.shard_images)
+        failed = scheduler.run(shards)
+        # the library in library_folder is only replaced by a complete one
+        if failed:
+            print("shards %s did not finish, see %s; the finished shards stay in %s" %
+                  ([shard.id for shard in failed], scheduler.logs_folder, build_folder))
+            sys.exit(1)
+        library = scheduler.merge(shards, library_folder)
+        shutil.rmtree(build_folder)
+        print("%d scenes simulated into %s in %f seconds!" % (library.numScenes(), library_folder, time.time() - start))
+        sys.exit(0)
+
+    # render only, sampling settled scenes from the pose library
+    plan_filepath = osp.join(args.output, 'plan.npz')
+    worker_args = ['--config', args.config, '--max-scenes', str(args.max_scenes_per_worker)]
+    if library_folder is not None and PoseLibrary.exists(library_folder):
+        # an empty library would render scenes without objects
+        try:
+            PoseLibrary.load(library_folder)
+        except ValueError as e:
+            print("%s, rebuild it with --build-pose-library" % e)
+            sys.exit(1)
+        worker_args += ['--phase', 'render', '--pose-library', library_folder]
+
+    syn_images_folder = args.output
+    start = time.time()
+    pLabel = Label.Label(cfg.getMinVisibleArea(), cfg.getMinVisibilityRatio())
+    coco_filepath = osp.join(syn_images_folder, 'annotations.json')
+    # a resumed run logs the seed it was started with
+    run = Progress.read_run(syn_images_folder) if args.resume else None
+    scheduler = ShardScheduler(g_blender_executable_path, blank_file, render_code, syn_images_folder, args.workers,
+                               plan_filepath, run['seed'] if run is not None else seed, args.retries, worker_args,
+                               args.scene_timeout)
 
-syn_images_folder = 'rendered_images'
-if os.path.exists(syn_images_folder):
-    shutil.rmtree(syn_images_folder)
-os.mkdir(syn_images_folder)
-os.mkdir(syn_images_folder + "/debug")
+    if args.resume:
+        # same shards and scene plan as the interrupted run; merged scenes that
+        # pass validation are kept, shard folders continue after their last scene
+        if run is None:
+            print("nothing to resume in %s" % syn_images_folder)
+            sys.exit(1)
+        if run['config_sha1'] != Progress.file_hash(args.config) or run['num_images'] != num_of_images:
+            print("%s changed since the run in %s started, cannot resume" % (args.config, syn_images_folder))
+            sys.exit(1)
+        if not osp.exists(plan_filepath):
+            ScenePlan.build(cfg, run['seed'], 0, -(-num_of_images // images_per_scene(cfg))).save(plan_filepath)
+        done = Progress.completed_images(Progress.load_progress(syn_images_folder))
+        shards = [shard for shard in scheduler.shardsFromRun(run)
+                  if not all(i in done for i in range(shard.start, shard.start + shard.count))]
+        unlabeled = [i for i in sorted(done) if not Label.is_labeled(syn_images_folder, cfg.getLabelType(), i)]
+        print("resuming: %d images done, %d to label, %d shards to render" % (len(done), len(unlabeled), len(shards)))
+        # the COCO file is exported again once everything is labeled
+        stream = Label.LabelStream(pLabel, cfg.getLabelType(), args.label_workers, cfg.getDebugImageInterval())
+        stream.add(syn_images_folder, unlabeled)
+    else:
+        if os.path.exists(syn_images_folder):
+            shutil.rmtree(syn_images_folder)
+        os.mkdir(syn_images_folder)
+        os.mkdir(syn_images_folder + "/debug")
+        # every random choice of the run, one row per scene
+        ScenePlan.build(cfg, seed, 0, -(-num_of_images // images_per_scene(cfg))).save(plan_filepath)
+        shards = scheduler.split(num_of_images, args.shard_images, images_per_scene(cfg))
+        Progress.write_run(syn_images_folder, args.config, num_of_images, shards, seed)
+        print("run seed %d" % seed)
+        # COCO annotations are streamed as the shards finish
+        coco = CocoExporter.CocoWriter(coco_filepath, cfg.getObjModelList()) if args.coco else None
+        stream = Label.LabelStream(pLabel, cfg.getLabelType(), args.label_workers, cfg.getDebugImageInterval(),
+                                   coco, args.coco_masks)
 
-start = time.time()
-try:
-    render_cmd = '%s %s -b --python %s' % \
-    (g_blender_executable_path, blank_file, render_code)
+    try:
+        failed = scheduler.run(shards, stream)
+        failed_labels = stream.close()
+    except BaseException:
+        # Ctrl-C or an error: do not wait for the labeling workers, so the run
+        # exits and --resume can pick it up
+        stream.terminate()
+        raise
+    if args.resume and unlabeled:
+        # merged images whose labeling failed before, next to the shard files
+        stream.writeAnnotations(syn_images_folder)
+    # failed shards stay in their folders for --resume
+    scheduler.merge([shard for shard in shards if shard not in failed])
+    quarantined = Progress.load_quarantine(syn_images_folder)
+    if quarantined:
+        print("%d scenes hung or crashed a worker and were drawn again, see %s" %
+              (len(quarantined), osp.join(syn_images_folder, Progress.QUARANTINE_FILENAME)))
+    if failed:
+        print("shards %s did not finish, see %s" % ([shard.id for shard in failed], scheduler.logs_folder))
+        sys.exit(1)
+    if failed_labels:
+        print("labeling failed for images %s" % sorted(failed_labels))
+        sys.exit(1)
 
-    os.system(render_cmd)
-except:
-    print('render failed. render_cmd: %s' % (render_cmd))
+    if args.coco:
+        if stream.coco is not None:
+            stream.coco.close()
+        else:
+            CocoExporter.export_folder(syn_images_folder, coco_filepath, cfg.getObjModelList(), cfg.getLabelType(),
+                                       num_of_images, args.coco_masks, args.label_workers)
+        print("COCO annotations written to %s" % coco_filepath)
 
-cfg = ConfigParser("config.yml")
+    # before packing, the statistics read the loose label files
+    if args.stats:
+        width, height = cfg.getImageSize()
+        stats = DatasetStats.dataset_stats(syn_images_folder, cfg.getObjModelList(), cfg.getLabelType(), num_of_images,
+                                           width, height, num_workers=args.label_workers)
+        with open(osp.join(syn_images_folder, 'debug', DatasetStats.STATS_FILENAME), 'w') as file:
+            json.dump(stats, file, indent=2)
+        print(DatasetStats.format_stats(stats))
 
-num_of_images = cfg.getNumTrainingImages()
-pLabel = Label.Label()
+    if args.output_format == 'packed':
+        num_packs = DatasetPack.pack_folder(syn_images_folder, num_of_images, args.pack_size << 20, args.keep_files)
+        print("%d images packed into %d pack files" % (num_of_images, num_packs))
 
-if cfg.getLabelType() == 'pixel':
-	pLabel.get_segmentation_labels(syn_images_folder, num_of_images)
-else:
-	pLabel.draw_bboxes(syn_images_folder, num_of_images)
+    end = time.time()
+    print ("%d images generated in %f seconds!" % (num_of_images, end - start))
 
-end = time.time()
-print ("%d images generated in %f seconds!" % (num_of_images, end - start))
+    # per-stage timings of the workers and the labeling, summarized
+    report = Timing.summarize(Timing.load_timings(Timing.timing_files(syn_images_folder)),
+                              stream.seconds, num_of_images, end - start)
+    with open(osp.join(syn_images_folder, 'debug', 'run_report.json'), 'w') as file:
+        json.dump(report, file, indent=2)
+    print(Timing.format_report(report))
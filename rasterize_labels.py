@@ -0,0 +1,83 @@
+"""
+@file rasterize_labels.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Regenerate the labels of a rendered dataset on the CPU, without Blender:
+the scene records are rasterized into object index maps (and depth maps)
+which Label turns into boxes or segmentation images.
+python rasterize_labels.py --labels pixel --depth --workers 8
+"""
+
+import sys, glob, json, time, argparse, multiprocessing
+import os.path as osp
+import numpy as np
+import cv2
+
+from ConfigParser import ConfigParser
+from Rasterizer import SceneRasterizer
+import Label
+
+# every pool process loads the meshes once
+g_rasterizer = None
+
+def init_worker(model_names, surface_file, camIntrinsic):
+    global g_rasterizer
+    g_rasterizer = SceneRasterizer(model_names, 'obj_models', surface_file, camIntrinsic)
+
+# Rasterize the images of one scene record and label them. Returns the
+# image indices that were written.
+def rasterize_record(task):
+    record, syn_images_folder, depth, pLabel, label_type = task
+    images = []
+    for view in record['images']:
+        i = view['image']
+        index_map, depth_map = g_rasterizer.renderRecord(record, view)
+        index_map = np.minimum(index_map, 255).astype(np.uint8)
+        cv2.imwrite(osp.join(syn_images_folder, 'debug/index_%05d.png' % i), index_map)
+        if depth:
+            # millimeters, 0 where there is nothing
+            depth_mm = np.minimum(np.round(depth_map * 1000.0), 65535).astype(np.uint16)
+            cv2.imwrite(osp.join(syn_images_folder, 'debug/depth_%05d.png' % i), depth_mm)
+        # labeled from the map in memory, it is not decoded again
+        if label_type == 'pixel':
+            pLabel.get_image_segmentation_labels(syn_images_folder, i, index_map)
+        elif label_type != 'none':
+            pLabel.draw_image_bboxes(syn_images_folder, i, True, index_map)
+        images.append(i)
+    return images
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='rasterize object index and depth maps from the scene records')
+    parser.add_argument('--folder', default='rendered_images', help='rendered dataset')
+    parser.add_argument('--config', default='config.yml', help='configuration file of the dataset')
+    parser.add_argument('--labels', choices=['box', 'pixel', 'none'], default=None,
+                        help='labels to write from the index maps (default: label_type of the config)')
+    parser.add_argument('--depth', action='store_true', help='also write 16 bit depth maps in millimeters')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    args = parser.parse_args()
+
+    cfg = ConfigParser(args.config)
+    label_type = args.labels if args.labels is not None else cfg.getLabelType()
+    pLabel = Label.Label(cfg.getMinVisibleArea(), cfg.getMinVisibilityRatio())
+
+    records = []
+    for filepath in sorted(glob.glob(osp.join(args.folder, 'debug', 'scenes_*.jsonl'))):
+        with open(filepath, 'r') as file:
+            records.extend(json.loads(line) for line in file if line.strip())
+    if not records:
+        print("no scene records in %s" % osp.join(args.folder, 'debug'))
+        sys.exit(1)
+
+    start = time.time()
+    pool = multiprocessing.Pool(max(1, args.workers), init_worker,
+                                (cfg.getObjModelList(), cfg.getSurfaceFile(), records[0]['camera_intrinsics']))
+    tasks = [(record, args.folder, args.depth, pLabel, label_type) for record in records]
+    num_images = sum(len(images) for images in pool.imap_unordered(rasterize_record, tasks))
+    pool.close()
+    pool.join()
+    end = time.time()
+    print("%d images of %d scenes rasterized in %f seconds (%.1f images/s)" %
+          (num_images, len(records), end - start, num_images / max(end - start, 1e-9)))
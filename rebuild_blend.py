@@ -0,0 +1,70 @@
+"""
+@file rebuild_blend.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick,
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Rebuild the .blend file of a rendered image from the scene records:
+$BLENDER_PATH blank.blend -b --python rebuild_blend.py -- --image 42 --config config.yml
+"""
+
+import sys, os, glob, argparse
+import bpy
+
+# Verify if repository path is set in bashrc
+if os.environ.get('PHYSIM_GENDATA') == None:
+    print("Please set PHYSIM_GENDATA in bashrc!")
+    sys.exit()
+
+g_repo_path = os.environ['PHYSIM_GENDATA']
+sys.path.append(g_repo_path)
+
+from Environment import Shelf, Table, Light
+from ConfigParser import ConfigParser, model_file
+from Camera import Camera
+from AssetCache import AssetCache, import_obj
+from SceneRecord import find_record, apply_record
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description='rebuild the .blend file of a rendered image')
+    parser.add_argument('--image', type=int, required=True, help='index of the image')
+    parser.add_argument('--config', default='config.yml', help='configuration file the images were generated with')
+    parser.add_argument('--records', default='rendered_images/debug/scenes_*.jsonl', help='scene record files')
+    parser.add_argument('--output', default=None, help='.blend file to write (default: rendered_images/debug/blend_<image>.blend)')
+    args = parser.parse_args(argv)
+
+    record, view = find_record(sorted(glob.glob(os.path.join(g_repo_path, args.records))), args.image)
+    if record is None:
+        print("no scene record for image %d" % args.image)
+        sys.exit(1)
+
+    ## same scene setup as simulate_and_render.py, without the physics
+    cfg = ConfigParser(args.config)
+    assets = None
+    if cfg.getAssetCacheFolder() is not None:
+        assets = AssetCache(os.path.join(g_repo_path, cfg.getAssetCacheFolder()))
+
+    if cfg.getSurfaceType() == 'table':
+        surface = Table(cfg.getSurfaceFile(), assets)
+    elif cfg.getSurfaceType() == 'shelf':
+        surface = Shelf(cfg.getSurfaceFile(), assets)
+
+    cam = Camera(record['camera_intrinsics'], [view['camera_pose']], 1)
+    pLight = Light()
+
+    objectlist = []
+    for objFileName in cfg.getObjModelList():
+        imported = import_obj(model_file(objFileName), assets)[0]
+        objectlist.append(imported.name)
+    for item in bpy.data.materials:
+        item.use_shadeless = True
+
+    apply_record(record, view, objectlist)
+
+    output = args.output
+    if output is None:
+        output = os.path.join(g_repo_path, "rendered_images/debug/blend_%05d.blend" % args.image)
+    bpy.ops.wm.save_as_mainfile(filepath=output)
+    print("scene of image %d saved to %s" % (args.image, output))
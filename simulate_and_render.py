@@ -6,7 +6,7 @@ All Rights Reserved. For a full description see the file named LICENSE.
 Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
 """
 
-import sys, os, tempfile, glob, shutil, time
+import sys, os, tempfile, glob, shutil, time, argparse, functools
 import bpy
 import math, random, numpy
 
@@ -19,20 +19,85 @@ g_repo_path = os.environ['PHYSIM_GENDATA']
 sys.path.append(g_repo_path)
 
 from Environment import Shelf, Table, Light
-from ConfigParser import ConfigParser
+from ConfigParser import ConfigParser, model_file
 from Camera import Camera
+from RenderPasses import ObjectIndexPass, ColorPass
+from ImageIO import AsyncWriter
+from AssetCache import AssetCache, import_obj
+from Simulation import Simulator, CollisionProxies
+from SceneRecord import SceneRecorder
+from PoseLibrary import PoseLibrary
+from Timing import StageTimer
+from Progress import append_progress, write_heartbeat, redraw_counts, RECYCLE_EXIT_CODE
+from ScenePlan import ScenePlan, images_per_scene
+
+# arguments after '--' on the blender command line select the image range of this worker
+def parse_worker_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description='simulate and render a range of images')
+    parser.add_argument('--config', default='config.yml', help='configuration file')
+    parser.add_argument('--start', type=int, default=0, help='index of the first image to render')
+    parser.add_argument('--count', type=int, default=None, help='number of images to render (default: num_images of the config)')
+    parser.add_argument('--seed', type=int, default=None, help='run seed of the scene plan when there is no --plan (default: random)')
+    parser.add_argument('--plan', default=None, help='scene plan file of the run, see ScenePlan')
+    parser.add_argument('--output', default='rendered_images', help='output folder')
+    parser.add_argument('--phase', choices=['full', 'simulate', 'render'], default='full',
+                        help='simulate and render, only simulate scenes into a pose library (start and count are scenes), or render scenes of a pose library')
+    parser.add_argument('--pose-library', default=None, help='pose library folder sampled in the render phase')
+    parser.add_argument('--max-scenes', type=int, default=0, help='exit for a restart after this many scenes (0: never)')
+    return parser.parse_args(argv)
+
+# tell the labeling workers that an image is finished
+def announce_image(output_folder, num):
+    with open(os.path.join(output_folder, "manifest.txt"), "a") as manifest:
+        manifest.write("%05i\n" % num)
+
+# run a callback once everything written so far is on disk
+def when_written(writer, callback):
+    if writer is None:
+        callback()
+    else:
+        writer.then(callback)
 
 if __name__ == "__main__":
 
     ## read configuration file
-    cfg = ConfigParser("config.yml")
+    args = parse_worker_args()
+    cfg = ConfigParser(args.config)
+    if args.count is None:
+        args.count = cfg.getNumTrainingImages()
+    output_folder = os.path.join(g_repo_path, args.output)
+
+    ## the random choices of every scene come from the scene plan, a scene
+    ## counts single scenes in the simulate phase
+    imagesPerScene = 1 if args.phase == 'simulate' else images_per_scene(cfg)
+    if args.plan is not None:
+        plan = ScenePlan.load(os.path.join(g_repo_path, args.plan))
+    else:
+        seed = args.seed if args.seed is not None else random.SystemRandom().randint(0, 2**31 - 1)
+        firstScene = args.start // imagesPerScene
+        plan = ScenePlan.build(cfg, seed, firstScene, (args.start + args.count - 1) // imagesPerScene - firstScene + 1)
+
+    ## the supervisor restarts a worker whose heartbeat stops, quarantined
+    ## scenes are drawn again with another seed
+    write_heartbeat(output_folder, {'scene': None})
+    redraws = redraw_counts(output_folder)
+
+    ## wall time of every stage, per scene
+    timer = StageTimer(os.path.join(output_folder, "debug/timings_%05i.jsonl" % args.start))
+    timer.begin('setup', worker=args.start)
+
+    ## preprocessed models are appended from the asset cache when it is enabled
+    assets = None
+    if cfg.getAssetCacheFolder() is not None:
+        assets = AssetCache(os.path.join(g_repo_path, cfg.getAssetCacheFolder()))
 
     ## initialize resting surface
     env = cfg.getSurfaceType()
     if env == 'table':
-        surface = Table('surface_models/table/table.obj')
+        surface = Table(cfg.getSurfaceFile(), assets)
     elif env == 'shelf':
-        surface = Shelf('surface_models/shelf/shelf.obj')
+        surface = Shelf(cfg.getSurfaceFile(), assets)
     sPose = cfg.getSurfacePose()
     surface.setPose(sPose)
 
@@ -40,7 +105,7 @@ if __name__ == "__main__":
     camIntrinsic = cfg.getCamIntrinsic()
     camExtrinsic = cfg.getCamExtrinsic()
     numViews = cfg.getNumViews()
-    cam = Camera(camIntrinsic, camExtrinsic, numViews)
+    cam = Camera(camIntrinsic, camExtrinsic, numViews, cfg.getBBoxConvexHull())
 
     ## initialize light
     pLight = Light()
@@ -48,10 +113,34 @@ if __name__ == "__main__":
     ## initialize objects
     objModelList = cfg.getObjModelList()
     objectlist = []
+    proxies = None
+    if cfg.getCollisionProxy():
+        proxies = CollisionProxies(cfg.getCollisionProxyMaxVertices(), assets)
     for objFileName in objModelList:
-        bpy.ops.import_scene.obj(filepath="obj_models/" + objFileName + "/" + objFileName + ".obj")
-        imported = bpy.context.selected_objects[0]
+        obj_filepath = model_file(objFileName)
+        with timer.stage('import'):
+            imported = import_obj(obj_filepath, assets)[0]
         objectlist.append(imported.name)
+        with timer.stage('hull_cache'):
+            cam.cacheModel(imported)
+        if proxies is not None:
+            with timer.stage('collision_proxies'):
+                proxies.add(imported, obj_filepath)
+
+    ## renders are read back from memory and written by a thread pool, if enabled
+    writer = None
+    if cfg.getAsyncImageWriting():
+        writer = AsyncWriter(cfg.getImageWriterThreads(), cfg.getPngCompression())
+
+    ## single pass object index rendering, pass index is the class id
+    indexPass = None
+    if cfg.getObjectIndexPass():
+        indexPass = ObjectIndexPass(writer is not None)
+        for index in range(0, len(objectlist)):
+            indexPass.setIndex(objectlist[index], index + 1)
+    colorPass = None
+    if writer is not None:
+        colorPass = indexPass if indexPass is not None else ColorPass()
     
     ## effect of illumination is currently disabled.
     for item in bpy.data.materials:
@@ -59,9 +148,51 @@ if __name__ == "__main__":
         # item.emit = 0.05
         item.use_shadeless = True
 
-    num = 0
-    numImages = cfg.getNumTrainingImages()
+    ## physics, optionally stopping early once all objects are at rest
+    simulator = Simulator(cfg.getNumSimulationSteps(), cfg.getAdaptiveSimulation(),
+                          cfg.getRestLinearThreshold(), cfg.getRestAngularThreshold(), cfg.getRestFrames())
+    steps_log = os.path.join(output_folder, "debug/simulation_steps_%05i.txt" % args.start)
+    if args.phase != 'render':
+        with timer.stage('rigid_body_setup'):
+            for name in objectlist:
+                simulator.addRigidBody(name)
+
+    ## compact record of every scene, .blend snapshots only as configured
+    recorder = SceneRecorder(os.path.join(output_folder, "debug/scenes_%05i.jsonl" % args.start), camIntrinsic)
+    blendSnapshots = cfg.getBlendSnapshots()
+    blendSnapshotInterval = cfg.getBlendSnapshotInterval()
+    numScenes = 0
+    rendersPerSimulation = cfg.getRendersPerSimulation()
+
+    ## pose library: filled in the simulate phase, sampled in the render phase
+    poseLibrary = None
+    if args.phase == 'simulate':
+        poseLibrary = PoseLibrary(env, sPose, objModelList)
+    elif args.phase == 'render':
+        try:
+            poseLibrary = PoseLibrary.load(os.path.join(g_repo_path, args.pose_library))
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        if not poseLibrary.matches(env, sPose, objModelList):
+            print("pose library %s was simulated for another surface or model set!" % args.pose_library)
+            sys.exit(1)
+    timer.set(models=len(objectlist))
+    timer.end()
+
+    num = args.start
+    numImages = args.start + args.count
     while num < numImages:
+        timer.begin('scene', scene=num)
+        scenePlan = plan.scene(num // imagesPerScene)
+        if num in redraws:
+            scenePlan = plan.redrawn(cfg, num // imagesPerScene, redraws[num])
+        write_heartbeat(output_folder, {'scene': num, 'images': list(range(num, min(num + imagesPerScene, numImages))),
+                                        'seed': scenePlan['seed'], 'redraw': redraws.get(num, 0),
+                                        'plan': ScenePlan.to_json(scenePlan)})
+        if args.phase != 'render':
+            with timer.stage('free_cache'):
+                simulator.freeCache()
 
         ## hide all objects
         for obj in objectlist:
@@ -69,60 +200,64 @@ if __name__ == "__main__":
             bpy.data.objects[obj].hide_render = True
             bpy.data.objects[obj].location[0] = 100.0
 
-        ## choose a random subset of objects for the scene
-        sceneobjectlist = list(objectlist)
-        minObjects = cfg.getMinObjectsScene()
-        maxObjects = cfg.getMaxObjectsScene()
-        numObjectsInScene = random.randint(minObjects, maxObjects)
-        selectedobj = list()
-        while len(selectedobj) < numObjectsInScene:
-            index = random.randint(0, len(objectlist)-1)
-            if index in selectedobj:
-                continue
-            selectedobj.append(index)
-
-        print ("numObjectsInScene : ", numObjectsInScene)
-        print ("selected set is : ", selectedobj)
+        if args.phase == 'render':
+            ## settled poses of a scene from the pose library, no physics
+            sceneobjectlist = list(objectlist)
+            with timer.stage('sampling'):
+                selectedobj, positions, quaternions = poseLibrary.sampleScene(scenePlan['library_draws'], objModelList)
+                numObjectsInScene = len(selectedobj)
+                for i in range(0, numObjectsInScene):
+                    shape_file = objectlist[selectedobj[i]]
+                    bpy.data.objects[shape_file].hide = False
+                    bpy.data.objects[shape_file].hide_render = False
+                    bpy.data.objects[shape_file].location = positions[i]
+                    bpy.data.objects[shape_file].rotation_mode = 'QUATERNION'
+                    bpy.data.objects[shape_file].rotation_quaternion = quaternions[i]
+                bpy.context.scene.update()
+            simulated = [objectlist[index] for index in selectedobj]
+        else:
+            ## the planned subset of objects for the scene
+            sceneobjectlist = list(objectlist)
+            selectedobj = scenePlan['object_ids']
+            numObjectsInScene = len(selectedobj)
+
+            print ("numObjectsInScene : ", numObjectsInScene)
+            print ("selected set is : ", selectedobj)
         
-        ## sample initial pose for each of the selected object
-        for i in range(0, numObjectsInScene):
-            index = selectedobj[i]
-            shape_file = objectlist[index]
-            sceneobjectlist[index] = shape_file
-            bpy.data.objects[shape_file].hide = False
-            bpy.data.objects[shape_file].hide_render = False
-            range_x = cfg.getRangeX()
-            range_y = cfg.getRangeY()
-            range_z = cfg.getRangeZ()
-            bpy.data.objects[shape_file].location = (random.uniform(range_x[0], range_x[1]),
-                                                        random.uniform(range_y[0], range_y[1]),
-                                                        random.uniform(range_z[0], range_z[1]))
-
-            bpy.data.objects[shape_file].rotation_mode = 'XYZ'
-            bpy.data.objects[shape_file].rotation_euler = (random.randint(0, 360)*3.14/180.0, 
-                                                           random.randint(0, 360)*3.14/180.0, 
-                                                           random.randint(0, 360)*3.14/180.0)
-
-            bpy.context.scene.objects.active = bpy.context.scene.objects[shape_file]
-            bpy.ops.rigidbody.object_add(type='ACTIVE')
-            bpy.ops.object.modifier_add(type = 'COLLISION')
-            bpy.context.scene.objects[shape_file].rigid_body.mass = 10.0
-            bpy.context.scene.objects[shape_file].rigid_body.use_margin = True
-            bpy.context.scene.objects[shape_file].rigid_body.collision_margin = 0
-            bpy.context.scene.objects[shape_file].rigid_body.linear_damping = 0.9
-            bpy.context.scene.objects[shape_file].rigid_body.angular_damping = 0.9
-
-
-        ## performing simulation
-        framesIter = cfg.getNumSimulationSteps()
-        for i in range(1,framesIter):
-            bpy.context.scene.frame_set(i)
-
-        ## pick lighting
-        light_range_x = cfg.getLightRangeX()
-        light_range_y = cfg.getLightRangeY()
-        light_range_z = cfg.getLightRangeZ()
-        pLight.placePointLight(light_range_x, light_range_y, light_range_z)
+            ## planned initial pose of each selected object
+            for i in range(0, numObjectsInScene):
+                index = selectedobj[i]
+                shape_file = objectlist[index]
+                sceneobjectlist[index] = shape_file
+                bpy.data.objects[shape_file].hide = False
+                bpy.data.objects[shape_file].hide_render = False
+                bpy.data.objects[shape_file].location = [float(value) for value in scenePlan['locations'][i]]
+
+                bpy.data.objects[shape_file].rotation_mode = 'XYZ'
+                bpy.data.objects[shape_file].rotation_euler = [float(value) for value in scenePlan['rotations'][i]]
+
+            ## performing simulation
+            simulated = [objectlist[index] for index in selectedobj]
+            with timer.stage('rigid_body_setup'):
+                simulator.enable(simulated)
+            with timer.stage('simulation'):
+                if proxies is not None:
+                    proxies.useProxies(simulated)
+                steps = simulator.run(simulated)
+                if proxies is not None:
+                    proxies.useRenderMeshes(simulated)
+            timer.set(steps=steps)
+            print ("simulation steps used : ", steps)
+            with open(steps_log, "a") as file:
+                file.write("%05i,%i\n" % (num, steps))
+
+        if args.phase == 'simulate':
+            locations, rotations = simulator.getPoses(simulated)
+            poseLibrary.addScene(selectedobj, locations, rotations)
+            timer.set(objects=numObjectsInScene, images=0)
+            timer.end()
+            num = num + 1
+            continue
 
         ## rendering configuration
         for area in bpy.context.screen.areas:
@@ -135,50 +270,118 @@ if __name__ == "__main__":
         bpy.context.scene.render.use_raytrace = False
         bpy.context.scene.render.use_shadows = False
 
-        for i in range(0,cam.numViews):
-            cam.placeCamera(i)
-            output_img = "rendered_images/image_%05i.png" % num
-            bpy.context.scene.render.filepath = os.path.join(g_repo_path, output_img) 
-            bpy.ops.render.render(write_still=True)
+        ## 2-D bounding boxes of the settled objects in all views
+        sceneobjects = [bpy.data.objects[sceneobjectlist[index]] for index in selectedobj]
+        with timer.stage('bbox_projection'):
+            bounds = cam.bounds_2d_all_views(sceneobjects)
+
+        pLight.setEnvironmentEnergy(scenePlan['environment_energy'])
+        record = recorder.capture(num, simulated, selectedobj, surface.objectNames, scenePlan['seed'])
+        sceneFailed = False
+        firstImage = num
+        outputs = []
+
+        for variation in range(0, rendersPerSimulation):
+            ## planned lighting, once per rendered variation of the settled scene
+            pLight.placePointLight(scenePlan['light_locations'][variation], scenePlan['light_energy'][variation],
+                                   scenePlan['light_colors'][variation])
+
+            for i in range(0,cam.numViews):
+                cam.placeCamera(i)
+                recorder.addImage(record, num, camExtrinsic[i])
+                output_img = "image_%05i.png" % num
+                bpy.context.scene.render.filepath = os.path.join(output_folder, output_img)
+                with timer.stage('render'):
+                    bpy.ops.render.render(write_still=writer is None)
+                if writer is not None:
+                    with timer.stage('readback'):
+                        color, index_map = colorPass.readColor()
+                        writer.write(os.path.join(output_folder, output_img), color)
+                outputs.append(output_img)
 
-            if cfg.getLabelType() == 'pixel':
-                for j in range(0, numObjectsInScene):
-                    # make all items invisible
+                if indexPass is not None:
+                    output_idx = "debug/index_%05i.png" % num
+                    with timer.stage('index_pass'):
+                        if writer is None:
+                            indexPass.write(os.path.join(output_folder, output_idx))
+                        else:
+                            writer.write(os.path.join(output_folder, output_idx), index_map)
+                    outputs.append(output_idx)
+                elif cfg.getLabelType() == 'pixel':
+                    for j in range(0, numObjectsInScene):
+                        # make all items invisible
+                        for item in bpy.data.materials:
+                            item.use_transparency = True
+                            item.transparency_method = 'MASK'
+                            item.alpha = 0
+
+                        index = selectedobj[j]
+                        shape_file = objectlist[index]
+                        bpy.data.objects[shape_file].material_slots[0].material.use_transparency = False
+                        output_img = "debug/image_%05i_%02i.png" % (num,j)
+                        bpy.context.scene.render.filepath = os.path.join(output_folder, output_img)
+                        with timer.stage('mask_renders'):
+                            bpy.ops.render.render(write_still=writer is None)
+                            if writer is not None:
+                                writer.write(os.path.join(output_folder, output_img), colorPass.readColor()[0])
+
+                    # restore the transparency
                     for item in bpy.data.materials:
-                        item.use_transparency = True
-                        item.transparency_method = 'MASK'
-                        item.alpha = 0
-
-                    index = selectedobj[j]
-                    shape_file = objectlist[index]
-                    bpy.data.objects[shape_file].material_slots[0].material.use_transparency = False
-                    output_img = "rendered_images/debug/image_%05i_%02i.png" % (num,j)
-                    bpy.context.scene.render.filepath = os.path.join(g_repo_path, output_img) 
-                    bpy.ops.render.render(write_still=True)
-
-                # restore the transparency
-                for item in bpy.data.materials:
-                    item.use_transparency = False
-
-            #2-D bounding boxes
-            output_bbox = "rendered_images/debug/raw_bbox_%05i.txt" % num
-            for i in range(0, numObjectsInScene):
-                index = selectedobj[i]
-                shape_file = sceneobjectlist[index]
-                print (index, shape_file)
-                x, y, width, height = cam.write_bounds_2d(output_bbox, bpy.data.objects[shape_file], index)
+                        item.use_transparency = False
 
-            # save to temp.blend
-            mainfile_path = os.path.join("rendered_images/debug/", "blend_%05d.blend" % num)
-            bpy.ops.file.autopack_toggle()
-            bpy.ops.wm.save_as_mainfile(filepath=mainfile_path)
+                #2-D bounding boxes
+                output_bbox = os.path.join(output_folder, "debug/raw_bbox_%05i.txt" % num)
+                with timer.stage('bbox_write'):
+                    for k in range(0, numObjectsInScene):
+                        index = selectedobj[k]
+                        shape_file = sceneobjectlist[index]
+                        print (index, shape_file)
+                        x, y, width, height = cam.write_bounds_2d(output_bbox, bpy.data.objects[shape_file], index, bounds[i][k])
+                        if width < 0:
+                            sceneFailed = True
+                if os.path.exists(output_bbox):
+                    outputs.append(os.path.relpath(output_bbox, output_folder))
 
-            num = num + 1
+                # announce the finished image to the labeling workers, they run
+                # in the generate_pictures.py process and read the written files
+                when_written(writer, functools.partial(announce_image, output_folder, num))
+
+                num = num + 1
+                if num >= numImages:
+                    break
             if num >= numImages:
                 break
-            
-        
 
-    
+        with timer.stage('scene_record'):
+            recorder.write(record)
+
+        # .blend snapshot of the scene: never, every Nth scene, or when an object left the view
+        if (blendSnapshots == 'every_n' and numScenes % blendSnapshotInterval == 0) or \
+           (blendSnapshots == 'failure' and sceneFailed):
+            mainfile_path = os.path.join(output_folder, "debug/blend_%05d.blend" % record['scene'])
+            with timer.stage('blend_save'):
+                bpy.ops.wm.save_as_mainfile(filepath=mainfile_path, copy=True)
+            outputs.append(os.path.relpath(mainfile_path, output_folder))
+        numScenes = numScenes + 1
+
+        ## once all outputs of the scene are on disk, a resumed run continues after it
+        when_written(writer, functools.partial(append_progress, output_folder,
+                                               {'scene': firstImage, 'images': list(range(firstImage, num)),
+                                                'seed': scenePlan['seed'], 'outputs': outputs}))
+        timer.set(objects=numObjectsInScene, images=num - firstImage)
+        timer.end()
+
+        ## hand over to a fresh blender process, the scheduler resumes after this scene
+        if args.max_scenes > 0 and numScenes >= args.max_scenes and num < numImages:
+            print("%d scenes rendered, restarting the worker at image %d" % (numScenes, num))
+            if writer is not None:
+                writer.close()
+            sys.exit(RECYCLE_EXIT_CODE)
+
+    if writer is not None:
+        with timer.stage('image_write'):
+            writer.close()
 
-        
\ No newline at end of file
+    if args.phase == 'simulate':
+        poseLibrary.save(os.path.join(output_folder, 'pose_library'))
+        print("%d settled scenes written to the pose library" % poseLibrary.numScenes())
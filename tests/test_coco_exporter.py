@@ -0,0 +1,61 @@
+"""
+@file test_coco_exporter.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Checks of the compressed RLE masks against strings pycocotools 2.0 writes for
+the same masks, without needing pycocotools.
+python -m pytest tests
+"""
+
+import sys
+import os.path as osp
+import numpy as np
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.insert(0, g_repo_path)
+import CocoExporter
+
+def box_mask(height, width, y1, y2, x1, x2):
+    mask = np.zeros((height, width), np.uint8)
+    mask[y1:y2, x1:x2] = 1
+    return mask
+
+def sparse_mask():
+    mask = np.zeros((40, 30), np.uint8)
+    mask[5:35, 2] = 1
+    mask[10:12, 20:29] = 1
+    return mask
+
+# (mask, counts of pycocotools.mask.encode)
+REFERENCES = [
+    (np.zeros((2, 2), np.uint8), '4'),
+    (np.ones((3, 4), np.uint8), '0<'),
+    (np.array([[0, 1, 1], [0, 1, 0]], np.uint8), '231'),
+    (np.eye(5, dtype=np.uint8), '0150000000'),
+    (sparse_mask(), 'e2n0ge0TO_[O000000000000000n0'),
+    (box_mask(480, 640, 100, 300, 200, 400), 'Tkm2X6h8' + '0' * 397 + 'l\\`3'),
+]
+
+def test_rle_matches_pycocotools():
+    for mask, counts in REFERENCES:
+        rle = CocoExporter.rle_encode(mask)
+        assert rle['counts'] == counts, (mask.shape, rle['counts'])
+        assert rle['size'] == list(mask.shape)
+
+def test_rle_round_trip():
+    rng = np.random.RandomState(0)
+    masks = [mask for mask, counts in REFERENCES] + [np.zeros((0, 5), np.uint8)]
+    for k in range(0, 200):
+        height, width = rng.randint(1, 40, 2)
+        masks.append((rng.rand(height, width) < rng.rand()).astype(np.uint8))
+    for mask in masks:
+        decoded = CocoExporter.rle_decode(CocoExporter.rle_encode(mask))
+        assert decoded.shape == mask.shape and np.array_equal(decoded, mask.astype(bool))
+
+if __name__ == "__main__":
+    test_rle_matches_pycocotools()
+    test_rle_round_trip()
+    print("ok")
@@ -0,0 +1,114 @@
+"""
+@file test_config_parser.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Checks that broken config files are rejected at load with a ConfigError
+naming the value, starting from the example configs.
+python -m pytest tests
+"""
+
+import sys, copy, shutil, tempfile
+import os.path as osp
+import yaml
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.insert(0, g_repo_path)
+from ConfigParser import ConfigParser, ConfigError
+
+def load_data(name):
+    with open(osp.join(g_repo_path, name), 'r') as file:
+        return yaml.safe_load(file)
+
+def set_value(section, key, value):
+    def modify(data):
+        data[section][key] = value
+    return modify
+
+def set_intrinsic(row, column, value):
+    def modify(data):
+        data['camera']['camera_intrinsics'][row][column] = value
+    return modify
+
+def remove_value(section, key):
+    def modify(data):
+        del data[section][key]
+    return modify
+
+# (change to config.yml.table, text expected in the error)
+REJECTED = [
+    (remove_value('camera', 'camera_intrinsics'), 'camera.camera_intrinsics is missing'),
+    (set_value('camera', 'camera_intrinsics', [[1, 2], [3, 4]]), 'camera.camera_intrinsics must have shape'),
+    (set_intrinsic(0, 0, 0.0), 'focal lengths'),
+    (set_intrinsic(0, 2, 0.0), 'principal point'),
+    (set_intrinsic(1, 2, -240.0), 'principal point'),
+    (set_value('camera', 'num_poses', 99), 'camera.num_poses is 99'),
+    (set_value('rest_surface', 'type', 'floor'), 'rest_surface.type must be one of'),
+    (set_value('params', 'num_images', 'many'), 'params.num_images must be an integer'),
+    (set_value('params', 'num_images', True), 'params.num_images must be an integer'),
+    (set_value('params', 'label_type', 'polygon'), 'params.label_type must be one of'),
+    (set_value('params', 'range_x', [1.0, 0.0]), 'params.range_x: min'),
+    (set_value('params', 'minimum_objects_in_scene', 5), 'params.minimum_objects_in_scene is larger'),
+    (set_value('params', 'maximum_objects_in_scene', 40), 'params.maximum_objects_in_scene is 40'),
+    (set_value('params', 'renders_per_simulation', 0), 'params.renders_per_simulation must be at least 1'),
+    (set_value('params', 'blend_snapshot_interval', 0), 'params.blend_snapshot_interval must be at least 1'),
+    (set_value('params', 'image_writer_threads', 0), 'params.image_writer_threads must be at least 1'),
+    (set_value('params', 'debug_image_interval', -1), 'params.debug_image_interval must be at least 0'),
+    (set_value('params', 'png_compression', 42), 'params.png_compression must be between 0 and 9'),
+    (set_value('params', 'png_compression', -1), 'params.png_compression must be at least 0'),
+    (set_value('params', 'blend_snapshots', 'always'), 'params.blend_snapshots must be one of'),
+    (set_value('params', 'object_index_pass', 'yes'), 'params.object_index_pass must be true or false'),
+    (set_value('params', 'min_visible_area', -5), 'params.min_visible_area must be a non-negative number'),
+]
+
+# the ConfigError message for the changed config, None when it loads
+def load_error(modify):
+    data = copy.deepcopy(load_data('config.yml.table'))
+    modify(data)
+    folder = tempfile.mkdtemp(prefix='physim_test_')
+    try:
+        filepath = osp.join(folder, 'config.yml')
+        with open(filepath, 'w') as file:
+            yaml.safe_dump(data, file)
+        ConfigParser(filepath)
+        return None
+    except ConfigError as e:
+        return str(e)
+    finally:
+        shutil.rmtree(folder)
+
+def test_examples_load():
+    for name in ['config.yml.table', 'config.yml.shelf']:
+        cfg = ConfigParser(osp.join(g_repo_path, name))
+        width, height = cfg.getImageSize()
+        assert isinstance(width, int) and isinstance(height, int) and width > 0 and height > 0
+    assert load_error(lambda data: None) is None
+
+def test_rejected():
+    for modify, expected in REJECTED:
+        error = load_error(modify)
+        assert error is not None and expected in error, (expected, error)
+
+def test_missing_file():
+    try:
+        ConfigParser(osp.join(g_repo_path, 'no_such_config.yml'))
+    except ConfigError:
+        return
+    assert False
+
+def test_values_read_only():
+    cfg = ConfigParser(osp.join(g_repo_path, 'config.yml.table'))
+    try:
+        cfg.getCamIntrinsic()[0][0] = 1.0
+    except ValueError:
+        return
+    assert False
+
+if __name__ == "__main__":
+    test_examples_load()
+    test_rejected()
+    test_missing_file()
+    test_values_read_only()
+    print("ok")
@@ -0,0 +1,79 @@
+"""
+@file test_dataset_pack.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Checks of the pack index: samples written over several pack files are found
+by id and read back byte for byte.
+python -m pytest tests
+"""
+
+import sys, shutil, tempfile
+import os.path as osp
+import numpy as np
+import cv2
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.insert(0, g_repo_path)
+import DatasetPack
+
+SAMPLE_IDS = [0, 1, 2, 5, 9, 10, 42]
+
+def sample(sample_id):
+    image = np.full((8, 6, 3), sample_id, np.uint8)
+    mask = np.full((8, 6), sample_id % 3, np.uint8) if sample_id % 2 == 0 else None
+    boxes = [[k, k, k + 2, k + 3] for k in range(0, sample_id % 4)]
+    class_ids = [sample_id % 5 + 1] * len(boxes)
+    return cv2.imencode('.png', image)[1].tobytes(), \
+           cv2.imencode('.png', mask)[1].tobytes() if mask is not None else None, boxes, class_ids
+
+def write_packs(folder):
+    # a few samples per pack file
+    writer = DatasetPack.PackWriter(folder, pack_bytes=4096)
+    for sample_id in SAMPLE_IDS:
+        writer.add(sample_id, *sample(sample_id))
+    writer.close()
+    return writer.pack + 1
+
+def test_find_and_read():
+    folder = tempfile.mkdtemp(prefix='physim_test_')
+    try:
+        num_packs = write_packs(folder)
+        assert num_packs > 1
+        reader = DatasetPack.PackReader(folder)
+        assert len(reader) == len(SAMPLE_IDS)
+        for sample_id in SAMPLE_IDS:
+            image_bytes, mask_bytes, boxes, class_ids = sample(sample_id)
+            position = reader.find(sample_id)
+            assert reader.imageBytes(position) == image_bytes
+            assert reader.maskBytes(position) == mask_bytes
+            read_boxes, read_class_ids = reader.labels(position)
+            assert np.array_equal(read_boxes, np.array(boxes, np.int32).reshape(-1, 4))
+            assert np.array_equal(read_class_ids, np.array(class_ids, np.int32))
+            decoded = reader[position]
+            assert decoded['sample_id'] == sample_id and np.all(decoded['image'] == sample_id)
+            assert (decoded['mask'] is None) == (mask_bytes is None)
+        reader.close()
+    finally:
+        shutil.rmtree(folder)
+
+def test_missing_ids():
+    folder = tempfile.mkdtemp(prefix='physim_test_')
+    try:
+        write_packs(folder)
+        reader = DatasetPack.PackReader(folder)
+        for sample_id in [-1, 3, 11, 43]:
+            try:
+                reader.find(sample_id)
+            except KeyError:
+                continue
+            assert False, sample_id
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == "__main__":
+    test_find_and_read()
+    test_missing_ids()
+    print("ok")
@@ -0,0 +1,143 @@
+"""
+@file test_progress.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Checks of the resume bookkeeping of a shard folder without Blender: a worker
+is simulated by writing the files and lines simulate_and_render.py writes.
+python -m pytest tests
+"""
+
+import os, sys, json, shutil, tempfile
+import os.path as osp
+import numpy as np
+import cv2
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.insert(0, g_repo_path)
+import Progress
+import Timing
+
+def new_shard_folder():
+    folder = tempfile.mkdtemp(prefix='physim_test_')
+    os.makedirs(osp.join(folder, 'debug'))
+    return folder
+
+def write_png(filepath):
+    cv2.imwrite(filepath, np.zeros((4, 4), np.uint8))
+
+def write_lines(filepath, entries):
+    with open(filepath, 'a') as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + '\n')
+
+# a worker started at image start renders the scenes of images_per_scene
+# images; the last one is timed but crashes before its progress line
+def run_worker(folder, start, scenes, images_per_scene, crash=False):
+    timings = osp.join(folder, 'debug', 'timings_%05d.jsonl' % start)
+    write_lines(timings, [{'kind': 'setup', 'worker': start, 'stages': {}, 'total': 1.0}])
+    for s, scene in enumerate(scenes):
+        images = list(range(scene, scene + images_per_scene))
+        outputs = ['image_%05d.png' % i for i in images]
+        for output in outputs:
+            write_png(osp.join(folder, output))
+        write_lines(timings, [{'kind': 'scene', 'scene': scene, 'images': len(images), 'stages': {'render': 0.5}, 'total': 0.5}])
+        if crash and s == len(scenes) - 1:
+            return
+        Progress.append_progress(folder, {'scene': scene, 'images': images, 'seed': 0, 'outputs': outputs})
+
+def test_is_complete_file():
+    folder = new_shard_folder()
+    try:
+        filepath = osp.join(folder, 'image_00000.png')
+        assert not Progress.is_complete_file(filepath)
+        write_png(filepath)
+        assert Progress.is_complete_file(filepath)
+        # a png cut off before its IEND chunk
+        with open(filepath, 'rb') as file:
+            data = file.read()
+        with open(filepath, 'wb') as file:
+            file.write(data[:-6])
+        assert not Progress.is_complete_file(filepath)
+        open(filepath, 'wb').close()
+        assert not Progress.is_complete_file(filepath)
+        with open(osp.join(folder, 'debug', 'raw_bbox_00000.txt'), 'w') as file:
+            file.write('0,1,2,3,4,0.5\n')
+        assert Progress.is_complete_file(osp.join(folder, 'debug', 'raw_bbox_00000.txt'))
+    finally:
+        shutil.rmtree(folder)
+
+def test_first_missing_image():
+    folder = new_shard_folder()
+    try:
+        assert Progress.first_missing_image(folder, 10, 20) == 10
+        run_worker(folder, 10, [10, 12, 14, 16], 2)
+        assert Progress.first_missing_image(folder, 10, 18) == 18
+        assert Progress.first_missing_image(folder, 10, 20) == 18
+        # a scene whose output was cut off is not finished, nor is anything after it
+        with open(osp.join(folder, 'image_00013.png'), 'r+b') as file:
+            file.truncate(20)
+        assert Progress.first_missing_image(folder, 10, 20) == 12
+        # a truncated last progress line is ignored
+        with open(osp.join(folder, Progress.PROGRESS_FILENAME), 'a') as file:
+            file.write('{"scene": 18, "ima')
+        assert Progress.first_missing_image(folder, 10, 20) == 12
+    finally:
+        shutil.rmtree(folder)
+
+def test_remove_partial_outputs():
+    folder = new_shard_folder()
+    try:
+        run_worker(folder, 0, [0, 2, 4], 2)
+        for i in range(0, 6):
+            with open(osp.join(folder, 'debug', 'raw_bbox_%05d.txt' % i), 'w') as file:
+                file.write('0,1,2,3,4,0.5\n')
+        write_lines(osp.join(folder, 'debug', 'scenes_00000.jsonl'), [{'scene': scene} for scene in [0, 2, 4]])
+        write_lines(osp.join(folder, Progress.COCO_FRAGMENT_FILENAME), [{'image': i} for i in range(0, 6)])
+        with open(osp.join(folder, 'manifest.txt'), 'w') as file:
+            file.write(''.join('%05i\n' % i for i in range(0, 6)))
+        with open(osp.join(folder, 'notes.txt'), 'w') as file:
+            file.write('kept\n')
+
+        Progress.remove_partial_outputs(folder, 2)
+        assert sorted(os.listdir(folder)) == sorted(['debug', 'image_00000.png', 'image_00001.png', 'manifest.txt', 'notes.txt',
+                                                     Progress.PROGRESS_FILENAME, Progress.COCO_FRAGMENT_FILENAME])
+        assert sorted(os.listdir(osp.join(folder, 'debug'))) == \
+            ['raw_bbox_00000.txt', 'raw_bbox_00001.txt', 'scenes_00000.jsonl', 'timings_00000.jsonl']
+        assert [entry['scene'] for entry in Progress.load_progress(folder)] == [0]
+        with open(osp.join(folder, 'debug', 'scenes_00000.jsonl'), 'r') as file:
+            assert [json.loads(line)['scene'] for line in file] == [0]
+        with open(osp.join(folder, Progress.COCO_FRAGMENT_FILENAME), 'r') as file:
+            assert [json.loads(line)['image'] for line in file] == [0, 1]
+        with open(osp.join(folder, 'manifest.txt'), 'r') as file:
+            assert file.read() == '00000\n00001\n'
+        assert Progress.first_missing_image(folder, 0, 6) == 2
+    finally:
+        shutil.rmtree(folder)
+
+def test_retried_shard_counts_scenes_once():
+    folder = new_shard_folder()
+    try:
+        run_worker(folder, 0, [0, 2, 4], 2, crash=True)
+        first_image = Progress.first_missing_image(folder, 0, 8)
+        assert first_image == 4
+        Progress.remove_partial_outputs(folder, first_image)
+        run_worker(folder, first_image, [4, 6], 2)
+
+        records = Timing.load_timings(Timing.timing_files(folder))
+        report = Timing.summarize(records, [], 8, 1.0)
+        assert report['scenes'] == 4
+        assert sorted(record['scene'] for record in records if record['kind'] == 'scene') == [0, 2, 4, 6]
+        # the setup of both workers stays
+        assert report['setup']['count'] == 2
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == "__main__":
+    test_is_complete_file()
+    test_first_missing_image()
+    test_remove_partial_outputs()
+    test_retried_shard_counts_scenes_once()
+    print("ok")
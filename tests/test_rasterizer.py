@@ -0,0 +1,89 @@
+"""
+@file test_rasterizer.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Checks of the NumPy rasterizer without Blender: the boxes of rasterized
+models must match the projected vertex bounds Camera writes for the same
+matrix_world.
+python -m pytest tests
+"""
+
+import os, sys
+import os.path as osp
+import numpy as np
+import yaml
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.insert(0, g_repo_path)
+import Label
+import Projection
+from Rasterizer import SceneRasterizer
+
+# the vertices as the blender importer keeps them, read independently of Rasterizer
+def load_obj_vertices(filepath):
+    vertices = []
+    with open(filepath, 'r') as file:
+        for line in file:
+            if line.startswith('v '):
+                vertices.append([float(value) for value in line.split()[1:4]])
+    return np.array(vertices)
+
+def load_config(name):
+    with open(osp.join(g_repo_path, name), 'r') as file:
+        return yaml.safe_load(file)
+
+# a recorded scene: every model alone at the center of the drop range, turned
+# about z, seen from every camera pose of the config
+def record_of_scene(cfg, class_id, angle):
+    params = cfg['params']
+    center = [np.mean(params['range_x']), np.mean(params['range_y']), np.mean(params['range_z'])]
+    pose = center + [np.cos(angle / 2), 0.0, 0.0, np.sin(angle / 2)]
+    return {'objects': [{'name': cfg['Models'][class_id], 'class_id': class_id,
+                         'matrix_world': Projection.pose_to_matrix(pose).tolist()}],
+            'surface': [], 'camera_intrinsics': cfg['camera']['camera_intrinsics'],
+            'images': [{'image': view, 'camera_pose': cfg['camera']['camera_poses'][view]}
+                       for view in range(cfg['camera']['num_poses'])]}
+
+def check_boxes(config_name):
+    cwd = os.getcwd()
+    os.chdir(g_repo_path)
+    try:
+        cfg = load_config(config_name)
+        surface_file = 'surface_models/%s/%s.obj' % (cfg['rest_surface']['type'], cfg['rest_surface']['type'])
+        rasterizer = SceneRasterizer(cfg['Models'], 'obj_models', surface_file, cfg['camera']['camera_intrinsics'])
+        P = Projection.projection_matrices(cfg['camera']['camera_intrinsics'], cfg['camera']['camera_poses'])
+        pLabel = Label.Label()
+        checked = 0
+        for class_id, name in enumerate(cfg['Models']):
+            record = record_of_scene(cfg, class_id, 0.3 * class_id)
+            vertices = load_obj_vertices('obj_models/%s/%s.obj' % (name, name))
+            bounds = Projection.bounds_2d(P, [vertices], [record['objects'][0]['matrix_world']])
+            for view in record['images']:
+                index_map, depth_map = rasterizer.renderRecord(record, view)
+                x, y, w, h = bounds[view['image'], 0]
+                if x < 0 or y < 0 or x + w > rasterizer.rasterizer.width or y + h > rasterizer.rasterizer.height:
+                    continue
+                counts, boxes = pLabel.visible_boxes(np.minimum(index_map, 255).astype(np.uint8))
+                assert class_id + 1 < len(counts) and counts[class_id + 1] > 0, (name, view['image'])
+                # pixels are sampled at their centers, thin tips can miss one
+                assert np.all(np.abs(boxes[class_id + 1] - [x, y, x + w, y + h]) <= 2.5), \
+                    (name, view['image'], boxes[class_id + 1], (x, y, x + w, y + h))
+                assert np.all(depth_map[index_map == class_id + 1] > 0)
+                checked = checked + 1
+        assert checked > 0
+    finally:
+        os.chdir(cwd)
+
+def test_boxes_table():
+    check_boxes('config.yml.table')
+
+def test_boxes_shelf():
+    check_boxes('config.yml.shelf')
+
+if __name__ == "__main__":
+    test_boxes_table()
+    test_boxes_shelf()
+    print("ok")
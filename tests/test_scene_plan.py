@@ -0,0 +1,83 @@
+"""
+@file test_scene_plan.py
+@copyright Software License Agreement (BSD License).
+Copyright (c) 2017, Rutgers the State University of New Jersey, New Brunswick.
+All Rights Reserved. For a full description see the file named LICENSE.
+Authors: Chaitanya Mitash, Kostas Bekris, Abdeslam Boularias.
+
+Checks of the scene plan: a scene depends on nothing but the run seed and its
+index, whichever range of scenes it is planned in.
+python -m pytest tests
+"""
+
+import os, sys, shutil, tempfile
+import os.path as osp
+import numpy as np
+
+g_repo_path = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path.insert(0, g_repo_path)
+from ConfigParser import ConfigParser
+from ScenePlan import ScenePlan
+
+def load_config(name):
+    return ConfigParser(osp.join(g_repo_path, name))
+
+def same_rows(row, other):
+    assert sorted(row) == sorted(other)
+    for name in row:
+        assert np.array_equal(np.asarray(row[name]), np.asarray(other[name])), name
+
+def test_same_seed_same_plan():
+    cfg = load_config('config.yml.table')
+    plan, other = ScenePlan.build(cfg, 42, 0, 20), ScenePlan.build(cfg, 42, 0, 20)
+    for scene in range(0, 20):
+        same_rows(plan.scene(scene), other.scene(scene))
+    assert not np.array_equal(plan.arrays['seeds'], ScenePlan.build(cfg, 43, 0, 20).arrays['seeds'])
+
+def test_scene_independent_of_first_scene():
+    for name in ['config.yml.table', 'config.yml.shelf']:
+        cfg = load_config(name)
+        plan = ScenePlan.build(cfg, 7, 0, 30)
+        for first_scene in [1, 13, 29]:
+            part = ScenePlan.build(cfg, 7, first_scene, 30 - first_scene)
+            for scene in range(first_scene, 30):
+                same_rows(plan.scene(scene), part.scene(scene))
+
+def test_scene_rows():
+    cfg = load_config('config.yml.table')
+    plan = ScenePlan.build(cfg, 3, 0, 50)
+    for scene in range(0, 50):
+        row = plan.scene(scene)
+        assert cfg.getMinObjectsScene() <= len(row['object_ids']) <= cfg.getMaxObjectsScene()
+        assert len(set(row['object_ids'])) == len(row['object_ids'])
+        assert all(0 <= index < len(cfg.getObjModelList()) for index in row['object_ids'])
+        for axis, value_range in enumerate([cfg.getRangeX(), cfg.getRangeY(), cfg.getRangeZ()]):
+            assert np.all(row['locations'][:, axis] >= value_range[0]) and np.all(row['locations'][:, axis] <= value_range[1])
+
+def test_redrawn_scene_differs():
+    cfg = load_config('config.yml.table')
+    plan = ScenePlan.build(cfg, 5, 0, 4)
+    redrawn = plan.redrawn(cfg, 2, 1)
+    assert redrawn['seed'] != plan.scene(2)['seed']
+    same_rows(redrawn, plan.redrawn(cfg, 2, 1))
+
+def test_save_load():
+    cfg = load_config('config.yml.shelf')
+    folder = tempfile.mkdtemp(prefix='physim_test_')
+    try:
+        plan = ScenePlan.build(cfg, 11, 4, 6)
+        plan.save(osp.join(folder, 'plan.npz'))
+        loaded = ScenePlan.load(osp.join(folder, 'plan.npz'))
+        assert loaded.seed == 11 and loaded.first_scene == 4 and loaded.numScenes() == 6
+        for scene in range(4, 10):
+            same_rows(plan.scene(scene), loaded.scene(scene))
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == "__main__":
+    test_same_seed_same_plan()
+    test_scene_independent_of_first_scene()
+    test_scene_rows()
+    test_redrawn_scene_differs()
+    test_save_load()
+    print("ok")